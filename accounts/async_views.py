@@ -0,0 +1,18 @@
+# accounts/async_views.py
+# Async student dashboard, used instead of views.student_dashboard when
+# QUIZ_ASYNC_VIEWS is on (see quiz/async_views.py)
+from django.shortcuts import render, redirect
+from quiz.repository import astudent_quizzes
+from .profiles import aget_student_id, async_login_required
+from .views import student_dashboard_context
+
+
+@async_login_required
+async def student_dashboard(request):
+    student_id = await aget_student_id(request)
+
+    if not student_id:
+        return redirect('login')
+
+    quizzes = await astudent_quizzes(student_id)
+    return render(request, 'accounts/student_dashboard.html', student_dashboard_context(quizzes))
@@ -0,0 +1,132 @@
+# accounts/profiles.py
+from functools import wraps
+from django.contrib.auth.decorators import login_required
+from django.db import connection
+from quiz_system import async_db
+from quiz_system.db.statements import Statement, run
+
+# Session key holding the resolved quiz_teacher/quiz_student profile of the user
+PROFILE_SESSION_KEY = '_quiz_profile'
+
+
+PROFILE = Statement('profile', """SELECT 'teacher', teacher_id, teacher_name FROM quiz_teacher WHERE teacher_email = %s
+                 UNION ALL
+                 SELECT 'student', student_id, student_name FROM quiz_student WHERE student_email = %s
+                 ORDER BY 1 DESC
+                 LIMIT 1""", ['varchar', 'varchar'])
+
+
+def _profile_from_row(row, email):
+    if not row:
+        return None
+    return {'role': row[0], 'profile_id': row[1], 'name': row[2], 'email': email}
+
+
+def load_profile(email):
+    """Look up the teacher or student profile for email with a single query.
+
+    Returns a dict with 'role' ('teacher' or 'student'), 'profile_id', 'name'
+    and 'email', or None if the user has no profile. Teachers win if an email
+    somehow has both.
+    """
+    with connection.cursor() as cursor:
+        run(cursor, PROFILE, [email, email])
+        return _profile_from_row(cursor.fetchone(), email)
+
+
+def cache_profile(request, role, profile_id, name):
+    profile = {'role': role, 'profile_id': profile_id, 'name': name, 'email': request.user.email}
+    request.session[PROFILE_SESSION_KEY] = profile
+    request._quiz_profile = profile
+    return profile
+
+
+def clear_profile(request):
+    """Drop the cached profile, e.g. after the user's email or profile row changes."""
+    request.session.pop(PROFILE_SESSION_KEY, None)
+    if hasattr(request, '_quiz_profile'):
+        del request._quiz_profile
+
+
+def get_profile(request):
+    """Return the profile of the logged-in user, resolving it once per session.
+
+    The cache is keyed on the user's email, so changing the email (which is how
+    profiles are linked to users) invalidates it. Missing profiles are not
+    cached, so a profile created later is picked up on the next request.
+    """
+    if hasattr(request, '_quiz_profile'):
+        return request._quiz_profile
+
+    if not request.user.is_authenticated:
+        return None
+
+    profile = request.session.get(PROFILE_SESSION_KEY)
+    if not profile or profile.get('email') != request.user.email:
+        profile = load_profile(request.user.email)
+        if profile:
+            request.session[PROFILE_SESSION_KEY] = profile
+        else:
+            request.session.pop(PROFILE_SESSION_KEY, None)
+
+    request._quiz_profile = profile
+    return profile
+
+
+async def aget_profile(request):
+    """Async get_profile for the async views"""
+    if hasattr(request, '_quiz_profile'):
+        return request._quiz_profile
+
+    user = await request.auser()
+    # Templates read request.user; share the loaded user so they never query
+    request._cached_user = user
+    if not user.is_authenticated:
+        return None
+
+    profile = await request.session.aget(PROFILE_SESSION_KEY)
+    if not profile or profile.get('email') != user.email:
+        row = await async_db.fetchone(PROFILE, [user.email, user.email])
+        profile = _profile_from_row(row, user.email)
+        if profile:
+            await request.session.aset(PROFILE_SESSION_KEY, profile)
+        else:
+            await request.session.apop(PROFILE_SESSION_KEY, None)
+
+    request._quiz_profile = profile
+    return profile
+
+
+def async_login_required(view):
+    """login_required for async views, which also loads request.user up front.
+
+    Templates (base.html) read request.user; left lazy, that is a sync ORM
+    query inside the event loop, which Django refuses.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request._cached_user = await request.auser()
+        return await view(request, *args, **kwargs)
+    return login_required(wrapper)
+
+
+def _profile_id(request, role):
+    profile = get_profile(request)
+    if profile and profile['role'] == role:
+        return profile['profile_id']
+    return None
+
+
+def get_student_id(request):
+    return _profile_id(request, 'student')
+
+
+def get_teacher_id(request):
+    return _profile_id(request, 'teacher')
+
+
+async def aget_student_id(request):
+    profile = await aget_profile(request)
+    if profile and profile['role'] == 'student':
+        return profile['profile_id']
+    return None
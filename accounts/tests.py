@@ -1,3 +1,57 @@
-from django.test import TestCase
+from unittest import mock
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, SimpleTestCase
+from . import profiles
+from .profiles import PROFILE_SESSION_KEY, cache_profile, clear_profile, get_profile, get_student_id, get_teacher_id
 
-# Create your tests here.
+STUDENT = {'role': 'student', 'profile_id': 4, 'name': 'S', 'email': 's@example.com'}
+
+
+class ProfileTests(SimpleTestCase):
+
+    def request(self, email='s@example.com', session=None):
+        request = RequestFactory().get('/')
+        request.user = mock.Mock(is_authenticated=True, email=email) if email else AnonymousUser()
+        request.session = dict(session or {})
+        return request
+
+    def test_anonymous(self):
+        with mock.patch.object(profiles, 'load_profile') as load:
+            self.assertIsNone(get_profile(self.request(email=None)))
+        load.assert_not_called()
+
+    def test_loaded_once_per_session(self):
+        request = self.request()
+        with mock.patch.object(profiles, 'load_profile', return_value=STUDENT) as load:
+            self.assertEqual(get_profile(request), STUDENT)
+            self.assertEqual(request.session[PROFILE_SESSION_KEY], STUDENT)
+            # The next request of the session reads it from the session
+            self.assertEqual(get_profile(self.request(session=request.session)), STUDENT)
+        load.assert_called_once_with('s@example.com')
+
+    def test_email_change_reloads(self):
+        request = self.request(email='new@example.com', session={PROFILE_SESSION_KEY: STUDENT})
+        reloaded = dict(STUDENT, email='new@example.com')
+        with mock.patch.object(profiles, 'load_profile', return_value=reloaded) as load:
+            self.assertEqual(get_profile(request), reloaded)
+        load.assert_called_once_with('new@example.com')
+        self.assertEqual(request.session[PROFILE_SESSION_KEY], reloaded)
+
+    def test_missing_profile_is_not_cached(self):
+        request = self.request(email='new@example.com', session={PROFILE_SESSION_KEY: STUDENT})
+        with mock.patch.object(profiles, 'load_profile', return_value=None):
+            self.assertIsNone(get_profile(request))
+        self.assertNotIn(PROFILE_SESSION_KEY, request.session)
+
+    def test_cache_and_clear(self):
+        request = self.request()
+        cache_profile(request, 'teacher', 9, 'T')
+        with mock.patch.object(profiles, 'load_profile') as load:
+            self.assertEqual(get_teacher_id(request), 9)
+            self.assertIsNone(get_student_id(request))
+        load.assert_not_called()
+
+        clear_profile(request)
+        self.assertNotIn(PROFILE_SESSION_KEY, request.session)
+        with mock.patch.object(profiles, 'load_profile', return_value=STUDENT):
+            self.assertEqual(get_student_id(request), 4)
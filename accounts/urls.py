@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.urls import path
 from .views import register_teacher, register_student, login_view, teacher_dashboard, student_dashboard
 
+if getattr(settings, 'QUIZ_ASYNC_VIEWS', False):
+    from .async_views import student_dashboard
+
 urlpatterns = [
     path('register/teacher/', register_teacher, name='register_teacher'),
     path('register/student/', register_student, name='register_student'),
@@ -4,15 +4,24 @@ from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.db import connection
+from quiz.repository import student_quizzes, teacher_quizzes
 from .forms import CustomUserCreationForm
+from .profiles import cache_profile, clear_profile, get_profile, get_student_id, get_teacher_id
 # Models are no longer needed since we use raw SQL
 
+def student_dashboard_context(quizzes):
+    return {
+        'quizzes': quizzes,
+        'any_grading': any(quiz.grading for quiz in quizzes),
+    }
+
 def register_teacher(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
             user = form.save(commit=False)
             user.is_staff = True
+            user.is_teacher = True
             user.save()
             
             teacher_name = form.cleaned_data['username']
@@ -23,12 +32,14 @@ def register_teacher(request):
             # Create teacher record using raw SQL (let database auto-generate teacher_id)
             with connection.cursor() as cursor:
                 cursor.execute(
-                    "INSERT INTO quiz_teacher (teacher_name, teacher_email, dept, subject) VALUES (%s, %s, %s, %s)",
+                    "INSERT INTO quiz_teacher (teacher_name, teacher_email, dept, subject) VALUES (%s, %s, %s, %s) RETURNING teacher_id",
                     [teacher_name, teacher_email, dept, subject]
                 )
+                teacher_id = cursor.fetchone()[0]
             
             user = authenticate(username=form.cleaned_data['username'], password=form.cleaned_data['password1'])
             login(request, user)
+            cache_profile(request, 'teacher', teacher_id, teacher_name)
             return redirect('teacher_dashboard')
     else:
         form = CustomUserCreationForm()
@@ -40,6 +51,7 @@ def register_student(request):
         if form.is_valid():
             user = form.save(commit=False)
             user.is_staff = False
+            user.is_student = True
             user.save()
             
             student_name = form.cleaned_data['username']
@@ -50,12 +62,14 @@ def register_student(request):
             # Create student record using raw SQL (let database auto-generate student_id)
             with connection.cursor() as cursor:
                 cursor.execute(
-                    "INSERT INTO quiz_student (student_name, student_email, roll_no, student_class) VALUES (%s, %s, %s, %s)",
+                    "INSERT INTO quiz_student (student_name, student_email, roll_no, student_class) VALUES (%s, %s, %s, %s) RETURNING student_id",
                     [student_name, student_email, roll_no, student_class]
                 )
+                student_id = cursor.fetchone()[0]
             
             user = authenticate(username=form.cleaned_data['username'], password=form.cleaned_data['password1'])
             login(request, user)
+            cache_profile(request, 'student', student_id, student_name)
             return redirect('student_dashboard')
     else:
         form = CustomUserCreationForm()
@@ -71,98 +85,33 @@ def login_view(request):
             if user is not None:
                 login(request, user)
                 
-                # Check user type using raw SQL
-                with connection.cursor() as cursor:
-                    # Check if user is a teacher
-                    cursor.execute(
-                        "SELECT COUNT(*) FROM quiz_teacher WHERE teacher_email = %s",
-                        [user.email]
-                    )
-                    is_teacher = cursor.fetchone()[0] > 0
-                    
-                    if is_teacher:
-                        return redirect('teacher_dashboard')
-                    else:
-                        return redirect('student_dashboard')
+                # Resolve the teacher/student profile once and keep it in the session
+                clear_profile(request)
+                profile = get_profile(request)
+                
+                if profile and profile['role'] == 'teacher':
+                    return redirect('teacher_dashboard')
+                else:
+                    return redirect('student_dashboard')
     else:
         form = AuthenticationForm()
     return render(request, 'accounts/login.html', {'form': form})
 
 @login_required
 def teacher_dashboard(request):
-    with connection.cursor() as cursor:
-        # Get teacher record using raw SQL
-        cursor.execute(
-            "SELECT teacher_id, teacher_name FROM quiz_teacher WHERE teacher_email = %s",
-            [request.user.email]
-        )
-        teacher_result = cursor.fetchone()
-        
-        if not teacher_result:
-            return redirect('login')
-        
-        teacher_id = teacher_result[0]
-        
-        # Get teacher's quizzes using raw SQL
-        cursor.execute(
-            "SELECT quiz_id, quiz_name, quiz_code, subject, topic FROM quiz_quiz WHERE teacher_id = %s ORDER BY quiz_name",
-            [teacher_id]
-        )
-        quiz_results = cursor.fetchall()
-        
-        # Format quizzes for template
-        quizzes = []
-        for q in quiz_results:
-            quiz = {
-                'quiz_id': q[0],
-                'quiz_name': q[1],
-                'quiz_code': q[2],
-                'subject': q[3],
-                'topic': q[4]
-            }
-            quizzes.append(quiz)
-        
-        return render(request, 'accounts/teacher_dashboard.html', {'quizzes': quizzes})
+    teacher_id = get_teacher_id(request)
+    
+    if not teacher_id:
+        return redirect('login')
+    
+    # Teacher's quizzes with their maintained enrollment/submission summaries
+    return render(request, 'accounts/teacher_dashboard.html', {'quizzes': teacher_quizzes(teacher_id)})
 
 @login_required
 def student_dashboard(request):
-    with connection.cursor() as cursor:
-        # Get student record using raw SQL
-        cursor.execute(
-            "SELECT student_id, student_name FROM quiz_student WHERE student_email = %s",
-            [request.user.email]
-        )
-        student_result = cursor.fetchone()
-        
-        if not student_result:
-            return redirect('login')
-        
-        student_id = student_result[0]
-        
-        # Get student's enrolled quizzes using raw SQL with JOIN
-        cursor.execute(
-            """SELECT q.quiz_id, q.quiz_name, q.quiz_code, q.subject, q.topic,
-                      CASE WHEN r.result_id IS NOT NULL THEN 1 ELSE 0 END as completed
-               FROM quiz_quiz q 
-               JOIN quiz_studentquiz sq ON q.quiz_id = sq.quiz_id 
-               LEFT JOIN quiz_result r ON q.quiz_id = r.quiz_id AND r.student_id = %s
-               WHERE sq.student_id = %s 
-               ORDER BY q.quiz_name""",
-            [student_id, student_id]
-        )
-        quiz_results = cursor.fetchall()
-        
-        # Format quizzes for template
-        quizzes = []
-        for q in quiz_results:
-            quiz = {
-                'quiz_id': q[0],
-                'quiz_name': q[1],
-                'quiz_code': q[2],
-                'subject': q[3],
-                'topic': q[4],
-                'completed': bool(q[5])
-            }
-            quizzes.append(quiz)
-        
-        return render(request, 'accounts/student_dashboard.html', {'quizzes': quizzes})
+    student_id = get_student_id(request)
+    
+    if not student_id:
+        return redirect('login')
+    
+    return render(request, 'accounts/student_dashboard.html', student_dashboard_context(student_quizzes(student_id)))
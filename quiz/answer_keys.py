@@ -0,0 +1,94 @@
+# quiz/answer_keys.py
+import json
+import threading
+from collections import OrderedDict, namedtuple
+from asgiref.sync import sync_to_async
+from django.db import connection
+from .question_cache import QUESTION_CACHE_TIMEOUT, quiz_cache
+
+# Compiled answer key for one version of a quiz. The tuples are parallel and
+# ordered by question_id; answers are pre-normalized so grading is a plain
+# comparison (short answers lower-cased, everything stripped).
+AnswerKey = namedtuple('AnswerKey', [
+    'quiz_id', 'version', 'question_ids', 'question_types', 'answers', 'scores', 'max_score',
+])
+
+MAX_CACHED_KEYS = 512
+
+# Question types graded without regard to case
+CASE_INSENSITIVE_TYPES = frozenset(['short_answer'])
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def normalize_answer(question_type, answer):
+    answer = str(answer).strip()
+    if question_type in CASE_INSENSITIVE_TYPES:
+        return answer.lower()
+    return answer
+
+
+def parse_correct_answer(correct_answers_json):
+    # correct_answers is stored as {"answer": ...}; fall back to the raw value
+    try:
+        return str(json.loads(correct_answers_json).get('answer', ''))
+    except (TypeError, ValueError, AttributeError):
+        return str(correct_answers_json)
+
+
+def compile_answer_key(quiz_id, version):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT question_id, question_type, correct_answers, score FROM quiz_quizquestion WHERE quiz_id = %s ORDER BY question_id",
+            [quiz_id]
+        )
+        rows = cursor.fetchall()
+
+    question_ids = tuple(r[0] for r in rows)
+    question_types = tuple(r[1] for r in rows)
+    answers = tuple(normalize_answer(r[1], parse_correct_answer(r[2])) for r in rows)
+    scores = tuple(r[3] for r in rows)
+    return AnswerKey(quiz_id, version, question_ids, question_types, answers, scores, sum(scores))
+
+
+def cached_answer_key(quiz_id, version):
+    """The compiled key if it is cached at this version, else None"""
+    with _lock:
+        key = _cache.get(quiz_id)
+        if key is not None and key.version == version:
+            _cache.move_to_end(quiz_id)
+            return key
+    return None
+
+
+def answer_key_cache_key(quiz_id, version):
+    return f'quiz:{quiz_id}:v{version}:answer-key'
+
+
+def get_answer_key(quiz_id, version):
+    """Return the compiled key for quiz_id, recompiling if the cached one is older than version."""
+    key = cached_answer_key(quiz_id, version)
+    if key is not None:
+        return key
+
+    # Keys are also shared through the quiz cache, so one process (e.g.
+    # prewarm_quizzes) compiles each version for all of them
+    key = quiz_cache().get(answer_key_cache_key(quiz_id, version))
+    if key is None:
+        key = compile_answer_key(quiz_id, version)
+        quiz_cache().set(answer_key_cache_key(quiz_id, version), key, QUESTION_CACHE_TIMEOUT)
+
+    with _lock:
+        _cache[quiz_id] = key
+        _cache.move_to_end(quiz_id)
+        while len(_cache) > MAX_CACHED_KEYS:
+            _cache.popitem(last=False)
+    return key
+
+
+async def aget_answer_key(quiz_id, version):
+    key = cached_answer_key(quiz_id, version)
+    if key is None:
+        key = await sync_to_async(get_answer_key)(quiz_id, version)
+    return key
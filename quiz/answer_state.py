@@ -0,0 +1,217 @@
+# quiz/answer_state.py
+# Answers a student has saved while taking a quiz (autosave and paged
+# delivery), held server-side until submit_quiz assembles them into one
+# submission.
+#
+# Every delta is merged into the student's draft in the quiz cache, which
+# is what the take pages read. The deltas themselves are buffered per
+# process and written to quiz_quizdraft in one multi-row upsert every
+# DRAFT_FLUSH_INTERVAL seconds (by a timer thread) or DRAFT_FLUSH_BATCH
+# drafts, so a student clicking through a quiz costs a few cache writes
+# rather than a DB write per change. A crashed process loses at most its
+# unflushed interval.
+#
+# The quiz_quizdraft row is the authority: submission_answers flushes and
+# reads it, so a process-local cache (or a stale copy in another worker)
+# never decides what gets graded.
+import atexit
+import json
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connection
+from quiz_system import async_db
+from quiz_system.db.statements import Statement, run
+from .question_cache import quiz_cache
+
+DRAFT_CACHE_TIMEOUT = getattr(settings, 'QUIZ_DRAFT_CACHE_TIMEOUT', 24 * 60 * 60)
+DRAFT_FLUSH_INTERVAL = getattr(settings, 'QUIZ_DRAFT_FLUSH_INTERVAL', 5)
+DRAFT_FLUSH_BATCH = getattr(settings, 'QUIZ_DRAFT_FLUSH_BATCH', 200)
+
+# Longer answers are cut so drafts stay compact
+MAX_DRAFT_ANSWER_LENGTH = 2000
+
+_pending = {}
+_pending_since = None
+_flush_timer = None
+_lock = threading.Lock()
+# Serializes this process's read-modify-write of cached drafts
+_merge_lock = threading.Lock()
+
+
+def draft_key(student_id, quiz_id):
+    return f'quiz:{quiz_id}:draft:{student_id}'
+
+
+def load_draft(student_id, quiz_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT answers FROM quiz_quizdraft WHERE student_id = %s AND quiz_id = %s",
+            [student_id, quiz_id]
+        )
+        row = cursor.fetchone()
+    # Django's backend hands jsonb back as text, and JSON keys are strings
+    saved = json.loads(row[0]) if row else {}
+    return {int(question_id): answer for question_id, answer in saved.items()}
+
+
+def held_answers(student_id, quiz_id):
+    """Return the saved {question_id: answer} for the student's attempt (empty if none)"""
+    answers = quiz_cache().get(draft_key(student_id, quiz_id))
+    if answers is None:
+        answers = load_draft(student_id, quiz_id)
+        with _lock:
+            answers.update(_pending.get((student_id, quiz_id), {}))
+        quiz_cache().set(draft_key(student_id, quiz_id), answers, DRAFT_CACHE_TIMEOUT)
+    return answers
+
+
+async def aheld_answers(student_id, quiz_id):
+    answers = await quiz_cache().aget(draft_key(student_id, quiz_id))
+    if answers is None:
+        answers = await sync_to_async(held_answers)(student_id, quiz_id)
+    return answers
+
+
+def hold_answers(student_id, quiz_id, delta):
+    """Merge a delta of answers into the student's draft. Returns the draft's answer count."""
+    global _pending_since
+    delta = {question_id: str(answer)[:MAX_DRAFT_ANSWER_LENGTH] for question_id, answer in delta.items()}
+    answers = held_answers(student_id, quiz_id)
+    if not delta:
+        return len(answers)
+
+    with _merge_lock:
+        # Re-read under the lock so concurrent saves in this process both land
+        answers = quiz_cache().get(draft_key(student_id, quiz_id), answers)
+        answers.update(delta)
+        quiz_cache().set(draft_key(student_id, quiz_id), answers, DRAFT_CACHE_TIMEOUT)
+
+    with _lock:
+        _pending.setdefault((student_id, quiz_id), {}).update(delta)
+        if _pending_since is None:
+            _pending_since = time.monotonic()
+        due = len(_pending) >= DRAFT_FLUSH_BATCH
+        _schedule_flush()
+    if due:
+        try:
+            flush_drafts()
+        except DatabaseError:
+            pass  # the deltas were re-buffered; the next flush retries them
+    return len(answers)
+
+
+def flush_drafts():
+    """Write this process's buffered deltas to quiz_quizdraft in one statement"""
+    global _pending_since
+    with _lock:
+        if not _pending:
+            return 0
+        batch = list(_pending.items())
+        _pending.clear()
+        _pending_since = None
+
+    # jsonb || merges the buffered delta over what is already stored, so
+    # deltas flushed by different processes combine instead of overwriting
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO quiz_quizdraft (student_id, quiz_id, answers, updated_at)
+                SELECT v.student_id, v.quiz_id, v.answers, now()
+                FROM unnest(%s::integer[], %s::integer[], %s::jsonb[]) AS v(student_id, quiz_id, answers)
+                JOIN quiz_quiz q ON q.quiz_id = v.quiz_id
+                WHERE NOT EXISTS (SELECT 1 FROM quiz_result r WHERE r.student_id = v.student_id AND r.quiz_id = v.quiz_id)
+                  AND NOT EXISTS (SELECT 1 FROM quiz_pendingsubmission p WHERE p.student_id = v.student_id AND p.quiz_id = v.quiz_id AND NOT p.failed)
+                ON CONFLICT (student_id, quiz_id) DO UPDATE
+                SET answers = quiz_quizdraft.answers || EXCLUDED.answers,
+                    updated_at = EXCLUDED.updated_at
+            """, [
+                [student_id for (student_id, _), _ in batch],
+                [quiz_id for (_, quiz_id), _ in batch],
+                [json.dumps(delta) for _, delta in batch],
+            ])
+    except Exception:
+        # Put the deltas back (under anything newer) for the next flush
+        with _lock:
+            for key, delta in batch:
+                _pending[key] = {**delta, **_pending.get(key, {})}
+            if _pending_since is None:
+                _pending_since = time.monotonic()
+        raise
+    return len(batch)
+
+
+def _schedule_flush():
+    # Called with _lock held: make sure a timer will flush what is buffered
+    global _flush_timer
+    if _flush_timer is None and _pending:
+        _flush_timer = threading.Timer(DRAFT_FLUSH_INTERVAL, _timed_flush)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+
+def _timed_flush():
+    global _flush_timer
+    with _lock:
+        _flush_timer = None
+    try:
+        flush_drafts()
+    except Exception:
+        pass  # re-buffered; retried by the next timer
+    finally:
+        # Hand the timer thread's connection back to the pool
+        connection.close()
+        with _lock:
+            _schedule_flush()
+
+
+def submission_answers(student_id, quiz_id):
+    """Every answer the student saved, for grading their submission.
+
+    This process's buffered deltas are flushed first and the stored draft
+    (which merges deltas from every process) overrides the cached copy,
+    which may be an older one held by this process.
+    """
+    answers = quiz_cache().get(draft_key(student_id, quiz_id)) or {}
+    try:
+        flush_drafts()
+    except DatabaseError:
+        pass  # re-buffered; merged from _pending below
+    answers.update(load_draft(student_id, quiz_id))
+    with _lock:
+        answers.update(_pending.get((student_id, quiz_id), {}))
+    return answers
+
+
+async def asubmission_answers(student_id, quiz_id):
+    return await sync_to_async(submission_answers)(student_id, quiz_id)
+
+
+DELETE_DRAFT = Statement('delete_draft', "DELETE FROM quiz_quizdraft WHERE student_id = %s AND quiz_id = %s", ['integer', 'integer'])
+
+
+def release_answers(student_id, quiz_id):
+    """Forget the student's draft once their submission is recorded"""
+    with _lock:
+        _pending.pop((student_id, quiz_id), None)
+    quiz_cache().delete(draft_key(student_id, quiz_id))
+    with connection.cursor() as cursor:
+        run(cursor, DELETE_DRAFT, [student_id, quiz_id])
+
+
+async def arelease_answers(student_id, quiz_id):
+    with _lock:
+        _pending.pop((student_id, quiz_id), None)
+    await quiz_cache().adelete(draft_key(student_id, quiz_id))
+    await async_db.execute(DELETE_DRAFT, [student_id, quiz_id])
+
+
+def _flush_at_exit():
+    try:
+        flush_drafts()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)
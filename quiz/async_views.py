@@ -0,0 +1,196 @@
+# quiz/async_views.py
+# Async versions of the student views that take the load during an exam,
+# used instead of their counterparts in views.py when QUIZ_ASYNC_VIEWS is
+# on and the project is served through ASGI. Their statements go through
+# the non-blocking pool in quiz_system.async_db, and lookups that do not
+# depend on each other are awaited together. Behaviour, messages and
+# templates match the sync views.
+import asyncio
+from urllib.parse import urlencode
+from django.shortcuts import render, redirect
+from django.contrib import messages
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+from accounts.profiles import aget_student_id, async_login_required
+from quiz_system import async_db
+from .answer_state import aheld_answers, arelease_answers, asubmission_answers
+from .code_lookup import alookup_quiz_code
+from .grading import form_answers
+from .grading_queue import ASYNC_GRADING, aenqueue_submission
+from .question_cache import aget_question_block, aget_question_page
+from .repository import aget_attempt
+from .schedule import CLOSED, OPEN, QUIZ_CLOSE_GRACE, WAITING, aquiz_window, waiting_response, window_state
+from .utils import aadd_student_to_quiz, agrade_and_record
+from .views import PAGED_QUESTION_THRESHOLD, page_with_saved_answers
+
+
+@async_login_required
+async def join_quiz(request):
+    # Check if code is provided in URL parameters (for direct links)
+    code_from_url = request.GET.get('code', '').upper().strip()
+
+    if request.method == 'POST':
+        code = request.POST['code'].upper().strip()
+    elif code_from_url:
+        # Auto-join if code is in URL
+        code = code_from_url
+    else:
+        # Show the form
+        return render(request, 'quiz/join_quiz.html')
+
+    try:
+        # The code and the student profile are looked up together
+        quiz_result, student_id = await asyncio.gather(alookup_quiz_code(code), aget_student_id(request))
+
+        if not quiz_result:
+            messages.error(request, 'Invalid quiz code. Please check the code and try again.')
+            return render(request, 'quiz/join_quiz.html')
+
+        quiz_id, quiz_name = quiz_result
+
+        # The window was cached by the code lookup; early arrivals wait
+        window = await aquiz_window(quiz_id)
+        state = window_state(window)
+        if state == WAITING:
+            return waiting_response(window, f"{reverse('join_quiz')}?{urlencode({'code': code})}")
+        if state == CLOSED:
+            messages.error(request, f'"{quiz_name}" has closed.')
+            return render(request, 'quiz/join_quiz.html')
+
+        if not student_id:
+            messages.error(request, 'Student profile not found. Please contact admin.')
+            return redirect('student_dashboard')
+
+        # Enroll student; the unique constraint turns a repeat join into a no-op
+        if await aadd_student_to_quiz(student_id, quiz_id):
+            messages.success(request, f'Successfully joined "{quiz_name}"!')
+        else:
+            messages.warning(request, f'You are already enrolled in "{quiz_name}".')
+
+        return redirect('student_dashboard')
+
+    except Exception as e:
+        messages.error(request, f'Error joining quiz: {str(e)}')
+        return render(request, 'quiz/join_quiz.html')
+
+
+@async_login_required
+async def take_quiz(request, quiz_id):
+    try:
+        student_id = await aget_student_id(request)
+
+        if not student_id:
+            messages.error(request, 'Student profile not found.')
+            return redirect('student_dashboard')
+
+        window = await aquiz_window(quiz_id)
+        state = window_state(window)
+        if state == WAITING:
+            return waiting_response(window, request.path)
+        if state == CLOSED:
+            messages.error(request, f'"{window.quiz_name}" has closed.')
+            return redirect('student_dashboard')
+
+        # The attempt checks and the student's autosaved answers together
+        attempt, saved_answers = await asyncio.gather(
+            aget_attempt(student_id, quiz_id),
+            aheld_answers(student_id, quiz_id),
+        )
+
+        if not attempt:
+            messages.error(request, 'Quiz not found.')
+            return redirect('student_dashboard')
+
+        if not attempt.is_enrolled:
+            messages.error(request, 'You are not enrolled in this quiz.')
+            return redirect('student_dashboard')
+
+        if attempt.existing_score is not None:
+            messages.warning(request, f'You have already completed "{attempt.quiz_name}". Your score: {attempt.existing_score}')
+            return redirect('student_dashboard')
+
+        if attempt.is_grading:
+            messages.info(request, f'Your submission for "{attempt.quiz_name}" is being graded.')
+            return redirect('student_dashboard')
+
+        first_page = await aget_question_page(quiz_id, attempt.question_version, 1)
+
+        if not first_page['count']:
+            messages.error(request, 'This quiz has no questions yet. Please contact your teacher.')
+            return redirect('student_dashboard')
+
+        if first_page['count'] > PAGED_QUESTION_THRESHOLD:
+            return render(request, 'quiz/take_quiz_paged.html', {
+                'quiz': attempt,
+                'first_page': page_with_saved_answers(first_page, saved_answers),
+            })
+
+        question_count, questions_html = await aget_question_block(quiz_id, attempt.question_version)
+
+        return render(request, 'quiz/take_quiz.html', {
+            'quiz': attempt,
+            'questions_html': mark_safe(questions_html),
+            'saved_answers': saved_answers,
+        })
+
+    except Exception as e:
+        messages.error(request, f'Error loading quiz: {str(e)}')
+        return redirect('student_dashboard')
+
+
+@async_login_required
+async def submit_quiz(request, quiz_id):
+    if request.method != 'POST':
+        return redirect('student_dashboard')
+
+    try:
+        student_id = await aget_student_id(request)
+
+        if not student_id:
+            messages.error(request, 'Student profile not found.')
+            return redirect('student_dashboard')
+
+        state = window_state(await aquiz_window(quiz_id), QUIZ_CLOSE_GRACE)
+        if state != OPEN:
+            messages.error(request, 'This quiz has not opened yet.' if state == WAITING else 'This quiz has closed.')
+            return redirect('student_dashboard')
+
+        if ASYNC_GRADING:
+            answers = await asubmission_answers(student_id, quiz_id)
+            answers.update(form_answers(request.POST))
+            queued = await aenqueue_submission(student_id, quiz_id, answers)
+            await arelease_answers(student_id, quiz_id)
+            if not queued:
+                messages.warning(request, 'You have already submitted this quiz.')
+                return redirect('student_dashboard')
+            messages.success(request, 'Quiz submitted successfully! Your score will appear on your dashboard once it has been graded.')
+            return redirect('student_dashboard')
+
+        # The draft and the quiz's question version are independent lookups
+        answers, quiz_result = await asyncio.gather(
+            asubmission_answers(student_id, quiz_id),
+            async_db.fetchone("SELECT question_version FROM quiz_quiz WHERE quiz_id = %s", [quiz_id]),
+        )
+        answers.update(form_answers(request.POST))
+
+        if not quiz_result:
+            messages.error(request, 'Quiz not found.')
+            return redirect('student_dashboard')
+
+        answer_key, total_score, recorded = await agrade_and_record(student_id, quiz_id, quiz_result[0], answers)
+        max_score = answer_key.max_score
+
+        # Calculate percentage
+        percentage = (total_score / max_score * 100) if max_score > 0 else 0
+
+        await arelease_answers(student_id, quiz_id)
+        if recorded is None:
+            messages.warning(request, 'You have already submitted this quiz.')
+            return redirect('student_dashboard')
+
+        messages.success(request, f'Quiz submitted successfully! Your score: {total_score}/{max_score} ({percentage:.1f}%)')
+        return redirect('student_dashboard')
+
+    except Exception as e:
+        messages.error(request, f'Error submitting quiz: {str(e)}')
+        return redirect('student_dashboard')
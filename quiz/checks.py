@@ -0,0 +1,18 @@
+# quiz/checks.py
+from django.conf import settings
+from django.core.checks import Warning, register
+from .question_cache import quiz_cache_is_shared
+
+
+@register()
+def check_quiz_cache(app_configs, **kwargs):
+    # runserver is a single process, so a local cache only matters once
+    # DEBUG is off and the site runs under a multi-worker server
+    if settings.DEBUG or quiz_cache_is_shared():
+        return []
+    return [Warning(
+        'The quiz cache (QUIZ_CACHE_ALIAS) is private to each server process.',
+        hint='Fine for a single process. With several workers, autosaved drafts and pre-warmed quizzes are '
+             'not shared between them; use a Redis or file-based cache (see CACHES in settings.py).',
+        id='quiz.W001',
+    )]
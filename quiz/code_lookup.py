@@ -0,0 +1,72 @@
+# quiz/code_lookup.py
+from django.conf import settings
+from django.db import connection
+from quiz_system import async_db
+from quiz_system.db.statements import Statement, run
+from .question_cache import quiz_cache
+from .schedule import acache_quiz_window, cache_quiz_window, make_window
+
+QUIZ_CODE_CACHE_TIMEOUT = getattr(settings, 'QUIZ_CODE_CACHE_TIMEOUT', 10 * 60)
+# Unknown codes are remembered briefly so typos and guessing never reach the database
+QUIZ_CODE_NEGATIVE_TIMEOUT = getattr(settings, 'QUIZ_CODE_NEGATIVE_TIMEOUT', 60)
+
+# Matches quiz_quiz.quiz_code max_length; anything longer cannot exist
+MAX_QUIZ_CODE_LENGTH = 20
+
+# Cached in place of (quiz_id, quiz_name) for codes with no quiz
+UNKNOWN_CODE = ()
+
+QUIZ_CODE = Statement('quiz_code', "SELECT quiz_id, quiz_name, opens_at, closes_at FROM quiz_quiz WHERE quiz_code = %s", ['varchar'])
+
+
+def quiz_code_key(code):
+    return f'quiz-code:{code}'
+
+
+def lookup_quiz_code(code):
+    """Return (quiz_id, quiz_name) for an upper-cased quiz code, or None if no quiz has it"""
+    if not code or len(code) > MAX_QUIZ_CODE_LENGTH:
+        return None
+
+    key = quiz_code_key(code)
+    cached = quiz_cache().get(key)
+    if cached is not None:
+        return tuple(cached) or None
+
+    with connection.cursor() as cursor:
+        run(cursor, QUIZ_CODE, [code])
+        row = cursor.fetchone()
+
+    if not row:
+        quiz_cache().set(key, UNKNOWN_CODE, QUIZ_CODE_NEGATIVE_TIMEOUT)
+        return None
+    # Joining checks the quiz's opening window next, so cache that too
+    quiz_id, quiz_name, opens_at, closes_at = row
+    cache_quiz_window(quiz_id, make_window(quiz_name, opens_at, closes_at))
+    quiz_cache().set(key, (quiz_id, quiz_name), QUIZ_CODE_CACHE_TIMEOUT)
+    return quiz_id, quiz_name
+
+
+async def alookup_quiz_code(code):
+    """Async lookup_quiz_code for the async views"""
+    if not code or len(code) > MAX_QUIZ_CODE_LENGTH:
+        return None
+
+    key = quiz_code_key(code)
+    cached = await quiz_cache().aget(key)
+    if cached is not None:
+        return tuple(cached) or None
+
+    row = await async_db.fetchone(QUIZ_CODE, [code])
+    if not row:
+        await quiz_cache().aset(key, UNKNOWN_CODE, QUIZ_CODE_NEGATIVE_TIMEOUT)
+        return None
+    quiz_id, quiz_name, opens_at, closes_at = row
+    await acache_quiz_window(quiz_id, make_window(quiz_name, opens_at, closes_at))
+    await quiz_cache().aset(key, (quiz_id, quiz_name), QUIZ_CODE_CACHE_TIMEOUT)
+    return quiz_id, quiz_name
+
+
+def forget_quiz_code(code):
+    # Drop any cached (possibly negative) entry, e.g. when a quiz takes this code
+    quiz_cache().delete(quiz_code_key(code))
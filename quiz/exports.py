@@ -0,0 +1,73 @@
+# quiz/exports.py
+import csv
+from django.db import connection
+
+# Rows fetched from the server-side cursor per round trip
+EXPORT_CHUNK_SIZE = 2000
+
+RESULT_EXPORT_HEADER = ['Roll Number', 'Student Name', 'Email', 'Class', 'Score', 'Percentage']
+
+# Spreadsheets treat text starting with these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo:
+    """File-like object whose write() hands the line straight back to csv.writer's caller"""
+    def write(self, value):
+        return value
+
+
+def stream_results_csv(where, params, total_possible_score, question_ids=()):
+    """Yield a quiz's results as CSV text, one chunk per server-side cursor fetch.
+
+    where/params filter quiz_result aliased as r joined to quiz_student as s.
+    Rows come from a named (server-side) cursor, so memory stays flat no
+    matter how many results the quiz has and the first bytes go out as soon
+    as the first chunk is fetched.
+
+    Each of question_ids gets a column with the student's stored answer
+    (blank for submissions made before responses were stored). Student
+    entered text that a spreadsheet would evaluate as a formula is prefixed
+    with a quote.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(RESULT_EXPORT_HEADER + [f'Q{n}' for n in range(1, len(question_ids) + 1)])
+
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(
+            f"""SELECT s.roll_no, s.student_name, s.student_email, s.student_class, r.score,
+                       qr.question_ids, qr.answers
+                FROM quiz_result r
+                JOIN quiz_student s ON r.student_id = s.student_id
+                LEFT JOIN quiz_quizresponse qr ON qr.result_id = r.result_id
+                WHERE {where}
+                ORDER BY r.score DESC, r.result_id""",
+            params
+        )
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield ''.join(
+                writer.writerow([
+                    _text_cell(roll_no), _text_cell(student_name), _text_cell(student_email), _text_cell(student_class),
+                    score,
+                    f'{score / total_possible_score * 100:.1f}' if total_possible_score > 0 else '0.0',
+                    *map(_text_cell, _answers_in_order(answered_ids, answers, question_ids)),
+                ])
+                for roll_no, student_name, student_email, student_class, score, answered_ids, answers in rows
+            )
+
+
+def _text_cell(value):
+    # Student-entered text is quoted so a spreadsheet shows it rather than evaluating it
+    if value and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _answers_in_order(answered_ids, answers, question_ids):
+    if not answered_ids:
+        return [''] * len(question_ids)
+    by_question = dict(zip(answered_ids, answers))
+    return [by_question.get(question_id, '') for question_id in question_ids]
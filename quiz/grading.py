@@ -0,0 +1,55 @@
+# quiz/grading.py
+from collections import namedtuple
+from .answer_keys import CASE_INSENSITIVE_TYPES
+
+# Outcome of grading one submission. answers (normalized) and correct are
+# lists parallel to the key's question_ids.
+Grade = namedtuple('Grade', ['score', 'answers', 'correct'])
+
+ANSWER_FIELD_PREFIX = 'question_'
+
+
+def form_answers(form_data):
+    """Map question_id -> raw answer from question_<id> form fields"""
+    answers = {}
+    for name, value in form_data.items():
+        if name.startswith(ANSWER_FIELD_PREFIX):
+            suffix = name[len(ANSWER_FIELD_PREFIX):]
+            if suffix.isdigit():
+                answers[int(suffix)] = value
+    return answers
+
+
+def compile_grader(answer_key):
+    """Return a function grading one {question_id: answer} mapping against answer_key.
+
+    Everything that depends only on the key is worked out once here, so the
+    returned function is just lookups and comparisons. Answers are
+    normalized the same way as the key (see normalize_answer); missing
+    answers count as blank.
+    """
+    question_ids = answer_key.question_ids
+    expected = answer_key.answers
+    scores = answer_key.scores
+    fold_case = tuple(question_type in CASE_INSENSITIVE_TYPES for question_type in answer_key.question_types)
+
+    def grade_one(answers):
+        get = answers.get
+        normalized = [str(get(question_id, '')).strip() for question_id in question_ids]
+        normalized = [answer.lower() if fold else answer for answer, fold in zip(normalized, fold_case)]
+        correct = [answer == key for answer, key in zip(normalized, expected)]
+        score = sum(score for is_correct, score in zip(correct, scores) if is_correct)
+        return Grade(score, normalized, correct)
+
+    return grade_one
+
+
+def grade(answer_key, answers):
+    """Grade one submission. answers maps question_id -> raw answer."""
+    return compile_grader(answer_key)(answers)
+
+
+def grade_many(answer_key, submissions):
+    """Grade many submissions of the same quiz. Returns a list of Grades in order."""
+    grade_one = compile_grader(answer_key)
+    return [grade_one(answers) for answers in submissions]
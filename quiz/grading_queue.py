@@ -0,0 +1,168 @@
+# quiz/grading_queue.py
+import json
+from django.conf import settings
+from django.db import connection, transaction
+from quiz_system import async_db
+from quiz_system.db.statements import Statement, run
+from .answer_keys import get_answer_key
+from .grading import grade_many
+from .utils import record_results
+
+# When enabled, submit_quiz only queues the raw answers and the
+# grade_submissions command grades them in batches
+ASYNC_GRADING = getattr(settings, 'QUIZ_ASYNC_GRADING', False)
+
+GRADING_BATCH_SIZE = getattr(settings, 'QUIZ_GRADING_BATCH_SIZE', 200)
+# Submissions that failed to grade this many times are marked failed (and
+# kept, with their last error) instead of being claimed again
+GRADING_MAX_ATTEMPTS = getattr(settings, 'QUIZ_GRADING_MAX_ATTEMPTS', 3)
+
+# Longest error message kept on a failed submission
+MAX_ERROR_LENGTH = 1000
+
+
+ENQUEUE = Statement('enqueue_submission', """
+    INSERT INTO quiz_pendingsubmission (student_id, quiz_id, answers, submitted_at, attempts, last_error, failed)
+    SELECT %(student_id)s, q.quiz_id, %(answers)s::jsonb, now(), 0, '', false
+    FROM quiz_quiz q
+    WHERE q.quiz_id = %(quiz_id)s
+      AND NOT EXISTS (SELECT 1 FROM quiz_result r WHERE r.student_id = %(student_id)s AND r.quiz_id = q.quiz_id)
+    ON CONFLICT (student_id, quiz_id) DO UPDATE
+    SET answers = EXCLUDED.answers, submitted_at = EXCLUDED.submitted_at, attempts = 0, last_error = '', failed = false
+    WHERE quiz_pendingsubmission.failed
+    RETURNING submission_id
+""", {'student_id': 'integer', 'quiz_id': 'integer', 'answers': 'text'})
+
+
+def enqueue_submission(student_id, quiz_id, answers):
+    """Durably queue a submission ({question_id: raw answer}) for grading.
+
+    Returns False if the student already has a result or a queued submission
+    for the quiz (or the quiz does not exist), True otherwise. A submission
+    that failed to grade is replaced.
+    """
+    with connection.cursor() as cursor:
+        run(cursor, ENQUEUE, {'student_id': student_id, 'quiz_id': quiz_id, 'answers': json.dumps(answers)})
+        return cursor.fetchone() is not None
+
+
+async def aenqueue_submission(student_id, quiz_id, answers):
+    params = {'student_id': student_id, 'quiz_id': quiz_id, 'answers': json.dumps(answers)}
+    return await async_db.fetchone(ENQUEUE, params) is not None
+
+
+def grade_pending(batch_size=GRADING_BATCH_SIZE):
+    """Grade up to batch_size queued submissions. Returns how many were claimed.
+
+    Rows are claimed with SKIP LOCKED so several workers can drain the queue
+    at once, and deleted in the same transaction that records their results.
+    A submission that cannot be graded or recorded goes back in the queue
+    with its attempt count raised and the error noted, without holding up
+    the rest of the batch; after GRADING_MAX_ATTEMPTS it is marked failed
+    and no longer claimed.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("""
+            DELETE FROM quiz_pendingsubmission
+            WHERE submission_id IN (
+                SELECT submission_id FROM quiz_pendingsubmission
+                WHERE NOT failed
+                ORDER BY submission_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING submission_id, student_id, quiz_id, answers, submitted_at, attempts
+        """, [batch_size])
+        claimed = cursor.fetchall()
+        if not claimed:
+            return 0
+
+        # Locked (in record_results' order) before the versions are read, so
+        # a regrade cannot slip in between grading and recording
+        cursor.execute(
+            "SELECT quiz_id, question_version FROM quiz_quiz WHERE quiz_id = ANY(%s) ORDER BY quiz_id FOR UPDATE",
+            [sorted({submission[2] for submission in claimed})]
+        )
+        versions = dict(cursor.fetchall())
+
+        # Django's backend hands jsonb back as text, and JSON keys are strings
+        failed = []
+        by_quiz = {}
+        for submission in claimed:
+            try:
+                answers = {int(question_id): answer for question_id, answer in json.loads(submission[3]).items()}
+            except (TypeError, ValueError, AttributeError) as e:
+                failed.append((submission, e))
+                continue
+            by_quiz.setdefault(submission[2], []).append((submission, answers))
+
+        # Grade each quiz's submissions as one batch against its key
+        graded = []
+        for quiz_id, submissions in by_quiz.items():
+            try:
+                answer_key = get_answer_key(quiz_id, versions[quiz_id])
+                grades = grade_many(answer_key, [answers for _, answers in submissions])
+            except Exception as e:
+                failed.extend((submission, e) for submission, _ in submissions)
+                continue
+            for (submission, _), (score, graded_answers, correct) in zip(submissions, grades):
+                graded.append((submission, (submission[1], quiz_id, score, answer_key.question_ids, graded_answers, correct)))
+
+        # record_results runs in a savepoint; if the batch fails, record the
+        # rows one at a time to set aside only the ones that fail
+        try:
+            record_results([row for _, row in graded])
+        except Exception:
+            for submission, row in graded:
+                try:
+                    record_results([row])
+                except Exception as e:
+                    failed.append((submission, e))
+
+        if failed:
+            cursor.execute(f"""
+                INSERT INTO quiz_pendingsubmission (submission_id, student_id, quiz_id, answers, submitted_at, attempts, last_error, failed)
+                VALUES {', '.join(['(%s, %s, %s, %s::jsonb, %s, %s, %s, %s)'] * len(failed))}
+            """, [
+                value
+                for (submission_id, student_id, quiz_id, answers, submitted_at, attempts), error in failed
+                for value in (submission_id, student_id, quiz_id, answers, submitted_at, attempts + 1,
+                              f'{type(error).__name__}: {error}'[:MAX_ERROR_LENGTH], attempts + 1 >= GRADING_MAX_ATTEMPTS)
+            ])
+        return len(claimed)
+
+
+def failed_submissions(quiz_id=None):
+    """(submission_id, quiz_code, roll_no, student_name, attempts, submitted_at, last_error) of failed submissions"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT p.submission_id, q.quiz_code, s.roll_no, s.student_name, p.attempts, p.submitted_at, p.last_error
+               FROM quiz_pendingsubmission p
+               JOIN quiz_quiz q ON q.quiz_id = p.quiz_id
+               JOIN quiz_student s ON s.student_id = p.student_id
+               WHERE p.failed AND (%(quiz_id)s::integer IS NULL OR p.quiz_id = %(quiz_id)s)
+               ORDER BY p.submission_id""",
+            {'quiz_id': quiz_id}
+        )
+        return cursor.fetchall()
+
+
+def retry_failed(quiz_id=None):
+    """Queue failed submissions for grading again with a fresh attempt count. Returns how many."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """UPDATE quiz_pendingsubmission SET failed = false, attempts = 0
+               WHERE failed AND (%(quiz_id)s::integer IS NULL OR quiz_id = %(quiz_id)s)""",
+            {'quiz_id': quiz_id}
+        )
+        return cursor.rowcount
+
+
+def drop_failed(quiz_id=None):
+    """Delete failed submissions (the students can submit again). Returns how many."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM quiz_pendingsubmission WHERE failed AND (%(quiz_id)s::integer IS NULL OR quiz_id = %(quiz_id)s)",
+            {'quiz_id': quiz_id}
+        )
+        return cursor.rowcount
@@ -0,0 +1,186 @@
+# quiz/item_analysis.py
+import json
+import numpy as np
+from django.db import connection
+from .answer_keys import normalize_answer, parse_correct_answer
+
+CHOICE_LETTERS = ['A', 'B', 'C', 'D']
+
+# Items outside these bounds are flagged for review
+EASY_P_VALUE = 0.9
+HARD_P_VALUE = 0.2
+LOW_DISCRIMINATION = 0.2
+
+
+def load_responses(quiz_id, question_ids):
+    """Build the response matrices for the quiz's current questions.
+
+    Returns (correct, seen, answers): n x k arrays over submissions and
+    question_ids. seen marks questions that existed when the student
+    submitted; correct is only meaningful where seen is set.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT qr.question_ids, qr.answers, qr.correct
+               FROM quiz_quizresponse qr
+               JOIN quiz_result r ON r.result_id = qr.result_id
+               WHERE r.quiz_id = %s""",
+            [quiz_id]
+        )
+        rows = cursor.fetchall()
+
+    n, k = len(rows), len(question_ids)
+    correct = np.zeros((n, k), dtype=bool)
+    seen = np.zeros((n, k), dtype=bool)
+    answers = np.full((n, k), '', dtype=object)
+    column_of = {question_id: j for j, question_id in enumerate(question_ids)}
+
+    # Submissions against the same question set share one layout; unpack each layout in bulk
+    groups = {}
+    for i, (ids, _, _) in enumerate(rows):
+        groups.setdefault(tuple(ids), []).append(i)
+
+    for ids, row_numbers in groups.items():
+        if not ids:
+            continue
+        columns = np.array([column_of.get(question_id, -1) for question_id in ids])
+        keep = columns >= 0
+        if not keep.any():
+            continue
+        row_index = np.array(row_numbers)[:, None]
+        packed = np.frombuffer(b''.join(bytes(rows[i][2]) for i in row_numbers), dtype=np.uint8)
+        bits = np.unpackbits(packed.reshape(len(row_numbers), -1), axis=1)[:, :len(ids)].astype(bool)
+        group_answers = np.array([rows[i][1] for i in row_numbers], dtype=object).reshape(len(row_numbers), len(ids))
+
+        correct[row_index, columns[keep]] = bits[:, keep]
+        seen[row_index, columns[keep]] = True
+        answers[row_index, columns[keep]] = group_answers[:, keep]
+
+    return correct, seen, answers
+
+
+def analyze_items(correct, seen, scores):
+    """Classical test theory statistics over an n x k response matrix.
+
+    Returns (p_values, discrimination, alpha). p_values is the share of
+    students answering each item correctly. discrimination is the corrected
+    point-biserial correlation between each item and the score on the
+    remaining items. alpha is Cronbach's alpha over students who saw every
+    item (None if it cannot be computed). Items nobody saw, or with no
+    variance, get NaN.
+    """
+    scores = np.asarray(scores, dtype=float)
+    x = correct.astype(float)
+    s = seen.astype(float)
+    item_scores = x * scores * s
+    totals = item_scores.sum(axis=1)
+    rest = totals[:, None] - item_scores
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        n_seen = s.sum(axis=0)
+        p_values = (x * s).sum(axis=0) / n_seen
+
+        dx = (x - p_values) * s
+        rest_mean = (rest * s).sum(axis=0) / n_seen
+        dr = (rest - rest_mean) * s
+        discrimination = (dx * dr).sum(axis=0) / np.sqrt((dx * dx).sum(axis=0) * (dr * dr).sum(axis=0))
+
+    alpha = None
+    complete = seen.all(axis=1)
+    k = correct.shape[1]
+    if k > 1 and complete.sum() > 1:
+        complete_scores = item_scores[complete]
+        total_variance = complete_scores.sum(axis=1).var()
+        if total_variance > 0:
+            alpha = float(k / (k - 1) * (1 - complete_scores.var(axis=0).sum() / total_variance))
+
+    return p_values, discrimination, alpha
+
+
+def option_counts(answers, seen, columns, labels):
+    """Count how often each label was chosen in each of the given columns.
+
+    Returns {label: array of counts aligned with columns}, counting only
+    students who saw the item. Answers are compared as short fixed-width
+    strings so the comparison runs in NumPy rather than per object;
+    anything longer than the labels can never match one.
+    """
+    width = max(len(label) for label in labels) + 1
+    chosen = answers[:, columns].astype(f'U{width}')
+    mask = seen[:, columns]
+    return {label: ((chosen == label) & mask).sum(axis=0) for label in labels}
+
+
+def _finite(value):
+    return None if value is None or not np.isfinite(value) else float(value)
+
+
+def quiz_item_analysis(quiz_id):
+    """Item analysis of a quiz's stored responses, ready for the results template"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT question_id, question, question_type, choices, correct_answers, score FROM quiz_quizquestion WHERE quiz_id = %s ORDER BY question_id",
+            [quiz_id]
+        )
+        questions = cursor.fetchall()
+
+    question_ids = [q[0] for q in questions]
+    correct, seen, answers = load_responses(quiz_id, question_ids)
+    p_values, discrimination, alpha = analyze_items(correct, seen, [q[5] for q in questions])
+
+    # Option frequencies for every choice question at once, one pass per question type
+    option_labels = {}
+    for question_type, labels in (('multiple_choice', CHOICE_LETTERS), ('true_false', ['True', 'False'])):
+        columns = [j for j, q in enumerate(questions) if q[2] == question_type]
+        if columns:
+            counts = option_counts(answers, seen, columns, labels)
+            for position, j in enumerate(columns):
+                option_labels[j] = {label: int(counts[label][position]) for label in labels}
+
+    items = []
+    for j, (question_id, text, question_type, choices_json, correct_json, score) in enumerate(questions):
+        key = normalize_answer(question_type, parse_correct_answer(correct_json))
+        responded = int(seen[:, j].sum())
+
+        distractors = []
+        if j in option_labels:
+            if question_type == 'multiple_choice':
+                options = json.loads(choices_json).get('options', []) if choices_json else []
+            else:
+                options = ['True', 'False']
+            counts = option_labels[j]
+            shown = list(counts)[:len(options)]
+            for label, option in zip(shown, options):
+                distractors.append({
+                    'label': label,
+                    'option': option,
+                    'count': counts[label],
+                    'percentage': counts[label] / responded * 100 if responded else 0,
+                    'is_correct': label == key,
+                })
+            other = responded - sum(counts[label] for label in shown)
+            if other:
+                distractors.append({
+                    'label': '—', 'option': 'Blank / other', 'count': other,
+                    'percentage': other / responded * 100, 'is_correct': False,
+                })
+
+        p_value = _finite(p_values[j])
+        disc = _finite(discrimination[j])
+        items.append({
+            'number': j + 1,
+            'question_id': question_id,
+            'question': text,
+            'question_type': question_type,
+            'score': score,
+            'responses': responded,
+            'p_value': p_value,
+            'discrimination': disc,
+            'distractors': distractors,
+            'needs_review': (
+                (p_value is not None and not HARD_P_VALUE <= p_value <= EASY_P_VALUE)
+                or (disc is not None and disc < LOW_DISCRIMINATION)
+            ),
+        })
+
+    return {'items': items, 'alpha': alpha, 'respondents': correct.shape[0]}
@@ -0,0 +1,234 @@
+# quiz/live_results.py
+# Pushes new results to teachers watching a quiz's results page.
+#
+# Whatever records a result (the submit view or a grading worker, in any
+# process) sends a Postgres NOTIFY on RESULTS_CHANNEL as part of the same
+# transaction. Each web process runs one listener thread, started by the
+# first teacher to connect. The thread sleeps in select() until a
+# notification arrives. Then, once per quiz that someone in this process is
+# watching, it reads the quiz's running aggregates and the results newer
+# than each stream's cursor (once per distinct cursor, so streams opened
+# together share one read) and hands each stream its event. Open streams
+# cost nothing in between.
+#
+# result_ids are taken when a result is inserted, not when it commits, so a
+# slower transaction can commit a lower id after a higher one was sent. A
+# stream's cursor therefore trails the newest result it sent by
+# LIVE_RESULTS_SETTLE seconds; the results above it are re-read on each
+# event and the ones already sent are skipped.
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import deque
+import psycopg2
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+RESULTS_CHANNEL = 'quiz_results'
+
+# Seconds between keepalive comments on an idle stream, so proxies do not
+# close it
+LIVE_HEARTBEAT = getattr(settings, 'QUIZ_LIVE_HEARTBEAT', 20)
+
+# New results sent per event; a bigger burst is summarised by its count
+LIVE_RESULTS_LIMIT = 100
+
+# Events buffered per stream before a slow client starts missing some
+LIVE_QUEUE_SIZE = 100
+
+# Seconds a result transaction may take to commit after a later one has;
+# results committed later than that behind the newest sent are not streamed
+LIVE_RESULTS_SETTLE = getattr(settings, 'QUIZ_LIVE_RESULTS_SETTLE', 30)
+
+
+def notify_results(cursor, quiz_ids, kind='result'):
+    """Queue a notification for each quiz; Postgres delivers them when the transaction commits"""
+    cursor.execute(
+        "SELECT pg_notify(%s, json_build_object('quiz_id', quiz_id, 'kind', %s)::text) FROM unnest(%s::integer[]) AS quiz_id",
+        [RESULTS_CHANNEL, kind, list(quiz_ids)]
+    )
+
+
+class ResultHub:
+    """Fans notifications out to the asyncio queues of this process's open streams"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # {quiz_id: {queue: (loop, result_id that stream has read up to)}}
+        self.subscribers = {}
+        self.thread = None
+
+    def subscribe(self, quiz_id, last_result_id):
+        """Register a stream; events are put on the returned queue from the listener thread"""
+        queue = asyncio.Queue(LIVE_QUEUE_SIZE)
+        with self.lock:
+            streams = self.subscribers.setdefault(quiz_id, {})
+            streams[queue] = (asyncio.get_running_loop(), last_result_id)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.listen, name='quiz-live-results', daemon=True)
+                self.thread.start()
+        return queue
+
+    def unsubscribe(self, quiz_id, queue):
+        with self.lock:
+            streams = self.subscribers.get(quiz_id, {})
+            streams.pop(queue, None)
+            if not streams:
+                self.subscribers.pop(quiz_id, None)
+
+    def advance(self, quiz_id, queue, since):
+        """Record that a stream only needs the results after since"""
+        with self.lock:
+            streams = self.subscribers.get(quiz_id, {})
+            if queue in streams:
+                loop, _ = streams[queue]
+                streams[queue] = (loop, since)
+
+    def listen(self):
+        while True:
+            try:
+                # A dedicated connection, outside the pool: it stays in LISTEN for good
+                conn = psycopg2.connect(**connection.get_connection_params())
+                conn.autocommit = True
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(f'LISTEN {RESULTS_CHANNEL}')
+                    while True:
+                        if select.select([conn], [], [], 60) == ([], [], []):
+                            continue
+                        conn.poll()
+                        notifies = list(conn.notifies)
+                        conn.notifies.clear()
+                        self.dispatch(conn, notifies)
+                finally:
+                    conn.close()
+            except Exception:
+                logger.exception('Live results listener failed; reconnecting')
+                time.sleep(5)
+
+    def dispatch(self, conn, notifies):
+        # A burst of submissions arrives as many notifications; each watched
+        # quiz is read once per wakeup however many there were
+        kinds = {}
+        for notify in notifies:
+            message = json.loads(notify.payload)
+            kinds.setdefault(message['quiz_id'], set()).add(message['kind'])
+
+        for quiz_id, quiz_kinds in kinds.items():
+            with self.lock:
+                streams = list(self.subscribers.get(quiz_id, {}).items())
+            if not streams:
+                continue
+            stats = load_stats(conn, quiz_id)
+            events = {}
+            for queue, (loop, since) in streams:
+                if since not in events:
+                    events[since] = load_event(conn, quiz_id, since, stats, regraded='regraded' in quiz_kinds)
+                loop.call_soon_threadsafe(_offer, queue, events[since])
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass  # the next event carries fresh aggregates anyway
+
+
+def load_stats(conn, quiz_id):
+    """The quiz's current aggregates"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """SELECT q.submission_count, q.top_score, q.score_avg,
+                      (SELECT COALESCE(SUM(score), 0) FROM quiz_quizquestion WHERE quiz_id = q.quiz_id)
+               FROM quiz_quiz q WHERE q.quiz_id = %s""",
+            [quiz_id]
+        )
+        submission_count, top_score, score_avg, total_possible = cursor.fetchone()
+    return {
+        'total_students': submission_count,
+        'highest_score': top_score,
+        'average_score': score_avg,
+        'total_possible': total_possible,
+        'average_percentage': (score_avg / total_possible * 100) if total_possible > 0 else 0,
+    }
+
+
+def load_event(conn, quiz_id, since, stats, regraded=False):
+    """The event with the results after since, for the streams read up to it"""
+    total_possible = stats['total_possible']
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """SELECT r.result_id, r.score, s.student_name, s.roll_no, COUNT(*) OVER ()
+               FROM quiz_result r
+               JOIN quiz_student s ON r.student_id = s.student_id
+               WHERE r.quiz_id = %s AND r.result_id > %s
+               ORDER BY r.result_id DESC
+               LIMIT %s""",
+            [quiz_id, since, LIVE_RESULTS_LIMIT]
+        )
+        rows = cursor.fetchall()
+
+    return {
+        'kind': 'regraded' if regraded else 'result',
+        'since': since,
+        'new_results': rows[0][4] if rows else 0,
+        'stats': stats,
+        'results': [
+            {
+                'result_id': r[0],
+                'score': r[1],
+                'percentage': (r[1] / total_possible * 100) if total_possible > 0 else 0,
+                'student_name': r[2],
+                'roll_no': r[3],
+            }
+            for r in reversed(rows)
+        ],
+    }
+
+
+hub = ResultHub()
+
+
+async def result_events(quiz_id, last_result_id):
+    """Server-sent event stream of a quiz's new results, for StreamingHttpResponse"""
+    queue = hub.subscribe(quiz_id, last_result_id)
+    # Results after since are re-read on every event; sent holds the ones
+    # already sent, and marks (time, highest result_id sent) moves since up
+    # once LIVE_RESULTS_SETTLE has passed
+    since, sent, marks = last_result_id, set(), deque()
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), LIVE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            loaded = [result['result_id'] for result in event['results']]
+            results = [result for result in event['results'] if result['result_id'] > since and result['result_id'] not in sent]
+            # The event counts every result after its own since; take off the
+            # ones this stream has already sent
+            already = sum(1 for result_id in sent if result_id > event['since'])
+            already += sum(1 for result_id in loaded if event['since'] < result_id <= since)
+            event = {**event, 'results': results, 'new_results': max(event['new_results'] - already, 0)}
+            sent.update(result['result_id'] for result in results)
+
+            now = time.monotonic()
+            if sent:
+                marks.append((now, max(sent)))
+            while marks and marks[0][0] <= now - LIVE_RESULTS_SETTLE:
+                since = max(since, marks.popleft()[1])
+            if len(loaded) < event['new_results'] + already:
+                # A burst past LIVE_RESULTS_LIMIT: its unlisted results are
+                # counted now and must not be counted again
+                since = max(since, loaded[0] - 1)
+            sent = {result_id for result_id in sent if result_id > since}
+            hub.advance(quiz_id, queue, since)
+            yield f"event: {event['kind']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        hub.unsubscribe(quiz_id, queue)
@@ -0,0 +1,127 @@
+import json
+import platform
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from quiz.answer_keys import AnswerKey
+from quiz.grading import grade, grade_many
+
+QUESTION_TYPES = ['multiple_choice', 'multiple_choice', 'true_false', 'short_answer']
+
+
+def synthetic_key(questions, rng):
+    """An answer key with a realistic mix of question types, built without the database"""
+    question_ids = tuple(range(1, questions + 1))
+    question_types = tuple(rng.choice(QUESTION_TYPES) for _ in question_ids)
+    answers = []
+    for question_type in question_types:
+        if question_type == 'multiple_choice':
+            answers.append(rng.choice('ABCD'))
+        elif question_type == 'true_false':
+            answers.append(rng.choice(['True', 'False']))
+        else:
+            answers.append(f'answer {rng.randrange(100)}')
+    scores = tuple(float(rng.choice([1, 2, 5])) for _ in question_ids)
+    return AnswerKey(0, 0, question_ids, question_types, tuple(answers), scores, sum(scores))
+
+
+def synthetic_submissions(key, count, rng):
+    # Mostly right, sometimes wrong, sometimes blank, with the stray
+    # whitespace and capitalization normalization has to cope with
+    submissions = []
+    for _ in range(count):
+        answers = {}
+        for question_id, question_type, expected in zip(key.question_ids, key.question_types, key.answers):
+            roll = rng.random()
+            if roll < 0.05:
+                continue
+            if roll < 0.7:
+                answers[question_id] = f' {expected.upper()} ' if question_type == 'short_answer' else expected
+            else:
+                answers[question_id] = 'wrong'
+        submissions.append(answers)
+    return submissions
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the grading engine on synthetic quizzes; optionally fail on regression against a baseline'
+
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case; the fastest is reported')
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiply the submission counts, e.g. 0.1 for a quick run')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+        parser.add_argument('--baseline', help='Previous report to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Fail if a case is this fraction slower than the baseline')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        scale = options['scale']
+
+        # (name, questions, submissions, batch)
+        cases = [
+            ('single_1k_questions', 1000, max(1, int(200 * scale)), False),
+            ('single_20_questions', 20, max(1, int(10000 * scale)), False),
+            ('batch_1k_questions', 1000, max(1, int(1000 * scale)), True),
+            ('batch_100k_submissions', 20, max(1, int(100000 * scale)), True),
+        ]
+
+        results = {}
+        for name, questions, count, batch in cases:
+            key = synthetic_key(questions, rng)
+            submissions = synthetic_submissions(key, count, rng)
+            best = min(self.time_case(key, submissions, batch) for _ in range(max(1, options['repeat'])))
+            results[name] = {
+                'questions': questions,
+                'submissions': count,
+                'seconds': round(best, 6),
+                'submissions_per_second': round(count / best, 1),
+                'answers_per_second': round(count * questions / best, 1),
+            }
+            self.stderr.write(f"{name}: {results[name]['submissions_per_second']:,.0f} submissions/s")
+
+        report = {
+            'python': platform.python_version(),
+            'repeat': options['repeat'],
+            'scale': scale,
+            'cases': results,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def time_case(self, key, submissions, batch):
+        started = time.perf_counter()
+        if batch:
+            grade_many(key, submissions)
+        else:
+            for answers in submissions:
+                grade(key, answers)
+        return time.perf_counter() - started
+
+    def compare(self, results, baseline_path, tolerance):
+        with open(baseline_path) as f:
+            baseline = json.load(f)['cases']
+
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]['answers_per_second']
+            after = result['answers_per_second']
+            change = after / before - 1
+            self.stderr.write(f'{name}: {change:+.1%} vs baseline')
+            if change < -tolerance:
+                regressions.append(name)
+
+        if regressions:
+            raise CommandError(f"Grading throughput regressed in: {', '.join(regressions)}")
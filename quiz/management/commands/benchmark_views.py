@@ -0,0 +1,258 @@
+import asyncio
+import json
+import platform
+import time
+import uuid
+from urllib.parse import urlencode
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.crypto import get_random_string
+from accounts import async_views as accounts_async_views
+from accounts import views as accounts_views
+from quiz import async_views, views
+from quiz.management.commands.loadtest import percentile
+from quiz.management.utils import require_local_database
+from quiz.models import Quiz, Student, Teacher
+from quiz.question_import import insert_questions
+from quiz.utils import add_student_to_quiz, bump_question_version
+
+# The views each mode serves, by URL name
+MODES = {
+    'sync': {
+        'student_dashboard': accounts_views.student_dashboard,
+        'join_quiz': views.join_quiz,
+        'take_quiz': views.take_quiz,
+        'submit_quiz': views.submit_quiz,
+    },
+    'async': {
+        'student_dashboard': accounts_async_views.student_dashboard,
+        'join_quiz': async_views.join_quiz,
+        'take_quiz': async_views.take_quiz,
+        'submit_quiz': async_views.submit_quiz,
+    },
+}
+
+
+class BenchmarkHandler(ASGIHandler):
+    """The project's ASGI application with the benchmarked views swapped in, whatever QUIZ_ASYNC_VIEWS says"""
+
+    def __init__(self, views_by_name):
+        super().__init__()
+        self.views_by_name = views_by_name
+
+    def resolve_request(self, request):
+        match = super().resolve_request(request)
+        if match.url_name in self.views_by_name:
+            match.func = self.views_by_name[match.url_name]
+        return match
+
+
+async def asgi_request(app, method, path, session_key, csrf_token, data=None):
+    """Send one request straight to the ASGI application; returns (status, location)"""
+    body = urlencode(data or {}).encode()
+    headers = [
+        (b'host', b'localhost'),
+        (b'cookie', f'sessionid={session_key}; csrftoken={csrf_token}'.encode()),
+    ]
+    if method == 'POST':
+        headers += [
+            (b'content-type', b'application/x-www-form-urlencoded'),
+            (b'content-length', str(len(body)).encode()),
+            (b'x-csrftoken', csrf_token.encode()),
+        ]
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': method, 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': headers, 'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+    }
+    request_sent = False
+    finished = asyncio.Event()
+    response = {}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['location'] = dict(message['headers']).get(b'Location', b'').decode()
+        elif not message.get('more_body'):
+            finished.set()
+
+    await app(scope, receive, send)
+    return response['status'], response['location']
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the sync and async versions of the student views in-process through the ASGI '
+        'application and report requests/sec for one worker'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200, help='Students per mode; each submits once')
+        parser.add_argument('--questions', type=int, default=10, help='Multiple choice questions in the quiz')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--rounds', type=int, default=3, help='Dashboard/take/join requests per student')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark users and quiz instead of deleting them')
+        parser.add_argument('--i-know', action='store_true', help='Run even though the database is not on this machine')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The quiz views use PostgreSQL-specific SQL; point DATABASES at PostgreSQL.')
+        if options['students'] < 1 or options['questions'] < 1:
+            raise CommandError('--students and --questions must be at least 1.')
+        require_local_database(options['i_know'])
+
+        self.options = options
+        self.run_id = uuid.uuid4().hex[:8]
+        self.email_domain = f'benchmark-{self.run_id}.example.com'
+
+        try:
+            quiz_id, quiz_code, question_ids = self.set_up_quiz()
+            results = {}
+            for mode, views_by_name in MODES.items():
+                students = self.set_up_students(mode, quiz_id)
+                connection.close()
+                results[mode] = asyncio.run(self.run_mode(BenchmarkHandler(views_by_name), students, quiz_id, quiz_code, question_ids))
+                for scenario, result in results[mode].items():
+                    self.stderr.write(f"{mode} {scenario}: {result['requests_per_second']:,.0f} req/s")
+        finally:
+            connection.close()
+            if not options['keep']:
+                self.clean_up()
+
+        report = {
+            'python': platform.python_version(),
+            'students': options['students'],
+            'questions': options['questions'],
+            'concurrency': options['concurrency'],
+            'rounds': options['rounds'],
+            'async_grading': getattr(settings, 'QUIZ_ASYNC_GRADING', False),
+            'modes': results,
+            'speedup': {
+                scenario: round(results['async'][scenario]['requests_per_second'] / results['sync'][scenario]['requests_per_second'], 2)
+                for scenario in results['sync']
+            },
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def set_up_quiz(self):
+        teacher_email = f'teacher@{self.email_domain}'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO quiz_teacher (teacher_name, teacher_email, dept, subject) VALUES (%s, %s, %s, %s) RETURNING teacher_id",
+                [f'bench-{self.run_id}', teacher_email, 'Benchmark', 'Benchmark']
+            )
+            teacher_id = cursor.fetchone()[0]
+            quiz_code = self.run_id.upper()
+            cursor.execute(
+                """INSERT INTO quiz_quiz (quiz_name, quiz_code, subject, topic, top_score, score_avg, teacher_id,
+                                          submission_count, score_sum, score_sq_sum, question_version, enrolled_count)
+                   VALUES (%s, %s, 'Benchmark', %s, 0, 0, %s, 0, 0, 0, 0, 0) RETURNING quiz_id""",
+                [f'Benchmark {self.run_id}', quiz_code, self.run_id, teacher_id]
+            )
+            quiz_id = cursor.fetchone()[0]
+
+        insert_questions(quiz_id, [
+            (f'Benchmark question {n + 1}', 'multiple_choice',
+             json.dumps({'options': ['Alpha', 'Bravo', 'Charlie', 'Delta']}), json.dumps({'answer': 'B'}), 1.0)
+            for n in range(self.options['questions'])
+        ])
+        bump_question_version(quiz_id)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT question_id FROM quiz_quizquestion WHERE quiz_id = %s ORDER BY question_id", [quiz_id])
+            question_ids = [row[0] for row in cursor.fetchall()]
+        return quiz_id, quiz_code, question_ids
+
+    def set_up_students(self, mode, quiz_id):
+        """Enrolled students with logged-in sessions, created directly rather than through the views.
+        Returns (session_key, csrf_token) pairs."""
+        User = get_user_model()
+        students = []
+        for n in range(self.options['students']):
+            email = f'{mode}-s{n}@{self.email_domain}'
+            user = User(username=f'bench{self.run_id}-{mode}-{n}', email=email)
+            user.set_unusable_password()
+            user.save()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO quiz_student (student_name, student_email, roll_no, student_class) VALUES (%s, %s, %s, %s) RETURNING student_id",
+                    [user.username, email, f'B{n}', f'Bench-{self.run_id}']
+                )
+                add_student_to_quiz(cursor.fetchone()[0], quiz_id)
+
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            students.append((session.session_key, get_random_string(32)))
+        return students
+
+    async def run_mode(self, app, students, quiz_id, quiz_code, question_ids):
+        answers = {f'question_{question_id}': 'B' for question_id in question_ids}
+        rounds = range(self.options['rounds'])
+        # Warm the caches and connections so neither mode pays for them in the timings
+        await self.run_scenario(app, [(students[0], 'GET', f'/quiz/{quiz_id}/take/', None)])
+
+        return {
+            'student_dashboard': await self.run_scenario(
+                app, [(student, 'GET', '/accounts/student/dashboard/', None) for _ in rounds for student in students]),
+            'join_quiz': await self.run_scenario(
+                app, [(student, 'POST', '/quiz/join/', {'code': quiz_code}) for _ in rounds for student in students]),
+            'take_quiz': await self.run_scenario(
+                app, [(student, 'GET', f'/quiz/{quiz_id}/take/', None) for _ in rounds for student in students]),
+            'submit_quiz': await self.run_scenario(
+                app, [(student, 'POST', f'/quiz/{quiz_id}/submit/', answers) for student in students]),
+        }
+
+    async def run_scenario(self, app, calls):
+        semaphore = asyncio.Semaphore(max(1, self.options['concurrency']))
+        latencies = []
+        errors = 0
+
+        async def call(student, method, path, data):
+            nonlocal errors
+            session_key, csrf_token = student
+            async with semaphore:
+                started = time.perf_counter()
+                status, location = await asgi_request(app, method, path, session_key, csrf_token, data)
+                latencies.append(time.perf_counter() - started)
+            if status >= 400 or '/login/' in location:
+                errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(call(*c) for c in calls))
+        duration = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'requests': len(calls),
+            'errors': errors,
+            'seconds': round(duration, 3),
+            'requests_per_second': round(len(calls) / duration, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        }
+
+    def clean_up(self):
+        Quiz.objects.filter(quiz_name=f'Benchmark {self.run_id}').delete()
+        Student.objects.filter(student_email__endswith=f'@{self.email_domain}').delete()
+        Teacher.objects.filter(teacher_email__endswith=f'@{self.email_domain}').delete()
+        get_user_model().objects.filter(email__endswith=f'@{self.email_domain}').delete()
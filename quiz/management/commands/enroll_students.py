@@ -0,0 +1,42 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from quiz.management.utils import resolve_quiz
+from quiz.utils import bulk_add_students_to_quiz
+
+
+class Command(BaseCommand):
+    help = ('Enroll a whole class or a list of roll numbers into a quiz. With --class, roll numbers are '
+            'looked up within that class.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz', help='Quiz id or quiz code')
+        parser.add_argument('--class', dest='student_class', help='Enroll every student in this class, or only the listed roll numbers in it')
+        parser.add_argument('--roll-nos', nargs='+', default=None, help='Roll numbers to enroll')
+        parser.add_argument('--roll-file', help='File with one roll number per line (first CSV column)')
+
+    def handle(self, *args, **options):
+        quiz_id = resolve_quiz(options['quiz'])
+
+        roll_nos = None
+        if options['roll_nos'] or options['roll_file']:
+            roll_nos = list(options['roll_nos'] or [])
+            if options['roll_file']:
+                with open(options['roll_file'], newline='', encoding='utf-8-sig') as f:
+                    roll_nos.extend(row[0] for row in csv.reader(f) if row)
+
+        if options['student_class'] is None and roll_nos is None:
+            raise CommandError('Pass --class, --roll-nos or --roll-file.')
+
+        counts = bulk_add_students_to_quiz(quiz_id, student_class=options['student_class'], roll_nos=roll_nos)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Enrolled {counts['enrolled']}, skipped {counts['skipped']} already enrolled, "
+            f"{counts['unknown']} unknown"
+        ))
+        if counts['unknown_roll_nos']:
+            self.stdout.write('Unknown roll numbers: ' + ', '.join(counts['unknown_roll_nos']))
+        if counts['ambiguous_roll_nos']:
+            self.stderr.write(self.style.WARNING(
+                'These roll numbers matched students in more than one class, all of whom were enrolled '
+                '(pass --class to pick one): ' + ', '.join(counts['ambiguous_roll_nos'])
+            ))
@@ -0,0 +1,83 @@
+import threading
+from django.core.management.base import BaseCommand
+from django.db import connection
+from quiz.grading_queue import GRADING_BATCH_SIZE, drop_failed, failed_submissions, grade_pending, retry_failed
+from quiz.management.utils import resolve_quiz
+
+
+class Command(BaseCommand):
+    help = 'Grade submissions queued by submit_quiz when QUIZ_ASYNC_GRADING is on'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of worker threads')
+        parser.add_argument('--batch-size', type=int, default=GRADING_BATCH_SIZE, help='Submissions graded per transaction')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained')
+        failed = parser.add_mutually_exclusive_group()
+        failed.add_argument('--list-failed', action='store_true', help='List submissions that could not be graded and exit')
+        failed.add_argument('--retry-failed', action='store_true', help='Queue submissions that could not be graded again and exit')
+        failed.add_argument('--drop-failed', action='store_true', help='Delete submissions that could not be graded and exit')
+        parser.add_argument('--quiz', help='Limit the failed-submission options to one quiz (id or code)')
+
+    def handle(self, *args, **options):
+        if options['list_failed'] or options['retry_failed'] or options['drop_failed']:
+            return self.handle_failed(options)
+
+        self.stop = threading.Event()
+        self.graded = 0
+        self.graded_lock = threading.Lock()
+
+        workers = [
+            threading.Thread(target=self.work, args=(options,), name=f'grader-{n}', daemon=True)
+            for n in range(max(1, options['workers']))
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop.set()
+            for worker in workers:
+                worker.join()
+
+        self.stdout.write(self.style.SUCCESS(f'Graded {self.graded} submissions'))
+
+    def work(self, options):
+        # Each thread gets its own database connection; close it on the way out
+        try:
+            while not self.stop.is_set():
+                try:
+                    claimed = grade_pending(options['batch_size'])
+                except Exception as e:
+                    self.stderr.write(f'{threading.current_thread().name}: grading failed: {e}')
+                    connection.close()
+                    if options['once']:
+                        break
+                    self.stop.wait(options['poll_interval'])
+                    continue
+
+                if claimed:
+                    with self.graded_lock:
+                        self.graded += claimed
+                elif options['once']:
+                    break
+                else:
+                    self.stop.wait(options['poll_interval'])
+        finally:
+            connection.close()
+
+    def handle_failed(self, options):
+        quiz_id = resolve_quiz(options['quiz']) if options['quiz'] else None
+        if options['retry_failed']:
+            self.stdout.write(self.style.SUCCESS(f'Queued {retry_failed(quiz_id)} failed submissions again'))
+        elif options['drop_failed']:
+            self.stdout.write(self.style.SUCCESS(f'Dropped {drop_failed(quiz_id)} failed submissions'))
+        else:
+            for submission_id, quiz_code, roll_no, student_name, attempts, submitted_at, last_error in failed_submissions(quiz_id):
+                self.stdout.write(
+                    f'#{submission_id} {quiz_code} {roll_no} ({student_name}), '
+                    f'submitted {submitted_at:%Y-%m-%d %H:%M}, {attempts} attempts: {last_error}'
+                )
@@ -0,0 +1,365 @@
+import http.cookiejar
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve
+from quiz.management.utils import is_local_host, require_local_database
+from quiz.models import Quiz, Student, Teacher
+
+CHOICE_LETTERS = ['A', 'B', 'C', 'D']
+QUESTION_FIELD = re.compile(r'name="question_(\d+)"')
+# First page of a paged quiz, embedded with json_script
+FIRST_PAGE = re.compile(r'<script id="first-page" type="application/json">(.*?)</script>', re.S)
+
+
+def percentile(ordered, pct):
+    # Nearest-rank percentile of an already sorted list
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Recorder:
+    """Thread-safe collector of (view, latency, queries, status) samples"""
+
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.enabled = False
+
+    def add(self, view, seconds, queries, status):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.samples.setdefault(view, []).append((seconds, queries, status))
+
+    def report(self, duration):
+        views = {}
+        total_requests = total_errors = 0
+        for view, samples in sorted(self.samples.items()):
+            latencies = sorted(s[0] * 1000 for s in samples)
+            queries = [s[1] for s in samples if s[1] is not None]
+            errors = sum(1 for s in samples if s[2] is None or s[2] >= 400)
+            total_requests += len(samples)
+            total_errors += errors
+            views[view] = {
+                'count': len(samples),
+                'errors': errors,
+                'throughput_rps': round(len(samples) / duration, 3) if duration else None,
+                'latency_ms': {
+                    'mean': round(sum(latencies) / len(latencies), 3),
+                    'p50': round(percentile(latencies, 50), 3),
+                    'p95': round(percentile(latencies, 95), 3),
+                    'p99': round(percentile(latencies, 99), 3),
+                    'max': round(latencies[-1], 3),
+                },
+                'queries': {
+                    'mean': round(sum(queries) / len(queries), 3),
+                    'max': max(queries),
+                } if queries else None,
+            }
+        return {
+            'totals': {
+                'requests': total_requests,
+                'errors': total_errors,
+                'throughput_rps': round(total_requests / duration, 3) if duration else None,
+            },
+            'views': views,
+        }
+
+
+class InProcessClient:
+    """Drives the views through Django's test client, counting queries per request"""
+
+    def __init__(self, host):
+        self.client = Client(HTTP_HOST=host)
+
+    def request(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'POST':
+                response = self.client.post(path, data or {})
+            else:
+                response = self.client.get(path)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, response.get('Location'), body.decode('utf-8', 'replace'), len(queries)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """Drives a running server over HTTP. Query counts are not visible from here."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect()
+        )
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return ''
+
+    def request(self, method, path, data=None):
+        url = self.base_url + path
+        body = None
+        headers = {}
+        if method == 'POST':
+            body = urllib.parse.urlencode(data or {}).encode()
+            headers = {'X-CSRFToken': self.csrf_token(), 'Referer': url}
+        try:
+            with self.opener.open(urllib.request.Request(url, data=body, headers=headers, method=method)) as response:
+                return response.status, response.headers.get('Location'), response.read().decode('utf-8', 'replace'), None
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Location'), e.read().decode('utf-8', 'replace'), None
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate a class taking a quiz: N students register, join, take and submit '
+        'while a teacher polls the results page. Writes per-view latency, throughput '
+        'and queries per request as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=50, help='Number of simulated students')
+        parser.add_argument('--questions', type=int, default=10, help='Multiple choice questions in the quiz')
+        parser.add_argument('--concurrency', type=int, default=50, help='Maximum students active at once')
+        parser.add_argument('--think-time', type=float, nargs=2, default=[1.0, 5.0], metavar=('MIN', 'MAX'),
+                            help='Seconds a student pauses between steps, drawn uniformly')
+        parser.add_argument('--answer-time', type=float, nargs=2, default=[0.5, 2.0], metavar=('MIN', 'MAX'),
+                            help='Seconds spent on each question before submitting')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between teacher results polls')
+        parser.add_argument('--accuracy', type=float, default=0.7, help='Chance a student answers a question correctly')
+        parser.add_argument('--url', help='Base URL of a running server; default drives the views in-process')
+        parser.add_argument('--host', default='localhost', help='Host header for in-process requests')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible runs')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+        parser.add_argument('--keep', action='store_true', help='Keep the simulated users and quiz instead of deleting them')
+        parser.add_argument('--i-know', action='store_true', help='Run even though the database or --url is not on this machine')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The quiz views use PostgreSQL-specific SQL; point DATABASES at PostgreSQL.')
+        if options['students'] < 1 or options['questions'] < 1:
+            raise CommandError('--students and --questions must be at least 1.')
+        require_local_database(options['i_know'])
+        if options['url'] and not options['i_know'] and not is_local_host(urllib.parse.urlsplit(options['url']).hostname):
+            raise CommandError(f"{options['url']} is not on this machine. Pass --i-know to load it anyway.")
+
+        self.options = options
+        self.run_id = uuid.uuid4().hex[:8]
+        self.email_domain = f'loadtest-{self.run_id}.example.com'
+        self.password = f'Lt-{uuid.uuid4().hex}'
+        self.random = random.Random(options['seed'])
+        self.recorder = Recorder()
+        self.done = threading.Event()
+
+        try:
+            teacher = self.new_client()
+            quiz_id, quiz_code, key = self.set_up_quiz(teacher)
+
+            seeds = [self.random.random() for _ in range(options['students'])]
+            self.recorder.enabled = True
+            started = time.perf_counter()
+
+            poller = threading.Thread(target=self.poll_results, args=(teacher, quiz_id), daemon=True)
+            poller.start()
+            with ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as pool:
+                sessions = [
+                    pool.submit(self.student_session, n, quiz_id, quiz_code, key, random.Random(seed))
+                    for n, seed in enumerate(seeds)
+                ]
+            failures = [s.exception() for s in sessions if s.exception() is not None]
+            self.done.set()
+            poller.join()
+
+            duration = time.perf_counter() - started
+            self.recorder.enabled = False
+        finally:
+            connection.close()
+            if not options['keep']:
+                self.clean_up()
+
+        report = {
+            'run': {
+                'id': self.run_id,
+                'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'mode': 'http' if options['url'] else 'in-process',
+                'url': options['url'],
+                'students': options['students'],
+                'questions': options['questions'],
+                'concurrency': options['concurrency'],
+                'think_time': options['think_time'],
+                'answer_time': options['answer_time'],
+                'poll_interval': options['poll_interval'],
+                'seed': options['seed'],
+                'async_grading': getattr(settings, 'QUIZ_ASYNC_GRADING', False),
+                'duration_s': round(duration, 3),
+                'failed_sessions': len(failures),
+            },
+            **self.recorder.report(duration),
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
+        for failure in failures[:5]:
+            self.stderr.write(f'Session failed: {failure}')
+
+    def new_client(self):
+        if self.options['url']:
+            return HttpClient(self.options['url'])
+        return InProcessClient(self.options['host'])
+
+    def visit(self, client, method, path, data=None):
+        """Make a request and follow its redirects, recording each hop under its view name"""
+        for _ in range(5):
+            started = time.perf_counter()
+            status, location, body, queries = client.request(method, path, data)
+            elapsed = time.perf_counter() - started
+            try:
+                view = resolve(path.split('?')[0]).url_name or path
+            except Resolver404:
+                view = path
+            self.recorder.add(view, elapsed, queries, status)
+
+            if status not in (301, 302, 303) or not location:
+                return status, path, body
+            path = urllib.parse.urlsplit(location)._replace(scheme='', netloc='').geturl()
+            method, data = 'GET', None
+        return status, path, body
+
+    def register(self, client, role, name, extra):
+        client.request('GET', f'/accounts/register/{role}/')  # sets the CSRF cookie over HTTP
+        status, path, _ = self.visit(client, 'POST', f'/accounts/register/{role}/', {
+            'username': name,
+            'email': f'{name}@{self.email_domain}',
+            'password1': self.password,
+            'password2': self.password,
+            **extra,
+        })
+        if not path.startswith(f'/accounts/{role}/dashboard/'):
+            raise CommandError(f'Registering {role} {name} failed (HTTP {status} at {path}).')
+
+    def set_up_quiz(self, teacher):
+        self.register(teacher, 'teacher', f'lt{self.run_id}-teacher', {'dept': 'Load test', 'subject': 'Load test'})
+
+        quiz_name = f'Load test {self.run_id}'
+        teacher.request('GET', '/quiz/create/')
+        teacher.request('POST', '/quiz/create/', {'quiz_name': quiz_name, 'subject': 'Load test', 'topic': self.run_id})
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT quiz_id, quiz_code FROM quiz_quiz WHERE quiz_name = %s", [quiz_name])
+            row = cursor.fetchone()
+        if not row:
+            raise CommandError('Creating the load test quiz failed.')
+        quiz_id, quiz_code = row
+
+        key = []
+        teacher.request('GET', f'/quiz/{quiz_id}/add_question/')
+        for n in range(self.options['questions']):
+            correct = self.random.choice(CHOICE_LETTERS)
+            key.append(correct)
+            teacher.request('POST', f'/quiz/{quiz_id}/add_question/', {
+                'question': f'Load test question {n + 1}',
+                'question_type': 'multiple_choice',
+                'choice_a': 'Alpha', 'choice_b': 'Bravo', 'choice_c': 'Charlie', 'choice_d': 'Delta',
+                'correct_choice': correct,
+                'score': '1',
+            })
+        return quiz_id, quiz_code, key
+
+    def think(self, rng, bounds):
+        time.sleep(rng.uniform(*bounds))
+
+    def student_session(self, n, quiz_id, quiz_code, key, rng):
+        client = self.new_client()
+        try:
+            self.think(rng, self.options['think_time'])
+            name = f'lt{self.run_id}-s{n}'
+            self.register(client, 'student', name, {'roll_no': f'LT{n}', 'student_class': f'LT-{self.run_id}'})
+
+            self.think(rng, self.options['think_time'])
+            client.request('GET', '/quiz/join/')
+            self.visit(client, 'POST', '/quiz/join/', {'code': quiz_code})
+
+            self.think(rng, self.options['think_time'])
+            status, _, body = self.visit(client, 'GET', f'/quiz/{quiz_id}/take/')
+            if status != 200:
+                raise CommandError(f'Student {n} could not open the quiz (HTTP {status}).')
+
+            first_page = FIRST_PAGE.search(body)
+            if first_page:
+                answers = self.answer_pages(client, quiz_id, key, rng, json.loads(first_page.group(1)))
+            else:
+                question_ids = sorted(int(q) for q in set(QUESTION_FIELD.findall(body)))
+                answers = self.answer(question_ids, key, rng)
+            self.visit(client, 'POST', f'/quiz/{quiz_id}/submit/', answers)
+
+            self.think(rng, self.options['think_time'])
+            self.visit(client, 'GET', f'/quiz/{quiz_id}/student-results/')
+        finally:
+            connection.close()
+
+    def answer(self, question_ids, key, rng):
+        # key is ordered like question_ids (creation order)
+        answers = {}
+        for question_id, correct in zip(question_ids, key):
+            self.think(rng, self.options['answer_time'])
+            answers[f'question_{question_id}'] = (
+                correct if rng.random() < self.options['accuracy'] else rng.choice(CHOICE_LETTERS)
+            )
+        return answers
+
+    def answer_pages(self, client, quiz_id, key, rng, page):
+        """Work through a paged quiz, saving each page's answers as the browser does.
+        Returns the last page's answers, which go out with the submit."""
+        while True:
+            offset = page['questions'][0]['number'] - 1 if page['questions'] else 0
+            question_ids = [q['question_id'] for q in page['questions']]
+            answers = self.answer(question_ids, key[offset:], rng)
+            if page['page'] >= page['pages']:
+                return answers
+            self.visit(client, 'POST', f'/quiz/{quiz_id}/autosave/', answers)
+            status, _, body = self.visit(client, 'GET', f"/quiz/{quiz_id}/questions/?page={page['page'] + 1}")
+            if status != 200:
+                raise CommandError(f'Loading page {page["page"] + 1} failed (HTTP {status}).')
+            page = json.loads(body)
+
+    def poll_results(self, teacher, quiz_id):
+        try:
+            while not self.done.is_set():
+                self.visit(teacher, 'GET', f'/quiz/{quiz_id}/results/')
+                self.done.wait(self.options['poll_interval'])
+        finally:
+            connection.close()
+
+    def clean_up(self):
+        Quiz.objects.filter(quiz_name=f'Load test {self.run_id}').delete()
+        Student.objects.filter(student_email__endswith=f'@{self.email_domain}').delete()
+        Teacher.objects.filter(teacher_email__endswith=f'@{self.email_domain}').delete()
+        get_user_model().objects.filter(email__endswith=f'@{self.email_domain}').delete()
@@ -0,0 +1,77 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from quiz.answer_keys import answer_key_cache_key, compile_answer_key
+from quiz.code_lookup import QUIZ_CODE_CACHE_TIMEOUT, quiz_code_key
+from quiz.management.utils import resolve_quiz
+from quiz.question_cache import (
+    QUESTION_CACHE_TIMEOUT, load_question_page, question_block_key, question_page_key, quiz_cache, quiz_cache_is_shared,
+    render_question_block,
+)
+from quiz.schedule import cache_quiz_window, make_window
+from quiz.views import PAGED_QUESTION_THRESHOLD
+
+QUIZ_COLUMNS = "quiz_id, quiz_code, quiz_name, question_version, opens_at, closes_at"
+
+
+class Command(BaseCommand):
+    help = ("Fill the quiz cache ahead of scheduled openings: code lookup, opening window, answer key and "
+            "questions. Run it every few minutes (e.g. from cron).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('quizzes', nargs='*', help='Quiz ids or codes (default: quizzes opening within --ahead minutes)')
+        parser.add_argument('--ahead', type=int, default=15, help='Warm quizzes opening within this many minutes (default 15)')
+
+    def handle(self, *args, **options):
+        if not quiz_cache_is_shared():
+            self.stderr.write(self.style.WARNING(
+                'The quiz cache is private to this process; point QUIZ_CACHE_ALIAS at a shared cache for warming to reach the servers.'
+            ))
+
+        if options['quizzes']:
+            quiz_ids = [resolve_quiz(quiz) for quiz in options['quizzes']]
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT {QUIZ_COLUMNS} FROM quiz_quiz WHERE quiz_id = ANY(%s)", [quiz_ids])
+                quizzes = cursor.fetchall()
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""SELECT {QUIZ_COLUMNS} FROM quiz_quiz
+                        WHERE opens_at > now() AND opens_at <= now() + make_interval(mins => %s)
+                        ORDER BY opens_at""",
+                    [options['ahead']]
+                )
+                quizzes = cursor.fetchall()
+
+        for quiz in quizzes:
+            self.warm(*quiz)
+        self.stdout.write(self.style.SUCCESS(f'Warmed {len(quizzes)} quiz(zes)'))
+
+    def warm(self, quiz_id, quiz_code, quiz_name, question_version, opens_at, closes_at):
+        # Entries warmed long before opening must still be there when it opens
+        until_open = max(int(opens_at.timestamp() - time.time()), 0) if opens_at else 0
+        cache = quiz_cache()
+
+        cache.set(quiz_code_key(quiz_code), (quiz_id, quiz_name), until_open + QUIZ_CODE_CACHE_TIMEOUT)
+        cache_quiz_window(quiz_id, make_window(quiz_name, opens_at, closes_at), until_open + QUIZ_CODE_CACHE_TIMEOUT)
+
+        answer_key = compile_answer_key(quiz_id, question_version)
+        cache.set(answer_key_cache_key(quiz_id, question_version), answer_key, until_open + QUESTION_CACHE_TIMEOUT)
+
+        # take_quiz always reads the first page (for the question count), then
+        # either the paged view's pages or the rendered block
+        first_page = load_question_page(quiz_id, 1)
+        cache.set(question_page_key(quiz_id, question_version, 1), first_page, until_open + QUESTION_CACHE_TIMEOUT)
+        if first_page['count'] > PAGED_QUESTION_THRESHOLD:
+            for page in range(2, first_page['pages'] + 1):
+                cache.set(
+                    question_page_key(quiz_id, question_version, page),
+                    load_question_page(quiz_id, page),
+                    until_open + QUESTION_CACHE_TIMEOUT,
+                )
+        else:
+            cache.set(question_block_key(quiz_id, question_version), render_question_block(quiz_id), until_open + QUESTION_CACHE_TIMEOUT)
+
+        opens = f'opens {timezone.localtime(opens_at):%Y-%m-%d %H:%M}' if opens_at else 'always open'
+        self.stdout.write(f'"{quiz_name}" ({quiz_code}), {opens}: {first_page["count"]} questions')
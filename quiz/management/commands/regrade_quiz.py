@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from quiz.management.utils import resolve_quiz
+from quiz.question_cache import invalidate_question_block
+from quiz.regrade import regrade_quiz
+from quiz.utils import bump_question_version
+
+
+class Command(BaseCommand):
+    help = "Re-score a quiz's stored submissions against its current answer key"
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz', help='Quiz id or quiz code')
+
+    def handle(self, *args, **options):
+        quiz_id = resolve_quiz(options['quiz'])
+
+        started = time.perf_counter()
+        # Bump the version too, so servers drop answer keys cached before a
+        # fix made outside the app (e.g. directly in the database)
+        with transaction.atomic():
+            question_version = bump_question_version(quiz_id)
+            counts = regrade_quiz(quiz_id)
+        invalidate_question_block(quiz_id, question_version - 1)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-graded {counts['regraded']} submissions in {elapsed:.2f}s, {counts['changed']} updated, "
+            f"{counts['skipped']} without stored answers skipped"
+        ))
+        self.stdout.write(f"Top score {counts['top_score']}, average {counts['score_avg']:.2f}")
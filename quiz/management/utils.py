@@ -0,0 +1,31 @@
+# quiz/management/utils.py
+from django.core.management.base import CommandError
+from django.db import connection
+
+
+def resolve_quiz(quiz):
+    """The quiz_id of a quiz given on the command line by id or code"""
+    with connection.cursor() as cursor:
+        if quiz.isdigit():
+            cursor.execute("SELECT quiz_id FROM quiz_quiz WHERE quiz_id = %s", [int(quiz)])
+        else:
+            cursor.execute("SELECT quiz_id FROM quiz_quiz WHERE quiz_code = %s", [quiz.upper().strip()])
+        row = cursor.fetchone()
+    if not row:
+        raise CommandError(f'Quiz "{quiz}" not found.')
+    return row[0]
+
+
+def is_local_host(host):
+    # No host, or a socket directory, is a Unix socket on this machine
+    return not host or host.startswith('/') or host in ('localhost', '127.0.0.1', '::1')
+
+
+def require_local_database(i_know):
+    """Refuse to write throwaway test data to a database on another machine unless --i-know was given"""
+    host = connection.settings_dict.get('HOST') or ''
+    if not i_know and not is_local_host(host):
+        raise CommandError(
+            f'The database is on {host}; this command fills it with throwaway users and a quiz. '
+            'Pass --i-know to run it anyway.'
+        )
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2025-10-02 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0002_alter_quiz_quiz_code"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="quiz",
+            name="submission_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="quiz",
+            name="score_sum",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="quiz",
+            name="score_sq_sum",
+            field=models.FloatField(default=0),
+        ),
+        # Backfill the running aggregates from results submitted before this migration
+        migrations.RunSQL(
+            sql="""
+                UPDATE quiz_quiz q
+                SET submission_count = s.n,
+                    score_sum = s.total,
+                    score_sq_sum = s.total_sq,
+                    top_score = s.top,
+                    score_avg = s.total / s.n
+                FROM (
+                    SELECT quiz_id, COUNT(*) AS n, SUM(score) AS total,
+                           SUM(score * score) AS total_sq, MAX(score) AS top
+                    FROM quiz_result
+                    GROUP BY quiz_id
+                ) s
+                WHERE q.quiz_id = s.quiz_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
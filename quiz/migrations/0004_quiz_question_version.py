@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2025-10-03 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0003_quiz_running_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="quiz",
+            name="question_version",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2025-10-06 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0004_quiz_question_version"),
+    ]
+
+    operations = [
+        # Keep the earliest enrollment and result for each (student, quiz) pair
+        migrations.RunSQL(
+            sql="""
+                DELETE FROM quiz_studentquiz a
+                USING quiz_studentquiz b
+                WHERE a.student_id = b.student_id
+                  AND a.quiz_id = b.quiz_id
+                  AND a.student_quiz_id > b.student_quiz_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql="""
+                DELETE FROM quiz_result a
+                USING quiz_result b
+                WHERE a.student_id = b.student_id
+                  AND a.quiz_id = b.quiz_id
+                  AND a.result_id > b.result_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # Duplicate results were counted in the running aggregates; rebuild them
+        migrations.RunSQL(
+            sql="""
+                UPDATE quiz_quiz q
+                SET submission_count = COALESCE(s.n, 0),
+                    score_sum = COALESCE(s.total, 0),
+                    score_sq_sum = COALESCE(s.total_sq, 0),
+                    top_score = COALESCE(s.top, 0),
+                    score_avg = COALESCE(s.total / s.n, 0)
+                FROM quiz_quiz q2
+                LEFT JOIN (
+                    SELECT quiz_id, COUNT(*) AS n, SUM(score) AS total,
+                           SUM(score * score) AS total_sq, MAX(score) AS top
+                    FROM quiz_result
+                    GROUP BY quiz_id
+                ) s ON s.quiz_id = q2.quiz_id
+                WHERE q.quiz_id = q2.quiz_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="result",
+            constraint=models.UniqueConstraint(fields=("student", "quiz"), name="unique_result_per_student_quiz"),
+        ),
+        migrations.AddConstraint(
+            model_name="studentquiz",
+            constraint=models.UniqueConstraint(fields=("student", "quiz"), name="unique_enrollment_per_student_quiz"),
+        ),
+    ]
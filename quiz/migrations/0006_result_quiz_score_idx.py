@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2025-10-07 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0005_unique_student_quiz"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(fields=["quiz", "-score", "result_id"], name="result_quiz_score_idx"),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2025-10-09 13:47
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0006_result_quiz_score_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuizResponse",
+            fields=[
+                ("result", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to="quiz.result")),
+                ("question_ids", django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=None)),
+                ("answers", django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), size=None)),
+                ("correct", models.BinaryField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2025-10-10 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0007_quizresponse"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="quiz",
+            name="enrolled_count",
+            field=models.IntegerField(default=0),
+        ),
+        # Backfill from enrollments made before this migration
+        migrations.RunSQL(
+            sql="""
+                UPDATE quiz_quiz q
+                SET enrolled_count = e.n
+                FROM (
+                    SELECT quiz_id, COUNT(*) AS n
+                    FROM quiz_studentquiz
+                    GROUP BY quiz_id
+                ) e
+                WHERE q.quiz_id = e.quiz_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
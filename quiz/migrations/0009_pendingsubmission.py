@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2025-10-11 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0008_quiz_enrolled_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingSubmission",
+            fields=[
+                ("submission_id", models.AutoField(primary_key=True, serialize=False)),
+                ("answers", models.JSONField()),
+                ("submitted_at", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.IntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, default="")),
+                ("failed", models.BooleanField(default=False)),
+                ("quiz", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="quiz.quiz")),
+                ("student", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="quiz.student")),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("student", "quiz"), name="unique_pending_submission_per_student_quiz"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2025-10-13 09:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0009_pendingsubmission"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuizDraft",
+            fields=[
+                ("draft_id", models.AutoField(primary_key=True, serialize=False)),
+                ("answers", models.JSONField(default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("quiz", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="quiz.quiz")),
+                ("student", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="quiz.student")),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("student", "quiz"), name="unique_draft_per_student_quiz"),
+                ],
+            },
+        ),
+    ]
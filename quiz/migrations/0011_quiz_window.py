@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2025-10-14 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0010_quizdraft"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="quiz",
+            name="opens_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="quiz",
+            name="closes_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="quiz",
+            index=models.Index(
+                condition=models.Q(("opens_at__isnull", False)), fields=["opens_at"], name="quiz_opens_at_idx"
+            ),
+        ),
+    ]
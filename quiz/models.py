@@ -1,4 +1,5 @@
 import uuid
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
 
 class Student(models.Model):
@@ -23,8 +24,25 @@ class Quiz(models.Model):
     topic = models.CharField(max_length=255)
     top_score = models.FloatField(default=0)
     score_avg = models.FloatField(default=0)
+    # Running aggregates maintained on enroll/submit so stats never rescan
+    # quiz_studentquiz or quiz_result
+    enrolled_count = models.IntegerField(default=0)
+    submission_count = models.IntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_sq_sum = models.FloatField(default=0)
+    # Bumped whenever the quiz's questions change so compiled answer keys invalidate
+    question_version = models.IntegerField(default=0)
+    # Optional exam window; students wait before opens_at and cannot start after closes_at
+    opens_at = models.DateTimeField(null=True, blank=True)
+    closes_at = models.DateTimeField(null=True, blank=True)
     teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # prewarm_quizzes looks up the quizzes about to open
+            models.Index(fields=['opens_at'], name='quiz_opens_at_idx', condition=models.Q(opens_at__isnull=False)),
+        ]
+
 class QuizQuestion(models.Model):
     question_id = models.AutoField(primary_key=True)
     question = models.TextField()
@@ -42,7 +60,64 @@ class Result(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'quiz'], name='unique_result_per_student_quiz'),
+        ]
+        indexes = [
+            # Backs keyset pagination of a quiz's results by (score DESC, result_id)
+            models.Index(fields=['quiz', '-score', 'result_id'], name='result_quiz_score_idx'),
+        ]
+
 class StudentQuiz(models.Model):
     student_quiz_id = models.AutoField(primary_key=True)
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'quiz'], name='unique_enrollment_per_student_quiz'),
+        ]
+
+class QuizResponse(models.Model):
+    # One row per submission. answers[i] is the student's normalized answer to
+    # question_ids[i]; bit i of correct (most significant bit first) is set if
+    # it was right.
+    result = models.OneToOneField(Result, on_delete=models.CASCADE, primary_key=True)
+    question_ids = ArrayField(models.IntegerField())
+    answers = ArrayField(models.TextField())
+    correct = models.BinaryField()
+
+class PendingSubmission(models.Model):
+    # Raw submitted answers ({question_id: answer}) waiting for the grade_submissions worker
+    # (QUIZ_ASYNC_GRADING). Deleted in the same transaction that records the result.
+    submission_id = models.AutoField(primary_key=True)
+    answers = models.JSONField()
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    # Failed grading attempts. At QUIZ_GRADING_MAX_ATTEMPTS the row is marked
+    # failed: the worker skips it, the student may submit again, and
+    # grade_submissions --list-failed/--retry-failed/--drop-failed manage it
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(default='', blank=True)
+    failed = models.BooleanField(default=False)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'quiz'], name='unique_pending_submission_per_student_quiz'),
+        ]
+
+class QuizDraft(models.Model):
+    # In-progress answers ({question_id: answer}) autosaved while taking a
+    # quiz; written in batches from the cache buffer and removed on submit
+    draft_id = models.AutoField(primary_key=True)
+    answers = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'quiz'], name='unique_draft_per_student_quiz'),
+        ]
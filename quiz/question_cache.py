@@ -0,0 +1,144 @@
+# quiz/question_cache.py
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.template.loader import render_to_string
+from quiz_system.db.statements import Statement, run
+
+# Rendered question blocks are immutable per (quiz_id, question_version), so
+# the timeout only bounds how long stale versions linger in the cache
+QUESTION_CACHE_TIMEOUT = getattr(settings, 'QUIZ_QUESTION_CACHE_TIMEOUT', 60 * 60)
+
+# Questions per page of the paged (JSON) delivery mode
+QUESTION_PAGE_SIZE = getattr(settings, 'QUIZ_QUESTION_PAGE_SIZE', 20)
+
+QUESTION_LIST = Statement(
+    'question_list',
+    "SELECT question_id, question, question_type, choices, score FROM quiz_quizquestion WHERE quiz_id = %s ORDER BY question_id",
+    ['integer']
+)
+
+QUESTION_PAGE = Statement(
+    'question_page',
+    """SELECT question_id, question, question_type, choices, score, COUNT(*) OVER ()
+       FROM quiz_quizquestion WHERE quiz_id = %s
+       ORDER BY question_id
+       LIMIT %s OFFSET %s""",
+    ['integer', 'integer', 'integer']
+)
+
+
+# Cache backends private to one process; with several server processes each
+# would hold its own copy of drafts and warmed entries
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+def quiz_cache_is_shared():
+    return settings.CACHES[getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')]['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def quiz_cache():
+    return caches[getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')]
+
+
+def question_block_key(quiz_id, version):
+    return f'quiz:{quiz_id}:v{version}:questions'
+
+
+def question_page_key(quiz_id, version, page):
+    return f'quiz:{quiz_id}:v{version}:page{page}'
+
+
+def render_question_block(quiz_id):
+    """Render the question list of take_quiz.html. Returns (question_count, html)."""
+    with connection.cursor() as cursor:
+        run(cursor, QUESTION_LIST, [quiz_id])
+        questions_data = cursor.fetchall()
+
+    questions = []
+    for q in questions_data:
+        questions.append({
+            'question_id': q[0],
+            'question': q[1],
+            'question_type': q[2],
+            'choices': json.loads(q[3]) if q[3] else {},
+            'score': q[4]
+        })
+
+    return len(questions), render_to_string('quiz/_question_list.html', {'questions': questions})
+
+
+def get_question_block(quiz_id, version):
+    """Return (question_count, html) for the quiz's questions, shared by every student"""
+    key = question_block_key(quiz_id, version)
+    block = quiz_cache().get(key)
+    if block is None:
+        block = render_question_block(quiz_id)
+        quiz_cache().set(key, block, QUESTION_CACHE_TIMEOUT)
+    return block
+
+
+async def aget_question_block(quiz_id, version):
+    # Misses render through the sync path; they happen once per version
+    block = await quiz_cache().aget(question_block_key(quiz_id, version))
+    if block is None:
+        block = await sync_to_async(get_question_block)(quiz_id, version)
+    return block
+
+
+def invalidate_question_block(quiz_id, version):
+    quiz_cache().delete(question_block_key(quiz_id, version))
+
+
+def load_question_page(quiz_id, page):
+    """One page of a quiz's questions as JSON-ready data, without the answers.
+
+    Returns {'page', 'pages', 'count', 'questions'}; a page past the end has
+    no questions.
+    """
+    with connection.cursor() as cursor:
+        run(cursor, QUESTION_PAGE, [quiz_id, QUESTION_PAGE_SIZE, (page - 1) * QUESTION_PAGE_SIZE])
+        rows = cursor.fetchall()
+        if rows:
+            count = rows[0][5]
+        else:
+            cursor.execute("SELECT COUNT(*) FROM quiz_quizquestion WHERE quiz_id = %s", [quiz_id])
+            count = cursor.fetchone()[0]
+
+    offset = (page - 1) * QUESTION_PAGE_SIZE
+    questions = []
+    for number, q in enumerate(rows, start=offset + 1):
+        questions.append({
+            'question_id': q[0],
+            'number': number,
+            'question': q[1],
+            'question_type': q[2],
+            'options': json.loads(q[3]).get('options', []) if q[3] else [],
+            'score': q[4],
+        })
+
+    return {
+        'page': page,
+        'pages': (count + QUESTION_PAGE_SIZE - 1) // QUESTION_PAGE_SIZE,
+        'count': count,
+        'questions': questions,
+    }
+
+
+def get_question_page(quiz_id, version, page):
+    """Return a page of the quiz's questions, cached per question version like the full block"""
+    key = question_page_key(quiz_id, version, page)
+    data = quiz_cache().get(key)
+    if data is None:
+        data = load_question_page(quiz_id, page)
+        quiz_cache().set(key, data, QUESTION_CACHE_TIMEOUT)
+    return data
+
+
+async def aget_question_page(quiz_id, version, page):
+    data = await quiz_cache().aget(question_page_key(quiz_id, version, page))
+    if data is None:
+        data = await sync_to_async(get_question_page)(quiz_id, version, page)
+    return data
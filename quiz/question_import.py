@@ -0,0 +1,171 @@
+# quiz/question_import.py
+import codecs
+import csv
+import json
+import math
+from django.db import connection
+
+QUESTION_TYPES = ('multiple_choice', 'true_false', 'short_answer')
+CHOICE_LETTERS = ['A', 'B', 'C', 'D']
+CSV_CHOICE_COLUMNS = ['choice_a', 'choice_b', 'choice_c', 'choice_d']
+
+# Rows per multi-row INSERT statement; keeps statements well under parameter limits
+INSERT_BATCH_SIZE = 500
+
+
+class QuestionImportError(ValueError):
+
+    def __init__(self, message, row_number=None):
+        super().__init__(message)
+        self.row_number = row_number
+
+
+def _decode_lines(upload):
+    # Lines of upload as text; a line that is not UTF-8 fails the whole file
+    lines = codecs.iterdecode(upload, 'utf-8-sig')
+    line_number = 0
+    while True:
+        line_number += 1
+        try:
+            line = next(lines)
+        except StopIteration:
+            return
+        except UnicodeDecodeError:
+            raise QuestionImportError(
+                f'Row {line_number} is not valid UTF-8 text. Save the file as UTF-8 and upload it again.', line_number
+            )
+        yield line
+
+
+def iter_question_rows(upload):
+    """Yield (row_number, row) pairs from an uploaded CSV, JSON or JSON Lines file.
+
+    CSV and JSON Lines are read line by line. A JSON file must hold a list of
+    objects and is parsed in one go.
+    """
+    name = (upload.name or '').lower()
+
+    if name.endswith('.csv'):
+        reader = csv.DictReader(_decode_lines(upload))
+        # Row 1 is the header
+        for row_number, row in enumerate(reader, start=2):
+            choices = [row.get(column) or '' for column in CSV_CHOICE_COLUMNS]
+            yield row_number, {
+                'question': row.get('question'),
+                'question_type': row.get('question_type'),
+                'choices': {"options": [c.strip() for c in choices if c.strip()]},
+                'correct_answers': {"answer": row.get('correct_answer') or ''},
+                'score': row.get('score'),
+            }
+
+    elif name.endswith('.jsonl'):
+        for row_number, line in enumerate(_decode_lines(upload), start=1):
+            if not line.strip():
+                continue
+            try:
+                yield row_number, json.loads(line)
+            except ValueError as e:
+                yield row_number, QuestionImportError(f'Invalid JSON: {e}')
+
+    elif name.endswith('.json'):
+        try:
+            rows = json.load(codecs.getreader('utf-8-sig')(upload))
+        except UnicodeDecodeError:
+            raise QuestionImportError('The file is not valid UTF-8 text. Save it as UTF-8 and upload it again.')
+        except ValueError as e:
+            raise QuestionImportError(f'Invalid JSON file: {e}')
+        if not isinstance(rows, list):
+            raise QuestionImportError('JSON file must contain a list of questions.')
+        yield from enumerate(rows, start=1)
+
+    else:
+        raise QuestionImportError('Unsupported file type. Upload a .csv, .json or .jsonl file.')
+
+
+def build_question(row):
+    """Validate one row and return the (question, question_type, choices_json,
+    correct_answers_json, score) values add_question would insert."""
+    if not isinstance(row, dict):
+        raise QuestionImportError('Each question must be an object.')
+
+    question = str(row.get('question') or '').strip()
+    if not question:
+        raise QuestionImportError('Question text is required.')
+
+    question_type = str(row.get('question_type') or '').strip()
+    if question_type not in QUESTION_TYPES:
+        raise QuestionImportError(f'Unknown question type "{question_type}".')
+
+    try:
+        score = float(row.get('score'))
+    except (TypeError, ValueError):
+        raise QuestionImportError('Score must be a number.')
+    # float() also accepts "nan" and "inf", which would poison every total
+    if not math.isfinite(score):
+        raise QuestionImportError('Score must be a number.')
+    if score <= 0:
+        raise QuestionImportError('Score must be positive.')
+
+    choices = row.get('choices') or {}
+    answer_data = row.get('correct_answers') or {}
+    if not isinstance(choices, dict) or not isinstance(answer_data, dict):
+        raise QuestionImportError('choices and correct_answers must be objects.')
+    correct_answer = str(answer_data.get('answer') or '').strip()
+
+    if question_type == 'multiple_choice':
+        options = [str(o).strip() for o in choices.get('options') or [] if str(o).strip()]
+        if not 2 <= len(options) <= len(CHOICE_LETTERS):
+            raise QuestionImportError('Multiple choice questions need 2 to 4 options.')
+        correct_answer = correct_answer.upper()
+        if correct_answer not in CHOICE_LETTERS[:len(options)]:
+            raise QuestionImportError(f'Correct answer must be one of {", ".join(CHOICE_LETTERS[:len(options)])}.')
+        choices = {"options": options}
+
+    elif question_type == 'true_false':
+        correct_answer = correct_answer.capitalize()
+        if correct_answer not in ('True', 'False'):
+            raise QuestionImportError('Correct answer must be True or False.')
+        choices = {"options": ["True", "False"]}
+
+    else:
+        if not correct_answer:
+            raise QuestionImportError('Short answer questions need a correct answer.')
+        choices = {}
+
+    choices_json = json.dumps(choices) if choices else '{}'
+    return question, question_type, choices_json, json.dumps({"answer": correct_answer}), score
+
+
+def insert_questions(quiz_id, questions):
+    """Insert validated question tuples with multi-row INSERTs. Call inside a transaction."""
+    with connection.cursor() as cursor:
+        for start in range(0, len(questions), INSERT_BATCH_SIZE):
+            batch = questions[start:start + INSERT_BATCH_SIZE]
+            params = []
+            for question in batch:
+                params.extend(question)
+                params.append(quiz_id)
+            cursor.execute(
+                "INSERT INTO quiz_quizquestion (question, question_type, choices, correct_answers, score, quiz_id) VALUES "
+                + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(batch)),
+                params
+            )
+    return len(questions)
+
+
+def parse_question_file(upload):
+    """Validate every row of upload and return (valid_questions, errors).
+
+    errors is a list of (row_number, message); invalid rows are skipped so the
+    caller can still insert the valid ones.
+    """
+    questions = []
+    errors = []
+    for row_number, row in iter_question_rows(upload):
+        try:
+            if isinstance(row, QuestionImportError):
+                raise row
+            questions.append(build_question(row))
+        except QuestionImportError as e:
+            errors.append((row_number, str(e)))
+    return questions, errors
@@ -0,0 +1,139 @@
+# quiz/regrade.py
+import numpy as np
+from django.db import connection, transaction
+from .answer_keys import compile_answer_key
+from .live_results import notify_results
+
+
+def rescore_responses(rows, answer_key):
+    """Re-grade stored responses against answer_key in one pass per question layout.
+
+    rows are (result_id, score, question_ids, answers, correct) as stored.
+    Only questions still in the key are re-scored; bits for questions that
+    have since been deleted are left as they were and no longer count.
+    Returns (result_ids, scores, packed_correct) for the rows whose score
+    or correctness bits changed.
+    """
+    position = {question_id: j for j, question_id in enumerate(answer_key.question_ids)}
+    key_answers = np.array(answer_key.answers, dtype=object)
+    key_scores = np.array(answer_key.scores, dtype=float)
+
+    # Submissions against the same question set share one layout
+    groups = {}
+    for i, row in enumerate(rows):
+        groups.setdefault(tuple(row[2]), []).append(i)
+
+    changed_ids, changed_scores, changed_bits = [], [], []
+    for ids, row_numbers in groups.items():
+        m = len(row_numbers)
+        old_scores = np.array([rows[i][1] for i in row_numbers], dtype=float)
+        columns = np.array([position.get(question_id, -1) for question_id in ids], dtype=int)
+        keep = columns >= 0
+
+        if ids:
+            packed = np.frombuffer(b''.join(bytes(rows[i][4]) for i in row_numbers), dtype=np.uint8)
+            old_bits = np.unpackbits(packed.reshape(m, -1), axis=1)[:, :len(ids)].astype(bool)
+            answers = np.array([rows[i][3] for i in row_numbers], dtype=object).reshape(m, len(ids))
+        else:
+            old_bits = np.zeros((m, 0), dtype=bool)
+            answers = np.zeros((m, 0), dtype=object)
+
+        new_bits = old_bits.copy()
+        new_bits[:, keep] = answers[:, keep] == key_answers[columns[keep]]
+        # cumsum adds in question order like grading does, so unchanged
+        # submissions come out bit-for-bit equal to their stored score
+        earned = new_bits[:, keep] * key_scores[columns[keep]]
+        new_scores = np.cumsum(earned, axis=1)[:, -1] if keep.any() else np.zeros(m)
+
+        changed = (new_scores != old_scores) | (new_bits != old_bits).any(axis=1)
+        if not changed.any():
+            continue
+        new_packed = np.packbits(new_bits[changed], axis=1)
+        for row_number, score, bits in zip(np.array(row_numbers)[changed], new_scores[changed], new_packed):
+            changed_ids.append(rows[row_number][0])
+            changed_scores.append(float(score))
+            changed_bits.append(bits.tobytes())
+
+    return changed_ids, changed_scores, changed_bits
+
+
+def regrade_quiz(quiz_id):
+    """Re-score every stored submission of a quiz against its current answer key.
+
+    Changed scores and correctness bits are written back in one UPDATE each,
+    then the quiz aggregates and the top_score/score_avg copied onto its
+    results are recomputed. Results submitted before responses were stored
+    cannot be re-graded and keep their score.
+
+    Returns a dict with the number of submissions 'regraded', how many
+    'changed' (score or per-question correctness), how many were 'skipped',
+    and the new 'top_score'/'score_avg'.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Submissions wait for the regrade instead of folding into stale aggregates
+        cursor.execute("SELECT question_version FROM quiz_quiz WHERE quiz_id = %s FOR UPDATE", [quiz_id])
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        # Compiled fresh rather than through the answer key cache, which must
+        # never see keys from a transaction that might roll back
+        answer_key = compile_answer_key(quiz_id, row[0])
+
+        cursor.execute(
+            """SELECT r.result_id, r.score, qr.question_ids, qr.answers, qr.correct
+               FROM quiz_result r
+               JOIN quiz_quizresponse qr ON qr.result_id = r.result_id
+               WHERE r.quiz_id = %s""",
+            [quiz_id]
+        )
+        rows = cursor.fetchall()
+        result_ids, scores, bits = rescore_responses(rows, answer_key)
+
+        if result_ids:
+            cursor.execute(
+                """UPDATE quiz_result r SET score = v.score
+                   FROM unnest(%s::integer[], %s::double precision[]) AS v(result_id, score)
+                   WHERE r.result_id = v.result_id""",
+                [result_ids, scores]
+            )
+            cursor.execute(
+                """UPDATE quiz_quizresponse qr SET correct = v.correct
+                   FROM unnest(%s::integer[], %s::bytea[]) AS v(result_id, correct)
+                   WHERE qr.result_id = v.result_id""",
+                [result_ids, bits]
+            )
+
+        cursor.execute(
+            """WITH totals AS (
+                   SELECT COUNT(*) AS n, COALESCE(SUM(score), 0) AS total,
+                          COALESCE(SUM(score * score), 0) AS sq_total, COALESCE(MAX(score), 0) AS top
+                   FROM quiz_result WHERE quiz_id = %(quiz_id)s
+               ), stats AS (
+                   UPDATE quiz_quiz q
+                   SET submission_count = t.n,
+                       score_sum = t.total,
+                       score_sq_sum = t.sq_total,
+                       top_score = t.top,
+                       score_avg = CASE WHEN t.n > 0 THEN t.total / t.n ELSE 0 END
+                   FROM totals t
+                   WHERE q.quiz_id = %(quiz_id)s
+                   RETURNING q.top_score, q.score_avg
+               ), snapshots AS (
+                   UPDATE quiz_result r
+                   SET top_score = s.top_score, score_avg = s.score_avg
+                   FROM stats s
+                   WHERE r.quiz_id = %(quiz_id)s
+               )
+               SELECT top_score, score_avg, (SELECT n FROM totals) FROM stats""",
+            {'quiz_id': quiz_id}
+        )
+        top_score, score_avg, submissions = cursor.fetchone()
+        notify_results(cursor, [quiz_id], kind='regraded')
+
+    return {
+        'regraded': len(rows),
+        'changed': len(result_ids),
+        'skipped': submissions - len(rows),
+        'top_score': top_score,
+        'score_avg': score_avg,
+    }
@@ -0,0 +1,162 @@
+# quiz/repository.py
+# Queries the views render directly, one function per query, returning
+# records (quiz_system.db.rows) that templates read like the dicts they
+# replace.
+from dataclasses import dataclass
+from datetime import datetime
+from django.db import connection
+from quiz_system import async_db
+from quiz_system.db.rows import fetch_record, fetch_records
+from quiz_system.db.statements import Statement, run
+
+
+@dataclass(slots=True)
+class QuizInfo:
+    quiz_id: int
+    quiz_name: str
+    subject: str
+    topic: str
+    teacher_id: int
+
+
+@dataclass(slots=True)
+class Attempt:
+    """A quiz's details plus one student's standing in it (take_quiz)"""
+    quiz_id: int
+    quiz_name: str
+    subject: str
+    topic: str
+    question_version: int
+    is_enrolled: bool
+    existing_score: float
+    # Submitted and queued for the background grader (a submission that
+    # failed to grade does not count; the student may submit again)
+    is_grading: bool
+
+
+@dataclass(slots=True)
+class StudentQuiz:
+    quiz_id: int
+    quiz_name: str
+    quiz_code: str
+    subject: str
+    topic: str
+    completed: bool
+    grading: bool
+    grading_failed: bool
+
+
+@dataclass(slots=True)
+class TeacherQuiz:
+    quiz_id: int
+    quiz_name: str
+    quiz_code: str
+    subject: str
+    topic: str
+    enrolled_count: int
+    submission_count: int
+    score_avg: float
+    top_score: float
+    opens_at: datetime
+    closes_at: datetime
+
+
+@dataclass(slots=True)
+class ResultRow:
+    result_id: int
+    score: float
+    top_score: float
+    score_avg: float
+    student_name: str
+    student_email: str
+    roll_no: str
+    rank: int
+    percentage: float
+
+
+QUIZ_INFO_SQL = "SELECT quiz_id, quiz_name, subject, topic, teacher_id FROM quiz_quiz WHERE quiz_id = %s"
+
+TAKE_QUIZ = Statement('take_quiz', """
+    SELECT q.quiz_id, q.quiz_name, q.subject, q.topic, q.question_version,
+           EXISTS (SELECT 1 FROM quiz_studentquiz sq WHERE sq.student_id = %(student_id)s AND sq.quiz_id = q.quiz_id) AS is_enrolled,
+           (SELECT r.score FROM quiz_result r WHERE r.student_id = %(student_id)s AND r.quiz_id = q.quiz_id) AS existing_score,
+           EXISTS (SELECT 1 FROM quiz_pendingsubmission p WHERE p.student_id = %(student_id)s AND p.quiz_id = q.quiz_id AND NOT p.failed) AS is_grading
+    FROM quiz_quiz q WHERE q.quiz_id = %(quiz_id)s
+""", {'student_id': 'integer', 'quiz_id': 'integer'})
+
+STUDENT_QUIZZES = Statement('student_quizzes', """
+    SELECT q.quiz_id, q.quiz_name, q.quiz_code, q.subject, q.topic,
+           r.result_id IS NOT NULL AS completed,
+           EXISTS (SELECT 1 FROM quiz_pendingsubmission p WHERE p.student_id = sq.student_id AND p.quiz_id = q.quiz_id AND NOT p.failed) AS grading,
+           EXISTS (SELECT 1 FROM quiz_pendingsubmission p WHERE p.student_id = sq.student_id AND p.quiz_id = q.quiz_id AND p.failed) AS grading_failed
+    FROM quiz_quiz q
+    JOIN quiz_studentquiz sq ON q.quiz_id = sq.quiz_id
+    LEFT JOIN quiz_result r ON q.quiz_id = r.quiz_id AND r.student_id = %(student_id)s
+    WHERE sq.student_id = %(student_id)s
+    ORDER BY q.quiz_name
+""", {'student_id': 'integer'})
+
+
+def get_quiz(quiz_id):
+    with connection.cursor() as cursor:
+        cursor.execute(QUIZ_INFO_SQL, [quiz_id])
+        return fetch_record(cursor, QuizInfo)
+
+
+def get_teacher_quiz(quiz_id, teacher_id):
+    """The quiz if teacher_id owns it, else None"""
+    with connection.cursor() as cursor:
+        cursor.execute(QUIZ_INFO_SQL + " AND teacher_id = %s", [quiz_id, teacher_id])
+        return fetch_record(cursor, QuizInfo)
+
+
+def get_attempt(student_id, quiz_id):
+    with connection.cursor() as cursor:
+        run(cursor, TAKE_QUIZ, {'student_id': student_id, 'quiz_id': quiz_id})
+        return fetch_record(cursor, Attempt)
+
+
+async def aget_attempt(student_id, quiz_id):
+    return await async_db.fetchone(TAKE_QUIZ, {'student_id': student_id, 'quiz_id': quiz_id}, Attempt)
+
+
+def student_quizzes(student_id):
+    """The student's enrolled quizzes, by name"""
+    with connection.cursor() as cursor:
+        run(cursor, STUDENT_QUIZZES, {'student_id': student_id})
+        return fetch_records(cursor, StudentQuiz)
+
+
+async def astudent_quizzes(student_id):
+    return await async_db.fetchall(STUDENT_QUIZZES, {'student_id': student_id}, StudentQuiz)
+
+
+def teacher_quizzes(teacher_id):
+    """The teacher's quizzes with their maintained enrollment/submission summaries"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT quiz_id, quiz_name, quiz_code, subject, topic,
+                      enrolled_count, submission_count, score_avg, top_score, opens_at, closes_at
+               FROM quiz_quiz WHERE teacher_id = %s ORDER BY quiz_name""",
+            [teacher_id]
+        )
+        return fetch_records(cursor, TeacherQuiz)
+
+
+def results_page(where, params, total_possible_score, rank_offset, limit):
+    """Up to limit results matching where/params (quiz_result r joined to quiz_student s),
+    best first, ranked from rank_offset + 1"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""SELECT r.result_id, r.score, r.top_score, r.score_avg,
+                       s.student_name, s.student_email, s.roll_no,
+                       %s + ROW_NUMBER() OVER (ORDER BY r.score DESC, r.result_id) AS rank,
+                       CASE WHEN %s > 0 THEN r.score / %s * 100 ELSE 0 END AS percentage
+                FROM quiz_result r
+                JOIN quiz_student s ON r.student_id = s.student_id
+                WHERE {where}
+                ORDER BY r.score DESC, r.result_id
+                LIMIT %s""",
+            [rank_offset, total_possible_score, total_possible_score, *params, limit]
+        )
+        return fetch_records(cursor, ResultRow)
@@ -0,0 +1,134 @@
+# quiz/result_cache.py
+import json
+from django.conf import settings
+from django.db import connection
+from .answer_keys import parse_correct_answer
+from .question_cache import QUESTION_CACHE_TIMEOUT, quiz_cache
+
+# A stored result only changes when the quiz is re-graded, and re-grading
+# (like any question edit) bumps question_version, so everything here is
+# keyed by (result_id, question_version) and never needs invalidating.
+# The one exception is the quiz's current version, which
+# bump_question_version overwrites on commit; the timeout bounds how long
+# another server's process-local cache can keep the old one.
+QUIZ_VERSION_CACHE_TIMEOUT = getattr(settings, 'QUIZ_VERSION_CACHE_TIMEOUT', 60)
+
+
+def result_etag(result_id, version):
+    return f'"result-{result_id}-v{version}"'
+
+
+def answer_review_key(quiz_id, version):
+    return f'quiz:{quiz_id}:v{version}:review'
+
+
+def result_payload_key(quiz_id, version, result_id):
+    return f'quiz:{quiz_id}:v{version}:result{result_id}'
+
+
+def result_id_key(student_id, quiz_id):
+    return f'quiz:{quiz_id}:student{student_id}:result'
+
+
+def quiz_version_key(quiz_id):
+    return f'quiz:{quiz_id}:version'
+
+
+def set_quiz_version(quiz_id, version):
+    quiz_cache().set(quiz_version_key(quiz_id), version, QUIZ_VERSION_CACHE_TIMEOUT)
+
+
+def find_result(student_id, quiz_id):
+    """(result_id, question_version) of the student's result, or None if they have none.
+
+    A student's result_id never changes once recorded, so revalidating a
+    result page normally costs two cache reads and no queries.
+    """
+    cache = quiz_cache()
+    result_id = cache.get(result_id_key(student_id, quiz_id))
+    version = cache.get(quiz_version_key(quiz_id))
+    if result_id is not None and version is not None:
+        return result_id, version
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT r.result_id, q.question_version
+               FROM quiz_result r JOIN quiz_quiz q ON q.quiz_id = r.quiz_id
+               WHERE r.student_id = %s AND r.quiz_id = %s""",
+            [student_id, quiz_id]
+        )
+        found = cursor.fetchone()
+    if found is None:
+        return None
+    cache.set(result_id_key(student_id, quiz_id), found[0], QUESTION_CACHE_TIMEOUT)
+    # add, not set: a version read before a concurrent bump committed must
+    # not overwrite the one the bump stored
+    cache.add(quiz_version_key(quiz_id), found[1], QUIZ_VERSION_CACHE_TIMEOUT)
+    return found
+
+
+def load_answer_review(quiz_id):
+    """The quiz's questions with their correct answers for display. Returns (questions, total_possible_score)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT question_id, question, question_type, choices, correct_answers, score FROM quiz_quizquestion WHERE quiz_id = %s ORDER BY question_id",
+            [quiz_id]
+        )
+        questions_data = cursor.fetchall()
+
+    questions = []
+    total_possible_score = 0
+    for q in questions_data:
+        questions.append({
+            'question_id': q[0],
+            'question': q[1],
+            'question_type': q[2],
+            'choices': json.loads(q[3]) if q[3] else {},
+            'score': q[5],
+            # Parsed for display
+            'correct_answers': (parse_correct_answer(q[4]) if q[4] else '') or 'N/A',
+        })
+        total_possible_score += q[5]
+    return questions, total_possible_score
+
+
+def get_answer_review(quiz_id, version):
+    """Return (questions, total_possible_score), shared by every student of the quiz"""
+    key = answer_review_key(quiz_id, version)
+    review = quiz_cache().get(key)
+    if review is None:
+        review = load_answer_review(quiz_id)
+        quiz_cache().set(key, review, QUESTION_CACHE_TIMEOUT)
+    return review
+
+
+def load_result_payload(quiz_id, result_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT q.quiz_id, q.quiz_name, q.subject, q.topic, r.result_id, r.score, r.top_score, r.score_avg
+               FROM quiz_result r JOIN quiz_quiz q ON q.quiz_id = r.quiz_id
+               WHERE r.result_id = %s""",
+            [result_id]
+        )
+        row = cursor.fetchone()
+    return {
+        'quiz': {'quiz_id': row[0], 'quiz_name': row[1], 'subject': row[2], 'topic': row[3]},
+        'result': {'result_id': row[4], 'score': row[5], 'top_score': row[6], 'score_avg': row[7]},
+    }
+
+
+def get_result_payload(quiz_id, version, result_id):
+    """Everything student_result.html shows for one result, cached per (result_id, question_version)"""
+    key = result_payload_key(quiz_id, version, result_id)
+    payload = quiz_cache().get(key)
+    if payload is None:
+        payload = load_result_payload(quiz_id, result_id)
+        quiz_cache().set(key, payload, QUESTION_CACHE_TIMEOUT)
+
+    questions, total_possible_score = get_answer_review(quiz_id, version)
+    return {
+        **payload,
+        'questions': questions,
+        'total_possible_score': total_possible_score,
+        'percentage': (payload['result']['score'] / total_possible_score * 100) if total_possible_score > 0 else 0,
+    }
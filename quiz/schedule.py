@@ -0,0 +1,110 @@
+# quiz/schedule.py
+# Optional opening window (opens_at/closes_at) of exam-style quizzes.
+#
+# When a teacher announces the code the whole class joins and opens the quiz
+# within seconds. Each quiz's window is cached (and seeded by the code
+# lookup), so join and take requests that arrive early get a small waiting
+# page without a database query, and the waiting pages reload, spread over
+# a few seconds, once the quiz opens. prewarm_quizzes fills the caches those
+# requests need beforehand.
+import math
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from .question_cache import quiz_cache
+
+# Windows are cached as long as the code lookups that seed them
+QUIZ_WINDOW_CACHE_TIMEOUT = getattr(settings, 'QUIZ_CODE_CACHE_TIMEOUT', 10 * 60)
+# Waiting pages reload up to this many seconds after opening time, so the
+# class does not come back in the same instant
+QUIZ_OPEN_JITTER = getattr(settings, 'QUIZ_OPEN_JITTER', 5)
+# Submissions are still accepted for this many seconds after closes_at
+QUIZ_CLOSE_GRACE = getattr(settings, 'QUIZ_CLOSE_GRACE', 60)
+
+# Waiting pages check back at least this often, in case the quiz is rescheduled
+MAX_WAIT_REFRESH = 5 * 60
+
+WAITING = 'waiting'
+OPEN = 'open'
+CLOSED = 'closed'
+
+# opens_at/closes_at are epoch seconds, or None when unset
+QuizWindow = namedtuple('QuizWindow', ['quiz_name', 'opens_at', 'closes_at'])
+
+
+def quiz_window_key(quiz_id):
+    return f'quiz:{quiz_id}:window'
+
+
+def make_window(quiz_name, opens_at, closes_at):
+    return QuizWindow(
+        quiz_name,
+        opens_at.timestamp() if opens_at else None,
+        closes_at.timestamp() if closes_at else None,
+    )
+
+
+def cache_quiz_window(quiz_id, window, timeout=QUIZ_WINDOW_CACHE_TIMEOUT):
+    quiz_cache().set(quiz_window_key(quiz_id), window, timeout)
+
+
+async def acache_quiz_window(quiz_id, window, timeout=QUIZ_WINDOW_CACHE_TIMEOUT):
+    await quiz_cache().aset(quiz_window_key(quiz_id), window, timeout)
+
+
+def quiz_window(quiz_id):
+    """The quiz's QuizWindow, or None if there is no such quiz"""
+    window = quiz_cache().get(quiz_window_key(quiz_id))
+    if window is not None:
+        return window
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT quiz_name, opens_at, closes_at FROM quiz_quiz WHERE quiz_id = %s", [quiz_id])
+        row = cursor.fetchone()
+
+    if row is None:
+        return None
+    window = make_window(*row)
+    cache_quiz_window(quiz_id, window)
+    return window
+
+
+async def aquiz_window(quiz_id):
+    window = await quiz_cache().aget(quiz_window_key(quiz_id))
+    if window is None:
+        window = await sync_to_async(quiz_window)(quiz_id)
+    return window
+
+
+def window_state(window, grace=0):
+    """WAITING before opens_at, CLOSED from closes_at (plus grace seconds), else OPEN"""
+    # Missing quizzes are left to the view's own "not found" handling
+    if window is None:
+        return OPEN
+    now = time.time()
+    if window.opens_at is not None and now < window.opens_at:
+        return WAITING
+    if window.closes_at is not None and now >= window.closes_at + grace:
+        return CLOSED
+    return OPEN
+
+
+def waiting_response(window, retry_url):
+    """Page served instead of join/take before the quiz opens; it reloads retry_url once the quiz is open"""
+    wait = min(math.ceil(window.opens_at - time.time()), MAX_WAIT_REFRESH) + random.randint(0, QUIZ_OPEN_JITTER)
+    html = render_to_string('quiz/waiting.html', {
+        'quiz_name': window.quiz_name,
+        'opens_at': datetime.fromtimestamp(window.opens_at, timezone.utc),
+        'wait': wait,
+        'retry_url': retry_url,
+    })
+    # A normal page rather than a 503, which Django would log as a server error for every early arrival
+    response = HttpResponse(html)
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -1,3 +1,871 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from unittest import mock
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.messages import add_message, INFO
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from accounts import async_views as accounts_async_views
+from quiz_system.db.rows import record_mapper
+from quiz_system.db.statements import Statement, run
+from . import async_views, grading_queue, live_results, views
+from .answer_keys import AnswerKey, normalize_answer, parse_correct_answer
+from .answer_state import flush_drafts, held_answers, hold_answers, release_answers, submission_answers
+from .checks import check_quiz_cache
+from .grading import form_answers, grade, grade_many
+from .item_analysis import analyze_items
+from .management.utils import is_local_host, require_local_database
+from .models import PendingSubmission, Quiz, QuizDraft, QuizQuestion, QuizResponse, Result, Student, StudentQuiz, Teacher
+from .question_cache import quiz_cache
+from .question_import import QuestionImportError, build_question, parse_question_file
+from .regrade import regrade_quiz
+from .schedule import CLOSED, OPEN, WAITING, QuizWindow, quiz_window_key, window_state
+from .utils import (
+    StaleAnswerKey, add_student_to_quiz, bulk_add_students_to_quiz, bump_question_version, grade_and_record, pack_bits,
+    record_result,
+)
 
-# Create your tests here.
+# The project's URLs with the async student views (QUIZ_ASYNC_VIEWS) in front
+urlpatterns = [
+    path('quiz/join/', async_views.join_quiz),
+    path('quiz/<int:quiz_id>/take/', async_views.take_quiz),
+    path('quiz/<int:quiz_id>/submit/', async_views.submit_quiz),
+    path('accounts/student/dashboard/', accounts_async_views.student_dashboard),
+    path('', include('quiz_system.urls')),
+]
+
+
+@override_settings(ROOT_URLCONF='quiz.tests')
+class AsyncStudentViewTests(TransactionTestCase):
+    # async_db runs on its own connections, so test data must be committed
+
+    def setUp(self):
+        teacher = Teacher.objects.create(teacher_name='T', teacher_email='t@example.com', dept='cs', subject='db')
+        self.quiz = Quiz.objects.create(quiz_name='Async quiz', quiz_code='ASYNC001', subject='s', topic='t', teacher=teacher)
+        self.question = QuizQuestion.objects.create(
+            quiz=self.quiz, question='Sky is blue', question_type='true_false',
+            choices={'options': ['True', 'False']}, correct_answers={'answer': 'True'}, score=5,
+        )
+        self.student = Student.objects.create(student_name='S', student_email='s@example.com', roll_no='R1', student_class='C')
+        user = get_user_model().objects.create_user('s', 's@example.com', 'Xx12345678!!', is_student=True)
+        self.async_client.force_login(user)
+
+    def enroll(self):
+        StudentQuiz.objects.create(student=self.student, quiz=self.quiz)
+
+    async def test_join_form(self):
+        response = await self.async_client.get('/quiz/join/')
+        self.assertEqual(response.status_code, 200)
+
+    async def test_join_unknown_code(self):
+        response = await self.async_client.post('/quiz/join/', {'code': 'NOPE'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Invalid quiz code')
+
+    async def test_join(self):
+        response = await self.async_client.post('/quiz/join/', {'code': 'async001'})
+        self.assertRedirects(response, '/accounts/student/dashboard/', fetch_redirect_response=False)
+        self.assertTrue(await StudentQuiz.objects.filter(student=self.student, quiz=self.quiz).aexists())
+
+    async def test_take_quiz(self):
+        await StudentQuiz.objects.acreate(student=self.student, quiz=self.quiz)
+        response = await self.async_client.get(f'/quiz/{self.quiz.quiz_id}/take/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Sky is blue')
+
+    async def test_submit_quiz(self):
+        await StudentQuiz.objects.acreate(student=self.student, quiz=self.quiz)
+        response = await self.async_client.post(
+            f'/quiz/{self.quiz.quiz_id}/submit/', {f'question_{self.question.question_id}': 'True'},
+        )
+        self.assertRedirects(response, '/accounts/student/dashboard/', fetch_redirect_response=False)
+        result = await Result.objects.aget(student=self.student, quiz=self.quiz)
+        self.assertEqual(result.score, 5)
+
+    async def test_student_dashboard(self):
+        await StudentQuiz.objects.acreate(student=self.student, quiz=self.quiz)
+        response = await self.async_client.get('/accounts/student/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([quiz.quiz_name for quiz in response.context['quizzes']], ['Async quiz'])
+
+
+class QuizFixtures:
+    """A teacher's quiz with questions, and students, for tests against the database"""
+
+    def make_quiz(self, code='QUIZ0001', questions=(('multiple_choice', 'B', 2), ('short_answer', 'Paris', 3))):
+        teacher = Teacher.objects.create(teacher_name='T', teacher_email=f'{code}@example.com', dept='cs', subject='db')
+        quiz = Quiz.objects.create(quiz_name=f'Quiz {code}', quiz_code=code, subject='s', topic='t', teacher=teacher)
+        for n, (question_type, answer, score) in enumerate(questions):
+            QuizQuestion.objects.create(
+                quiz=quiz, question=f'Q{n}', question_type=question_type,
+                choices={'options': ['a', 'b', 'c', 'd']}, correct_answers={'answer': answer}, score=score,
+            )
+        return quiz
+
+    def make_students(self, n, student_class='C'):
+        return [
+            Student.objects.create(
+                student_name=f'S{i}', student_email=f's{i}.{student_class}@example.com',
+                roll_no=f'{student_class}{i}', student_class=student_class,
+            )
+            for i in range(n)
+        ]
+
+    def question_ids(self, quiz):
+        return list(quiz.quizquestion_set.order_by('question_id').values_list('question_id', flat=True))
+
+    def login(self, profile, is_student=True):
+        email = profile.student_email if is_student else profile.teacher_email
+        user = get_user_model().objects.create_user(
+            email.split('@')[0], email, 'Xx12345678!!', is_student=is_student, is_teacher=not is_student,
+        )
+        self.client.force_login(user)
+
+
+class RecordResultTests(QuizFixtures, TestCase):
+
+    def test_running_aggregates(self):
+        quiz = self.make_quiz()
+        students = self.make_students(3)
+        returned = [
+            record_result(student.student_id, quiz.quiz_id, quiz.question_version, score)
+            for student, score in zip(students, [2.0, 5.0, 3.0])
+        ]
+        quiz.refresh_from_db()
+        self.assertEqual(quiz.submission_count, 3)
+        self.assertEqual(quiz.score_sum, 10.0)
+        self.assertEqual(quiz.score_sq_sum, 38.0)
+        self.assertEqual(quiz.top_score, 5.0)
+        self.assertAlmostEqual(quiz.score_avg, 10 / 3)
+
+        # Each result carries the aggregates as of its own submission
+        self.assertEqual([(top, avg) for _, top, avg in returned], [(2.0, 2.0), (5.0, 3.5), (5.0, 10 / 3)])
+        stored = Result.objects.filter(quiz=quiz).order_by('result_id')
+        self.assertEqual([r.result_id for r in stored], [result_id for result_id, _, _ in returned])
+        self.assertEqual([(r.score, r.top_score) for r in stored], [(2.0, 2.0), (5.0, 5.0), (3.0, 5.0)])
+
+
+class GradingQueueTests(QuizFixtures, TransactionTestCase):
+
+    def setUp(self):
+        self.quiz = self.make_quiz()
+        self.students = self.make_students(2)
+        self.answers = dict(zip(map(str, self.question_ids(self.quiz)), ['B', 'paris']))
+        for student in self.students:
+            self.assertTrue(grading_queue.enqueue_submission(student.student_id, self.quiz.quiz_id, self.answers))
+
+    def test_failed_grade_is_requeued(self):
+        for attempt in range(1, grading_queue.GRADING_MAX_ATTEMPTS + 1):
+            with mock.patch.object(grading_queue, 'grade_many', side_effect=RuntimeError('boom')):
+                self.assertEqual(grading_queue.grade_pending(), 2)
+            for pending in PendingSubmission.objects.all():
+                self.assertEqual(pending.attempts, attempt)
+                self.assertEqual(pending.last_error, 'RuntimeError: boom')
+                self.assertEqual(pending.failed, attempt == grading_queue.GRADING_MAX_ATTEMPTS)
+
+        # Failed rows are no longer claimed, until retried or resubmitted
+        self.assertEqual(grading_queue.grade_pending(), 0)
+        student = self.students[0]
+        self.assertTrue(grading_queue.enqueue_submission(student.student_id, self.quiz.quiz_id, self.answers))
+        self.assertFalse(grading_queue.enqueue_submission(student.student_id, self.quiz.quiz_id, self.answers))
+        self.assertEqual(grading_queue.grade_pending(), 1)
+        self.assertEqual(Result.objects.get(student=student).score, 5)
+
+        self.assertEqual(grading_queue.retry_failed(self.quiz.quiz_id), 1)
+        self.assertEqual(grading_queue.grade_pending(), 1)
+        self.assertEqual(Result.objects.count(), 2)
+        self.assertFalse(PendingSubmission.objects.exists())
+
+    def test_claim_skips_locked_rows(self):
+        locked, release = threading.Event(), threading.Event()
+        locked_id = PendingSubmission.objects.get(student=self.students[0]).submission_id
+
+        def hold_lock():
+            # Another worker mid-batch, on its own connection
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute("SELECT 1 FROM quiz_pendingsubmission WHERE submission_id = %s FOR UPDATE", [locked_id])
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=hold_lock)
+        worker.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            self.assertEqual(grading_queue.grade_pending(), 1)
+        finally:
+            release.set()
+            worker.join()
+
+        self.assertEqual(list(Result.objects.values_list('student_id', flat=True)), [self.students[1].student_id])
+        self.assertEqual(list(PendingSubmission.objects.values_list('submission_id', flat=True)), [locked_id])
+
+
+class RegradeTests(QuizFixtures, TestCase):
+
+    def setUp(self):
+        self.quiz = self.make_quiz()
+        self.first, self.second = self.question_ids(self.quiz)
+        self.students = self.make_students(3)
+
+    def change_first_answer(self, answer):
+        QuizQuestion.objects.filter(pk=self.first).update(correct_answers={'answer': answer})
+        return bump_question_version(self.quiz.quiz_id)
+
+    def test_stale_answer_key(self):
+        version = self.change_first_answer('C')
+        with self.assertRaises(StaleAnswerKey) as raised:
+            record_result(self.students[0].student_id, self.quiz.quiz_id, version - 1, 5.0)
+        self.assertEqual(raised.exception.question_version, version)
+        self.assertFalse(Result.objects.exists())
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.submission_count, 0)
+
+    def test_grade_and_record_regrades_stale_submission(self):
+        answers = {self.first: 'C', self.second: 'Paris'}
+        self.assertEqual(grade_and_record(self.students[0].student_id, self.quiz.quiz_id, 0, answers)[1], 3)
+        self.change_first_answer('C')
+        answer_key, score, recorded = grade_and_record(self.students[1].student_id, self.quiz.quiz_id, 0, answers)
+        self.assertEqual((answer_key.version, score), (1, 5))
+        self.assertEqual(Result.objects.get(result_id=recorded[0]).score, 5)
+
+    def test_regrade_quiz(self):
+        submissions = [('B', 'paris'), ('C', 'paris'), ('C', 'rome')]
+        for student, (first, second) in zip(self.students, submissions):
+            grade_and_record(student.student_id, self.quiz.quiz_id, 0, {self.first: first, self.second: second})
+        self.assertEqual(list(Result.objects.order_by('student_id').values_list('score', flat=True)), [5, 3, 0])
+
+        self.change_first_answer('C')
+        counts = regrade_quiz(self.quiz.quiz_id)
+        self.assertEqual((counts['regraded'], counts['changed'], counts['skipped']), (3, 3, 0))
+        self.assertEqual((counts['top_score'], counts['score_avg']), (5, 10 / 3))
+
+        results = Result.objects.order_by('student_id')
+        self.assertEqual([r.score for r in results], [3, 5, 2])
+        self.assertEqual({(r.top_score, r.score_avg) for r in results}, {(5, 10 / 3)})
+        self.assertEqual(bytes(results[0].quizresponse.correct), pack_bits([False, True]))
+        self.quiz.refresh_from_db()
+        self.assertEqual(
+            (self.quiz.submission_count, self.quiz.score_sum, self.quiz.score_sq_sum, self.quiz.top_score),
+            (3, 10, 38, 5),
+        )
+
+        # Nothing left to change
+        self.assertEqual(regrade_quiz(self.quiz.quiz_id)['changed'], 0)
+
+
+class QuestionImportTests(SimpleTestCase):
+
+    def row(self, **fields):
+        return {
+            'question': 'Capital of France?', 'question_type': 'short_answer',
+            'correct_answers': {'answer': 'Paris'}, 'score': '2', **fields,
+        }
+
+    def test_build_question(self):
+        self.assertEqual(
+            build_question(self.row()),
+            ('Capital of France?', 'short_answer', '{}', '{"answer": "Paris"}', 2.0),
+        )
+
+    def test_score_must_be_a_finite_positive_number(self):
+        for score in ('nan', 'NaN', 'inf', '-inf', 'Infinity', 'x', None, '0', '-1'):
+            with self.assertRaises(QuestionImportError, msg=score):
+                build_question(self.row(score=score))
+
+    def test_csv(self):
+        upload = SimpleUploadedFile('questions.csv', (
+            'question,question_type,choice_a,choice_b,choice_c,choice_d,correct_answer,score\n'
+            '2+2?,multiple_choice,3,4,,,b,1\n'
+            'Sky is green,true_false,,,,,false,nan\n'
+        ).encode())
+        questions, errors = parse_question_file(upload)
+        self.assertEqual(questions, [('2+2?', 'multiple_choice', '{"options": ["3", "4"]}', '{"answer": "B"}', 1.0)])
+        self.assertEqual(errors, [(3, 'Score must be a number.')])
+
+    def test_file_not_utf8(self):
+        for name, content in (
+            ('questions.csv', 'question,question_type,correct_answer,score\nCafé?,short_answer,x,1\n'.encode('latin-1')),
+            ('questions.jsonl', b'{"question": "a"}\n{"question": "caf\xe9"}\n'),
+        ):
+            with self.assertRaises(QuestionImportError) as raised:
+                parse_question_file(SimpleUploadedFile(name, content))
+            self.assertEqual(raised.exception.row_number, 2, name)
+
+
+class IdempotentWriteTests(QuizFixtures, TestCase):
+
+    def test_duplicate_enrollment(self):
+        quiz = self.make_quiz()
+        student, = self.make_students(1)
+        self.assertTrue(add_student_to_quiz(student.student_id, quiz.quiz_id))
+        self.assertFalse(add_student_to_quiz(student.student_id, quiz.quiz_id))
+        self.assertEqual(StudentQuiz.objects.filter(quiz=quiz).count(), 1)
+        quiz.refresh_from_db()
+        self.assertEqual(quiz.enrolled_count, 1)
+
+    def test_duplicate_result_records_nothing(self):
+        quiz = self.make_quiz()
+        student, = self.make_students(1)
+        self.assertIsNotNone(record_result(student.student_id, quiz.quiz_id, quiz.question_version, 2.0))
+        self.assertIsNone(record_result(student.student_id, quiz.quiz_id, quiz.question_version, 5.0))
+        self.assertEqual(list(Result.objects.filter(quiz=quiz).values_list('score', flat=True)), [2.0])
+        quiz.refresh_from_db()
+        self.assertEqual((quiz.submission_count, quiz.score_sum, quiz.top_score), (1, 2.0, 2.0))
+
+    def test_duplicate_submit(self):
+        quiz = self.make_quiz()
+        student, = self.make_students(1)
+        add_student_to_quiz(student.student_id, quiz.quiz_id)
+        self.login(student)
+        first, second = self.question_ids(quiz)
+        self.client.post(f'/quiz/{quiz.quiz_id}/submit/', {f'question_{first}': 'B', f'question_{second}': 'paris'})
+        response = self.client.post(f'/quiz/{quiz.quiz_id}/submit/', {f'question_{first}': 'A'}, follow=True)
+        self.assertContains(response, 'You have already submitted this quiz.')
+        self.assertEqual(list(Result.objects.filter(quiz=quiz).values_list('score', flat=True)), [5.0])
+        quiz.refresh_from_db()
+        self.assertEqual(quiz.submission_count, 1)
+
+
+class AnswerDraftTests(QuizFixtures, TestCase):
+
+    def setUp(self):
+        self.quiz = self.make_quiz()
+        self.student = self.make_students(1)[0]
+        add_student_to_quiz(self.student.student_id, self.quiz.quiz_id)
+        self.login(self.student)
+        self.first, self.second = self.question_ids(self.quiz)
+        self.addCleanup(release_answers, self.student.student_id, self.quiz.quiz_id)
+
+    def stored_draft(self):
+        draft = QuizDraft.objects.filter(student=self.student, quiz=self.quiz).first()
+        return draft and {int(question_id): answer for question_id, answer in draft.answers.items()}
+
+    def autosave(self, answers):
+        return self.client.post(f'/quiz/{self.quiz.quiz_id}/autosave/', {f'question_{k}': v for k, v in answers.items()})
+
+    def test_autosave_outside_window(self):
+        for opens_at, closes_at in ((timezone.now() + timedelta(hours=1), None), (None, timezone.now() - timedelta(hours=1))):
+            Quiz.objects.filter(pk=self.quiz.pk).update(opens_at=opens_at, closes_at=closes_at)
+            quiz_cache().delete(quiz_window_key(self.quiz.quiz_id))
+            response = self.autosave({self.first: 'B'})
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(held_answers(self.student.student_id, self.quiz.quiz_id), {})
+
+    def test_autosave(self):
+        response = self.autosave({self.first: 'B'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'saved': 1, 'answered': 1})
+        self.assertEqual(held_answers(self.student.student_id, self.quiz.quiz_id), {self.first: 'B'})
+
+    def test_flush_merges_into_stored_draft(self):
+        # Another process flushed an answer to each question
+        QuizDraft.objects.create(student=self.student, quiz=self.quiz, answers={str(self.first): 'A', str(self.second): 'Rome'})
+        hold_answers(self.student.student_id, self.quiz.quiz_id, {self.first: 'B'})
+        # Buffered until the flush
+        self.assertEqual(self.stored_draft(), {self.first: 'A', self.second: 'Rome'})
+        flush_drafts()
+        self.assertEqual(self.stored_draft(), {self.first: 'B', self.second: 'Rome'})
+
+    def test_submission_answers_prefer_stored_draft(self):
+        student_id, quiz_id = self.student.student_id, self.quiz.quiz_id
+        hold_answers(student_id, quiz_id, {self.first: 'A'})
+        flush_drafts()
+        # Another process's later answers reached the draft table, but not this process's cache
+        QuizDraft.objects.filter(student=self.student).update(answers={str(self.first): 'B', str(self.second): 'Paris'})
+        self.assertEqual(held_answers(student_id, quiz_id), {self.first: 'A'})
+        # This process's buffered delta is flushed over them
+        hold_answers(student_id, quiz_id, {self.second: 'Rome'})
+        self.assertEqual(submission_answers(student_id, quiz_id), {self.first: 'B', self.second: 'Rome'})
+        self.assertEqual(self.stored_draft(), {self.first: 'B', self.second: 'Rome'})
+
+    def test_no_draft_after_submission(self):
+        hold_answers(self.student.student_id, self.quiz.quiz_id, {self.first: 'B'})
+        record_result(self.student.student_id, self.quiz.quiz_id, self.quiz.question_version, 2.0)
+        flush_drafts()
+        self.assertIsNone(self.stored_draft())
+
+
+@mock.patch.object(views, 'RESULTS_PAGE_SIZE', 3)
+class ResultsPaginationTests(QuizFixtures, TestCase):
+
+    def setUp(self):
+        self.quiz = self.make_quiz()
+        # Ties on score, so pages have to break them by result_id
+        scores = [5.0, 2.0, 5.0, 3.0, 2.0, 5.0, 0.0, 3.0, 2.0, 5.0, 1.0]
+        students = self.make_students(6, 'A') + self.make_students(5, 'B')
+        for student, score in zip(students, scores):
+            record_result(student.student_id, self.quiz.quiz_id, self.quiz.question_version, score)
+        self.login(self.quiz.teacher, is_student=False)
+
+    def pages(self, query=''):
+        pages = []
+        while query is not None:
+            response = self.client.get(f'/quiz/{self.quiz.quiz_id}/results/?{query}')
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.context['results'])
+            query = response.context['next_query']
+        return pages
+
+    def expected(self, **filters):
+        return list(
+            Result.objects.filter(quiz=self.quiz, **filters)
+            .order_by('-score', 'result_id').values_list('result_id', flat=True)
+        )
+
+    def test_pages_cover_every_result_once(self):
+        pages = self.pages()
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+        rows = [row for page in pages for row in page]
+        self.assertEqual([row.result_id for row in rows], self.expected())
+        self.assertEqual([row.rank for row in rows], list(range(1, 12)))
+
+    def test_filtered_pages(self):
+        rows = [row for page in self.pages('class=B&min_score=1') for row in page]
+        self.assertEqual([row.result_id for row in rows], self.expected(student__student_class='B', score__gte=1))
+        self.assertEqual([row.rank for row in rows], list(range(1, len(rows) + 1)))
+
+
+class ExportTests(QuizFixtures, TestCase):
+
+    def test_csv(self):
+        quiz = self.make_quiz()
+        first, second = self.make_students(2)
+        second.student_name = '=HYPERLINK("http://example.com")'
+        second.save()
+        question_ids = self.question_ids(quiz)
+        record_result(first.student_id, quiz.quiz_id, quiz.question_version, 5.0, question_ids, ['B', 'paris'], [True, True])
+        record_result(second.student_id, quiz.quiz_id, quiz.question_version, 2.0, question_ids, ['B', '@SUM(A1)'], [True, False])
+        self.login(quiz.teacher, is_student=False)
+
+        response = self.client.get(f'/quiz/{quiz.quiz_id}/results/export/')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows, [
+            ['Roll Number', 'Student Name', 'Email', 'Class', 'Score', 'Percentage', 'Q1', 'Q2'],
+            ['C0', 'S0', 's0.C@example.com', 'C', '5.0', '100.0', 'B', 'paris'],
+            ['C1', '\'=HYPERLINK("http://example.com")', 's1.C@example.com', 'C', '2.0', '40.0', 'B', "'@SUM(A1)"],
+        ])
+
+
+class ResponseStorageTests(QuizFixtures, TestCase):
+
+    def test_stored_responses(self):
+        quiz = self.make_quiz()
+        student, = self.make_students(1)
+        question_ids = self.question_ids(quiz)
+        record_result(student.student_id, quiz.quiz_id, quiz.question_version, 2.0, question_ids, ['B', 'rome'], [True, False])
+        response = QuizResponse.objects.get(result__student=student)
+        self.assertEqual(response.question_ids, question_ids)
+        self.assertEqual(response.answers, ['B', 'rome'])
+        self.assertEqual(bytes(response.correct), b'\x80')
+
+    def test_pack_bits(self):
+        self.assertEqual(pack_bits([]), b'')
+        self.assertEqual(pack_bits([True]), b'\x80')
+        self.assertEqual(pack_bits([True, False, True]), b'\xa0')
+        flags = [i % 3 == 0 for i in range(20)]
+        self.assertEqual(pack_bits(flags), np.packbits(flags).tobytes())
+
+
+class ItemAnalysisTests(SimpleTestCase):
+
+    def test_analyze_items(self):
+        correct = np.array([[1, 1, 0], [1, 1, 1], [0, 0, 1], [0, 0, 0]], dtype=bool)
+        seen = np.ones_like(correct)
+        p_values, discrimination, alpha = analyze_items(correct, seen, [1, 1, 1])
+        np.testing.assert_allclose(p_values, [0.5, 0.5, 0.5])
+        # Items 1 and 2 agree on every student; item 3 is unrelated to them
+        np.testing.assert_allclose(discrimination, [1 / np.sqrt(2), 1 / np.sqrt(2), 0], atol=1e-12)
+        self.assertAlmostEqual(alpha, 3 / 2 * (1 - 0.75 / 1.25))
+
+    def test_unseen_items(self):
+        correct = np.array([[1, 1], [0, 1], [1, 0]], dtype=bool)
+        seen = np.array([[1, 0], [1, 0], [1, 1]], dtype=bool)
+        p_values, discrimination, alpha = analyze_items(correct, seen, [1, 1])
+        self.assertAlmostEqual(p_values[0], 2 / 3)
+        self.assertEqual(p_values[1], 0)
+        # A single student saw both items: no variance to correlate or to compute alpha from
+        self.assertTrue(np.isnan(discrimination[1]))
+        self.assertIsNone(alpha)
+
+    def test_nobody_saw_an_item(self):
+        correct = np.zeros((2, 2), dtype=bool)
+        seen = np.array([[1, 0], [1, 0]], dtype=bool)
+        p_values, discrimination, _ = analyze_items(correct, seen, [1, 1])
+        self.assertTrue(np.isnan(p_values[1]))
+        self.assertTrue(np.isnan(discrimination[1]))
+
+class BulkEnrollTests(TestCase):
+
+    def setUp(self):
+        teacher = Teacher.objects.create(teacher_name='T', teacher_email='t@example.com', dept='cs', subject='db')
+        self.quiz = Quiz.objects.create(quiz_name='Roster', quiz_code='ROSTER01', subject='s', topic='t', teacher=teacher)
+        # Roll numbers repeat across classes
+        for student_class, roll_no in (('A', '1'), ('A', '2'), ('B', '1'), ('B', '3')):
+            Student.objects.create(
+                student_name=f'{student_class}{roll_no}', student_email=f'{student_class}{roll_no}@example.com',
+                roll_no=roll_no, student_class=student_class,
+            )
+
+    def enrolled(self):
+        return sorted(StudentQuiz.objects.filter(quiz=self.quiz).values_list('student__student_name', flat=True))
+
+    def test_class(self):
+        counts = bulk_add_students_to_quiz(self.quiz.quiz_id, student_class='A')
+        self.assertEqual(self.enrolled(), ['A1', 'A2'])
+        self.assertEqual(counts['enrolled'], 2)
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.enrolled_count, 2)
+
+    def test_roll_nos_within_class(self):
+        counts = bulk_add_students_to_quiz(self.quiz.quiz_id, student_class='A', roll_nos=['1', '3', '9'])
+        self.assertEqual(self.enrolled(), ['A1'])
+        self.assertEqual(counts, {
+            'enrolled': 1, 'skipped': 0, 'unknown': 2, 'unknown_roll_nos': ['3', '9'], 'ambiguous_roll_nos': [],
+        })
+
+    def test_roll_nos_in_several_classes(self):
+        counts = bulk_add_students_to_quiz(self.quiz.quiz_id, roll_nos=['1', '3', '9'])
+        self.assertEqual(self.enrolled(), ['A1', 'B1', 'B3'])
+        self.assertEqual(counts, {
+            'enrolled': 3, 'skipped': 0, 'unknown': 1, 'unknown_roll_nos': ['9'], 'ambiguous_roll_nos': ['1'],
+        })
+
+    def test_already_enrolled(self):
+        bulk_add_students_to_quiz(self.quiz.quiz_id, student_class='B', roll_nos=['1'])
+        counts = bulk_add_students_to_quiz(self.quiz.quiz_id, student_class='B')
+        self.assertEqual(self.enrolled(), ['B1', 'B3'])
+        self.assertEqual((counts['enrolled'], counts['skipped']), (1, 1))
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.enrolled_count, 2)
+
+
+class AnswerKeyTests(SimpleTestCase):
+
+    def test_normalize_answer(self):
+        self.assertEqual(normalize_answer('short_answer', '  Paris '), 'paris')
+        self.assertEqual(normalize_answer('multiple_choice', ' B '), 'B')
+        self.assertEqual(normalize_answer('true_false', True), 'True')
+
+    def test_parse_correct_answer(self):
+        self.assertEqual(parse_correct_answer('{"answer": "B"}'), 'B')
+        self.assertEqual(parse_correct_answer('{"answer": 4}'), '4')
+        self.assertEqual(parse_correct_answer('{}'), '')
+        # Anything that is not an {"answer": ...} object is taken as is
+        self.assertEqual(parse_correct_answer('not json'), 'not json')
+        self.assertEqual(parse_correct_answer('["B"]'), '["B"]')
+
+
+class GradingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.key = AnswerKey(
+            quiz_id=1, version=1, question_ids=(10, 11, 12),
+            question_types=('multiple_choice', 'short_answer', 'true_false'),
+            answers=('B', 'paris', 'True'), scores=(2, 3, 5), max_score=10,
+        )
+
+    def test_grade(self):
+        score, answers, correct = grade(self.key, {10: ' B ', 11: 'PARIS', 12: 'False'})
+        self.assertEqual(score, 5)
+        self.assertEqual(answers, ['B', 'paris', 'False'])
+        self.assertEqual(correct, [True, True, False])
+
+    def test_grade_is_case_sensitive_except_short_answers(self):
+        self.assertEqual(grade(self.key, {10: 'b', 12: 'true'}).score, 0)
+
+    def test_grade_missing_answers_are_blank(self):
+        score, answers, correct = grade(self.key, {})
+        self.assertEqual(score, 0)
+        self.assertEqual(answers, ['', '', ''])
+        self.assertEqual(correct, [False, False, False])
+
+    def test_grade_ignores_unknown_questions(self):
+        self.assertEqual(grade(self.key, {10: 'B', 99: 'B'}).score, 2)
+
+    def test_grade_many(self):
+        submissions = [{10: 'B', 11: 'paris', 12: 'True'}, {}, {12: 'True'}]
+        self.assertEqual([g.score for g in grade_many(self.key, submissions)], [10, 0, 5])
+        self.assertEqual(grade_many(self.key, []), [])
+
+    def test_form_answers(self):
+        data = {'question_10': 'B', 'question_x': 'A', 'csrfmiddlewaretoken': 't', 'question_11': 'paris'}
+        self.assertEqual(form_answers(data), {10: 'B', 11: 'paris'})
+
+
+class FakeConnection:
+    def __init__(self, prepared_statements):
+        self.prepared_statements = prepared_statements
+
+
+class FakeCursor:
+    def __init__(self, prepared_statements=None, fail=False):
+        self.connection = FakeConnection(prepared_statements)
+        self.executed = []
+        self.fail = fail
+
+    def execute(self, sql, params):
+        self.executed.append((sql, params))
+        if self.fail:
+            raise RuntimeError('statement failed')
+
+
+class StatementTests(SimpleTestCase):
+
+    def test_named_placeholders(self):
+        statement = Statement('s', 'SELECT %(b)s, %(a)s, %(b)s', {'a': 'integer', 'b': 'text'})
+        self.assertEqual(statement.prepare_sql, 'PREPARE s (integer, text) AS SELECT $2, $1, $2')
+        self.assertEqual(statement.execute_sql, 'EXECUTE s (%(a)s, %(b)s)')
+
+    def test_positional_placeholders(self):
+        statement = Statement('s', 'SELECT 1 WHERE a = %s AND b = %s', ['integer', 'varchar'])
+        self.assertEqual(statement.prepare_sql, 'PREPARE s (integer, varchar) AS SELECT 1 WHERE a = $1 AND b = $2')
+        self.assertEqual(statement.execute_sql, 'EXECUTE s (%s, %s)')
+
+    def test_types_must_match_parameters(self):
+        with self.assertRaises(ValueError):
+            Statement('s', 'SELECT %(a)s', {'a': 'integer', 'b': 'text'})
+        with self.assertRaises(ValueError):
+            Statement('s', 'SELECT %(a)s, %(c)s', {'a': 'integer'})
+        with self.assertRaises(ValueError):
+            Statement('s', 'SELECT %s, %s', ['integer'])
+
+    def test_run_unprepared_connection(self):
+        statement = Statement('s', 'SELECT %s', ['integer'])
+        cursor = FakeCursor()
+        run(cursor, statement, [1])
+        self.assertEqual(cursor.executed, [('SELECT %s', [1])])
+
+    def test_run_prepares_once(self):
+        statement = Statement('s', 'SELECT %s', ['integer'])
+        cursor = FakeCursor(set())
+        run(cursor, statement, [1])
+        run(cursor, statement, [2])
+        self.assertEqual(cursor.executed, [
+            ('PREPARE s (integer) AS SELECT $1; EXECUTE s (%s)', [1]),
+            ('EXECUTE s (%s)', [2]),
+        ])
+        self.assertEqual(cursor.connection.prepared_statements, {'s'})
+
+    def test_run_failed_prepare_stops_preparing(self):
+        cursor = FakeCursor(set(), fail=True)
+        with self.assertRaises(RuntimeError):
+            run(cursor, Statement('s', 'SELECT %s', ['integer']), [1])
+        self.assertIsNone(cursor.connection.prepared_statements)
+
+
+@dataclass(slots=True)
+class Pair:
+    a: int
+    b: int
+
+
+@dataclass(slots=True)
+class Single:
+    b: int
+
+
+class RecordMapperTests(SimpleTestCase):
+
+    def test_same_order(self):
+        self.assertEqual(record_mapper(Pair, ('a', 'b'))((1, 2)), Pair(1, 2))
+
+    def test_reordered_and_extra_columns(self):
+        self.assertEqual(record_mapper(Pair, ('x', 'b', 'a'))((0, 2, 1)), Pair(1, 2))
+        self.assertEqual(record_mapper(Single, ('a', 'b'))((1, 2)), Single(2))
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(ValueError, "Pair needs columns ['b']"):
+            record_mapper(Pair, ('a', 'c'))
+
+    def test_mapper_is_reused(self):
+        self.assertIs(record_mapper(Pair, ('b', 'a')), record_mapper(Pair, ('b', 'a')))
+
+
+class WindowStateTests(SimpleTestCase):
+
+    def window(self, opens_in=None, closes_in=None):
+        now = time.time()
+        return QuizWindow(
+            'Quiz',
+            None if opens_in is None else now + opens_in,
+            None if closes_in is None else now + closes_in,
+        )
+
+    def test_unscheduled_quiz_is_open(self):
+        self.assertEqual(window_state(self.window()), OPEN)
+        self.assertEqual(window_state(None), OPEN)
+
+    def test_before_opening(self):
+        self.assertEqual(window_state(self.window(opens_in=60)), WAITING)
+        self.assertEqual(window_state(self.window(opens_in=60, closes_in=120)), WAITING)
+
+    def test_open(self):
+        self.assertEqual(window_state(self.window(opens_in=-60)), OPEN)
+        self.assertEqual(window_state(self.window(opens_in=-60, closes_in=60)), OPEN)
+
+    def test_closed(self):
+        self.assertEqual(window_state(self.window(closes_in=-1)), CLOSED)
+
+    def test_close_grace(self):
+        self.assertEqual(window_state(self.window(closes_in=-30), grace=60), OPEN)
+        self.assertEqual(window_state(self.window(closes_in=-90), grace=60), CLOSED)
+
+
+@mock.patch.object(views, 'render', lambda request, template, context: HttpResponse(template))
+@mock.patch.object(views, 'get_student_id', lambda request: 3)
+@mock.patch.object(views, 'find_result', lambda student_id, quiz_id: (7, 2))
+class ResultETagTests(SimpleTestCase):
+
+    def get(self, message=None, **headers):
+        request = RequestFactory().get('/quiz/5/student-results/', headers=headers)
+        request.user = mock.Mock(is_authenticated=True)
+        request._messages = CookieStorage(request)
+        if message:
+            add_message(request, INFO, message)
+        with mock.patch.object(views, 'get_result_payload', return_value={}) as payload:
+            response = views.student_quiz_result(request, 5)
+        return response, payload
+
+    def test_tagged(self):
+        response, _ = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"result-7-v2"')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_not_modified(self):
+        response, payload = self.get(if_none_match='"result-7-v2"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], '"result-7-v2"')
+        payload.assert_not_called()
+
+    def test_regraded(self):
+        response, payload = self.get(if_none_match='"result-7-v1"')
+        self.assertEqual(response.status_code, 200)
+        payload.assert_called_once_with(5, 2, 7)
+
+    def test_page_with_message_is_not_tagged(self):
+        response, _ = self.get(message='Quiz submitted', if_none_match='"result-7-v2"')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class ResultRevalidationTests(QuizFixtures, TestCase):
+
+    def setUp(self):
+        self.quiz = self.make_quiz()
+        self.student = self.make_students(1)[0]
+        record_result(self.student.student_id, self.quiz.quiz_id, self.quiz.question_version, 5.0)
+        self.login(self.student)
+        self.url = f'/quiz/{self.quiz.quiz_id}/student-results/'
+
+    def test_not_modified_without_querying_results(self):
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q['sql'] for q in queries if 'quiz_result' in q['sql']])
+
+    def test_version_bump_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_question_version(self.quiz.quiz_id)
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class CacheCheckTests(SimpleTestCase):
+
+    def warnings(self):
+        return [warning.id for warning in check_quiz_cache(None)]
+
+    @override_settings(DEBUG=True)
+    def test_development_server(self):
+        self.assertEqual(self.warnings(), [])
+
+    @override_settings(DEBUG=False)
+    def test_process_local_cache_in_production(self):
+        self.assertEqual(self.warnings(), ['quiz.W001'])
+
+    @override_settings(DEBUG=False, CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/quiz-cache'}})
+    def test_shared_cache(self):
+        self.assertEqual(self.warnings(), [])
+
+
+class ResultStreamTests(SimpleTestCase):
+
+    def event(self, since, result_ids, count=None):
+        return {
+            'kind': 'result', 'since': since, 'new_results': len(result_ids) if count is None else count,
+            'stats': {}, 'results': [{'result_id': result_id} for result_id in result_ids],
+        }
+
+    async def stream(self, *events):
+        queue = asyncio.Queue()
+        for event in events:
+            queue.put_nowait(event)
+        hub = mock.Mock(subscribe=mock.Mock(return_value=queue))
+        with mock.patch.object(live_results, 'hub', hub):
+            stream = live_results.result_events(5, 10)
+            await anext(stream)
+            sent = [json.loads((await anext(stream)).split('data: ', 1)[1]) for _ in events]
+            await stream.aclose()
+        return [([r['result_id'] for r in event['results']], event['new_results']) for event in sent], hub
+
+    async def test_result_committed_out_of_order(self):
+        # 12 commits before 11
+        sent, hub = await self.stream(self.event(10, [12]), self.event(10, [11, 12]))
+        self.assertEqual(sent, [([12], 1), ([11], 1)])
+        hub.advance.assert_called_with(5, mock.ANY, 10)
+
+    @mock.patch.object(live_results, 'LIVE_RESULTS_SETTLE', 0)
+    async def test_cursor_settles(self):
+        sent, hub = await self.stream(self.event(10, [12]), self.event(12, [13]))
+        self.assertEqual(sent, [([12], 1), ([13], 1)])
+        hub.advance.assert_called_with(5, mock.ANY, 13)
+
+    async def test_burst_is_counted_once(self):
+        sent, hub = await self.stream(self.event(10, [15, 16], count=6), self.event(14, [15, 16, 17]))
+        self.assertEqual(sent, [([15, 16], 6), ([17], 1)])
+
+
+class LocalDatabaseTests(SimpleTestCase):
+
+    def test_remote_database_refused(self):
+        with mock.patch.dict(connection.settings_dict, {'HOST': 'db.example.com'}):
+            for command in ('loadtest', 'benchmark_views'):
+                with self.assertRaisesMessage(CommandError, 'Pass --i-know'):
+                    call_command(command)
+            require_local_database(i_know=True)
+
+    def test_local_hosts(self):
+        for host in ('', None, 'localhost', '127.0.0.1', '::1', '/var/run/postgresql'):
+            self.assertTrue(is_local_host(host), host)
+        self.assertFalse(is_local_host('db.example.com'))
+
+
+class ParamTests(SimpleTestCase):
+
+    def test_float_param(self):
+        request = RequestFactory().get('/', {'a': '2.5', 'b': 'x', 'c': 'nan', 'd': 'inf', 'e': '-Infinity'})
+        self.assertEqual(views._float_param(request, 'a'), 2.5)
+        for name in ('b', 'c', 'd', 'e', 'missing'):
+            self.assertIsNone(views._float_param(request, name), name)
@@ -1,12 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# The hot student views have async versions for ASGI deployments
+student_views = views
+if getattr(settings, 'QUIZ_ASYNC_VIEWS', False):
+    from . import async_views as student_views
+
 urlpatterns = [
     path('create/', views.create_quiz, name='create_quiz'),
     path('<int:quiz_id>/add_question/', views.add_question, name='add_question'),
-    path('join/', views.join_quiz, name='join_quiz'),
-    path('<int:quiz_id>/take/', views.take_quiz, name='take_quiz'),
-    path('<int:quiz_id>/submit/', views.submit_quiz, name='submit_quiz'),
+    path('<int:quiz_id>/import_questions/', views.import_questions, name='import_questions'),
+    path('<int:quiz_id>/answer_key/', views.edit_answer_key, name='edit_answer_key'),
+    path('join/', student_views.join_quiz, name='join_quiz'),
+    path('<int:quiz_id>/take/', student_views.take_quiz, name='take_quiz'),
+    path('<int:quiz_id>/questions/', views.quiz_questions, name='quiz_questions'),
+    path('<int:quiz_id>/autosave/', views.autosave_answers, name='autosave_answers'),
+    path('<int:quiz_id>/submit/', student_views.submit_quiz, name='submit_quiz'),
     path('<int:quiz_id>/results/', views.view_quiz_results, name='view_quiz_results'),
+    path('<int:quiz_id>/results/live/', views.quiz_results_stream, name='quiz_results_stream'),
+    path('<int:quiz_id>/results/export/', views.export_quiz_results, name='export_quiz_results'),
     path('<int:quiz_id>/student-results/', views.student_quiz_result, name='student_quiz_result'),
 ]
@@ -1,5 +1,11 @@
 # quiz/utils.py
-from django.db import connection
+from django.db import connection, transaction
+from quiz_system import async_db
+from quiz_system.db.statements import Statement, run
+from .answer_keys import aget_answer_key, get_answer_key
+from .grading import grade
+from .live_results import RESULTS_CHANNEL, notify_results
+from .result_cache import set_quiz_version
 
 def create_teacher_account(teacher_name, teacher_email, dept, subject):
     with connection.cursor() as cursor:
@@ -8,9 +14,289 @@ def create_teacher_account(teacher_name, teacher_email, dept, subject):
             VALUES (%s, %s, %s, %s)
         """, [teacher_name, teacher_email, dept, subject])
 
+ADD_STUDENT = Statement('add_student', """
+    WITH enrolled AS (
+        INSERT INTO quiz_studentquiz (student_id, quiz_id)
+        VALUES (%(student_id)s, %(quiz_id)s)
+        ON CONFLICT (student_id, quiz_id) DO NOTHING
+        RETURNING student_quiz_id
+    ), counted AS (
+        UPDATE quiz_quiz SET enrolled_count = enrolled_count + 1
+        WHERE quiz_id = %(quiz_id)s AND EXISTS (SELECT 1 FROM enrolled)
+    )
+    SELECT student_quiz_id FROM enrolled
+""", {'student_id': 'integer', 'quiz_id': 'integer'})
+
 def add_student_to_quiz(student_id, quiz_id):
+    # Returns True if the student was newly enrolled, False if already enrolled.
+    # The quiz's enrolled_count is bumped in the same statement.
+    with connection.cursor() as cursor:
+        run(cursor, ADD_STUDENT, {'student_id': student_id, 'quiz_id': quiz_id})
+        return cursor.fetchone() is not None
+
+async def aadd_student_to_quiz(student_id, quiz_id):
+    return await async_db.fetchone(ADD_STUDENT, {'student_id': student_id, 'quiz_id': quiz_id}) is not None
+
+def pack_bits(flags):
+    # Pack booleans into bytes, first flag in the most significant bit
+    # (the layout numpy.unpackbits reads back)
+    packed = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            packed[i >> 3] |= 0x80 >> (i & 7)
+    return bytes(packed)
+
+class StaleAnswerKey(Exception):
+    """The quiz's questions changed after the submission was graded"""
+
+    def __init__(self, question_version):
+        super().__init__(f'Answer key changed (now version {question_version})')
+        self.question_version = question_version
+
+RECORD_RESULT = Statement('record_result', """
+    WITH new_result AS (
+        INSERT INTO quiz_result (score, top_score, score_avg, student_id, quiz_id)
+        SELECT %(score)s,
+               CASE WHEN q.submission_count = 0 THEN %(score)s ELSE GREATEST(q.top_score, %(score)s) END,
+               (q.score_sum + %(score)s) / (q.submission_count + 1),
+               %(student_id)s, q.quiz_id
+        FROM quiz_quiz q
+        WHERE q.quiz_id = %(quiz_id)s AND q.question_version = %(question_version)s
+        FOR NO KEY UPDATE OF q
+        ON CONFLICT (student_id, quiz_id) DO NOTHING
+        RETURNING result_id, top_score, score_avg
+    ), stats AS (
+        UPDATE quiz_quiz
+        SET submission_count = submission_count + 1,
+            score_sum = score_sum + %(score)s,
+            score_sq_sum = score_sq_sum + %(score)s * %(score)s,
+            top_score = CASE WHEN submission_count = 0 THEN %(score)s ELSE GREATEST(top_score, %(score)s) END,
+            score_avg = (score_sum + %(score)s) / (submission_count + 1)
+        WHERE quiz_id = %(quiz_id)s AND EXISTS (SELECT 1 FROM new_result)
+    ), response AS (
+        INSERT INTO quiz_quizresponse (result_id, question_ids, answers, correct)
+        SELECT result_id, %(question_ids)s::integer[], %(answers)s::text[], %(correct)s
+        FROM new_result
+    )
+    SELECT n.result_id, n.top_score, n.score_avg
+    FROM new_result n
+    CROSS JOIN LATERAL pg_notify(%(channel)s, json_build_object('quiz_id', %(quiz_id)s, 'kind', 'result')::text) notified
+""", {
+    'channel': 'text', 'score': 'double precision', 'student_id': 'integer', 'quiz_id': 'integer',
+    'question_version': 'integer', 'question_ids': 'integer[]', 'answers': 'text[]', 'correct': 'bytea',
+})
+
+def record_result(student_id, quiz_id, question_version, score, question_ids=(), answers=(), correct=()):
+    """Insert a student's result and fold it into the quiz's running aggregates.
+
+    question_ids, answers and correct are parallel per-question sequences
+    stored alongside the result in quiz_quizresponse for item analysis.
+
+    All writes happen in one statement. The INSERT relies on the unique
+    (student_id, quiz_id) constraint, so a duplicate submission inserts
+    nothing, leaves the aggregates alone and returns None. Otherwise returns
+    (result_id, top_score, score_avg).
+
+    The stats UPDATE's SET expressions see the row as locked at update time,
+    so concurrent submitters serialize on the quiz row instead of overwriting
+    each other's averages. The top_score/score_avg copied onto the result are
+    a snapshot and may miss a submission committed in the same instant.
+    A recorded result also notifies live results pages (see live_results).
+
+    score must have been graded against question_version. The quiz row is
+    locked and its version checked as the result goes in, so a submission
+    that raced a question change (and its regrade) is not recorded against
+    the old key: StaleAnswerKey is raised instead (see grade_and_record).
+    """
+    params = _record_result_params(student_id, quiz_id, question_version, score, question_ids, answers, correct)
+    with connection.cursor() as cursor:
+        run(cursor, RECORD_RESULT, params)
+        recorded = cursor.fetchone()
+        if recorded is None:
+            cursor.execute("SELECT question_version FROM quiz_quiz WHERE quiz_id = %s", [quiz_id])
+            _check_version(cursor.fetchone(), question_version)
+        return recorded
+
+async def arecord_result(student_id, quiz_id, question_version, score, question_ids=(), answers=(), correct=()):
+    params = _record_result_params(student_id, quiz_id, question_version, score, question_ids, answers, correct)
+    recorded = await async_db.fetchone(RECORD_RESULT, params)
+    if recorded is None:
+        row = await async_db.fetchone("SELECT question_version FROM quiz_quiz WHERE quiz_id = %s", [quiz_id])
+        _check_version(row, question_version)
+    return recorded
+
+def _check_version(row, question_version):
+    # Nothing was recorded: a duplicate submission, unless the key moved on
+    if row is not None and row[0] != question_version:
+        raise StaleAnswerKey(row[0])
+
+def _record_result_params(student_id, quiz_id, question_version, score, question_ids, answers, correct):
+    return {
+        'channel': RESULTS_CHANNEL,
+        'score': score, 'student_id': student_id, 'quiz_id': quiz_id, 'question_version': question_version,
+        'question_ids': list(question_ids), 'answers': list(answers), 'correct': pack_bits(correct),
+    }
+
+def grade_and_record(student_id, quiz_id, question_version, answers):
+    """Grade answers ({question_id: raw answer}) against the quiz's key at
+    question_version and record the result.
+
+    If the questions change before the result is recorded, the submission is
+    graded again against the new key. Returns (answer_key, score, recorded),
+    recorded as returned by record_result.
+    """
+    while True:
+        answer_key = get_answer_key(quiz_id, question_version)
+        score, graded_answers, correct = grade(answer_key, answers)
+        try:
+            recorded = record_result(student_id, quiz_id, question_version, score, answer_key.question_ids, graded_answers, correct)
+        except StaleAnswerKey as stale:
+            question_version = stale.question_version
+            continue
+        return answer_key, score, recorded
+
+async def agrade_and_record(student_id, quiz_id, question_version, answers):
+    while True:
+        answer_key = await aget_answer_key(quiz_id, question_version)
+        score, graded_answers, correct = grade(answer_key, answers)
+        try:
+            recorded = await arecord_result(student_id, quiz_id, question_version, score, answer_key.question_ids, graded_answers, correct)
+        except StaleAnswerKey as stale:
+            question_version = stale.question_version
+            continue
+        return answer_key, score, recorded
+
+def record_results(rows):
+    """Bulk version of record_result for the background grading worker.
+
+    rows are (student_id, quiz_id, score, question_ids, answers, correct)
+    tuples. Results and responses are inserted and each quiz's aggregates
+    updated once per batch, all in one statement. Rows whose student already
+    has a result are skipped. The top_score/score_avg snapshot copied onto
+    each result reflects the quiz as it stood before the batch. Returns the
+    (student_id, quiz_id) pairs recorded.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+
+    values = []
+    params = []
+    for student_id, quiz_id, score, question_ids, answers, correct in rows:
+        values.append("(%s, %s, %s::double precision, %s::integer[], %s::text[], %s::bytea)")
+        params.extend([student_id, quiz_id, score, list(question_ids), list(answers), pack_bits(correct)])
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Lock the quiz rows in a fixed order first so concurrent workers
+        # touching overlapping quizzes queue up instead of deadlocking
+        cursor.execute(
+            "SELECT quiz_id FROM quiz_quiz WHERE quiz_id = ANY(%s) ORDER BY quiz_id FOR UPDATE",
+            [sorted({row[1] for row in rows})]
+        )
+        cursor.execute(f"""
+            WITH submitted (student_id, quiz_id, score, question_ids, answers, correct) AS (
+                VALUES {', '.join(values)}
+            ), new_results AS (
+                INSERT INTO quiz_result (score, top_score, score_avg, student_id, quiz_id)
+                SELECT s.score,
+                       CASE WHEN q.submission_count = 0 THEN s.score ELSE GREATEST(q.top_score, s.score) END,
+                       (q.score_sum + s.score) / (q.submission_count + 1),
+                       s.student_id, s.quiz_id
+                FROM submitted s
+                JOIN quiz_quiz q ON q.quiz_id = s.quiz_id
+                ON CONFLICT (student_id, quiz_id) DO NOTHING
+                RETURNING result_id, student_id, quiz_id, score
+            ), responses AS (
+                INSERT INTO quiz_quizresponse (result_id, question_ids, answers, correct)
+                SELECT n.result_id, s.question_ids, s.answers, s.correct
+                FROM new_results n
+                JOIN submitted s ON s.student_id = n.student_id AND s.quiz_id = n.quiz_id
+            ), stats AS (
+                UPDATE quiz_quiz q
+                SET submission_count = q.submission_count + a.n,
+                    score_sum = q.score_sum + a.total,
+                    score_sq_sum = q.score_sq_sum + a.sq_total,
+                    top_score = CASE WHEN q.submission_count = 0 THEN a.top ELSE GREATEST(q.top_score, a.top) END,
+                    score_avg = (q.score_sum + a.total) / (q.submission_count + a.n)
+                FROM (
+                    SELECT quiz_id, COUNT(*) AS n, SUM(score) AS total,
+                           SUM(score * score) AS sq_total, MAX(score) AS top
+                    FROM new_results
+                    GROUP BY quiz_id
+                ) a
+                WHERE q.quiz_id = a.quiz_id
+            )
+            SELECT student_id, quiz_id FROM new_results
+        """, params)
+        recorded = cursor.fetchall()
+        notify_results(cursor, {quiz_id for _, quiz_id in recorded})
+        return recorded
+
+def bump_question_version(quiz_id):
+    # Call after any change to a quiz's questions; caches keyed on the version go stale
     with connection.cursor() as cursor:
         cursor.execute("""
-            INSERT INTO quiz_studentquiz (student_id, quiz_id)
-            VALUES (%s, %s)
-        """, [student_id, quiz_id])
+            UPDATE quiz_quiz SET question_version = question_version + 1
+            WHERE quiz_id = %s
+            RETURNING question_version
+        """, [quiz_id])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    transaction.on_commit(lambda: set_quiz_version(quiz_id, row[0]))
+    return row[0]
+
+def bulk_add_students_to_quiz(quiz_id, student_class=None, roll_nos=None):
+    """Enroll a whole class, or a list of roll numbers, in one statement.
+
+    Roll numbers are only unique within a class: with student_class they
+    pick students of that class, without it every student holding one of
+    them. Returns a dict with the number of students newly 'enrolled',
+    'skipped' (already enrolled) and 'unknown' (listed roll numbers with no
+    student), plus the 'unknown_roll_nos' themselves and the
+    'ambiguous_roll_nos' that matched more than one student (all of whom
+    were enrolled).
+    """
+    if student_class is None and roll_nos is None:
+        raise ValueError('Provide a student_class, a list of roll_nos, or both.')
+
+    conditions = []
+    params = []
+    if student_class is not None:
+        conditions.append("student_class = %s")
+        params.append(student_class)
+    if roll_nos is not None:
+        roll_nos = list(dict.fromkeys(r.strip() for r in roll_nos if r and r.strip()))
+        conditions.append("roll_no = ANY(%s)")
+        params.append(roll_nos)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH matched AS (
+                SELECT student_id, roll_no FROM quiz_student
+                WHERE {' AND '.join(conditions)}
+            ), enrolled AS (
+                INSERT INTO quiz_studentquiz (student_id, quiz_id)
+                SELECT m.student_id, %s FROM matched m
+                ON CONFLICT (student_id, quiz_id) DO NOTHING
+                RETURNING student_id
+            ), counted AS (
+                UPDATE quiz_quiz SET enrolled_count = enrolled_count + (SELECT COUNT(*) FROM enrolled)
+                WHERE quiz_id = %s
+            )
+            SELECT (SELECT COUNT(*) FROM enrolled),
+                   (SELECT COUNT(*) FROM matched),
+                   (SELECT array_agg(DISTINCT roll_no) FROM matched),
+                   ARRAY(SELECT roll_no FROM matched GROUP BY roll_no HAVING COUNT(*) > 1 ORDER BY roll_no)
+        """, params + [quiz_id, quiz_id])
+        enrolled, matched, found_roll_nos, ambiguous_roll_nos = cursor.fetchone()
+
+    found_roll_nos = set(found_roll_nos or [])
+    unknown_roll_nos = [r for r in roll_nos or [] if r not in found_roll_nos]
+    return {
+        'enrolled': enrolled,
+        'skipped': matched - enrolled,
+        'unknown': len(unknown_roll_nos),
+        'unknown_roll_nos': unknown_roll_nos,
+        'ambiguous_roll_nos': ambiguous_roll_nos if roll_nos is not None else [],
+    }
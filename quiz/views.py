@@ -1,10 +1,45 @@
+import json
+import math
 import uuid
+from urllib.parse import urlencode
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import connection
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.safestring import mark_safe
+from django.utils.text import slugify
+from accounts.profiles import get_student_id, get_teacher_id
+from .answer_state import held_answers, hold_answers, release_answers, submission_answers
+from .answer_keys import parse_correct_answer
+from .code_lookup import forget_quiz_code, lookup_quiz_code
+from .exports import stream_results_csv
+from .grading import form_answers
+from .grading_queue import ASYNC_GRADING, enqueue_submission
+from .item_analysis import CHOICE_LETTERS, quiz_item_analysis
+from .live_results import result_events
+from .question_cache import get_question_block, get_question_page, invalidate_question_block
+from .question_import import QuestionImportError, insert_questions, parse_question_file
+from .regrade import regrade_quiz
+from .repository import get_attempt, get_quiz, get_teacher_quiz, results_page
+from .result_cache import find_result, get_result_payload, result_etag
+from .schedule import CLOSED, OPEN, QUIZ_CLOSE_GRACE, WAITING, quiz_window, waiting_response, window_state
+from .utils import add_student_to_quiz, bump_question_version, grade_and_record
 # Models are no longer needed since we use raw SQL
 
+# Rows per page of the teacher results view
+RESULTS_PAGE_SIZE = 50
+
+# Quizzes with more questions than this are delivered a page at a time
+PAGED_QUESTION_THRESHOLD = getattr(settings, 'QUIZ_PAGED_QUESTION_THRESHOLD', 50)
+
 @login_required
 def create_quiz(request):
     if request.method == 'POST':
@@ -12,30 +47,40 @@ def create_quiz(request):
         subject = request.POST['subject']
         topic = request.POST['topic']
         
+        # Optional exam window, entered in the site's time zone
+        try:
+            opens_at = _datetime_field(request, 'opens_at')
+            closes_at = _datetime_field(request, 'closes_at')
+        except ValueError:
+            messages.error(request, 'Enter the opening and closing times as a date and time.')
+            return render(request, 'quiz/create_quiz.html')
+        
+        if opens_at and closes_at and closes_at <= opens_at:
+            messages.error(request, 'The closing time must be after the opening time.')
+            return render(request, 'quiz/create_quiz.html')
+        
         with connection.cursor() as cursor:
             try:
-                # Get teacher record using raw SQL
-                cursor.execute(
-                    "SELECT teacher_id FROM quiz_teacher WHERE teacher_email = %s",
-                    [request.user.email]
-                )
-                teacher_result = cursor.fetchone()
+                # Teacher profile is resolved once per session
+                teacher_id = get_teacher_id(request)
                 
-                if not teacher_result:
+                if not teacher_id:
                     messages.error(request, 'Teacher profile not found. Please contact admin.')
                     return redirect('teacher_dashboard')
                 
-                teacher_id = teacher_result[0]
-                
                 # Generate quiz code and create quiz using raw SQL (let database auto-generate quiz_id)
                 quiz_code = str(uuid.uuid4())[:8].upper()
                 
                 cursor.execute(
-                    """INSERT INTO quiz_quiz (quiz_name, quiz_code, subject, topic, teacher_id, top_score, score_avg) 
-                       VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-                    [quiz_name, quiz_code, subject, topic, teacher_id, 0, 0]
+                    """INSERT INTO quiz_quiz (quiz_name, quiz_code, subject, topic, teacher_id, top_score, score_avg,
+                                            enrolled_count, submission_count, score_sum, score_sq_sum, question_version,
+                                            opens_at, closes_at) 
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                    [quiz_name, quiz_code, subject, topic, teacher_id, 0, 0, 0, 0, 0, 0, 0, opens_at, closes_at]
                 )
                 
+                forget_quiz_code(quiz_code)
+                
                 messages.success(request, f'Quiz "{quiz_name}" created successfully! Quiz code: {quiz_code}')
                 return redirect('teacher_dashboard')
                 
@@ -45,34 +90,28 @@ def create_quiz(request):
     
     return render(request, 'quiz/create_quiz.html')
 
+def _datetime_field(request, name):
+    # A datetime-local form value in the current time zone; blank means unset
+    value = request.POST.get(name, '').strip()
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'Invalid date and time: {value}')
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
 @login_required
 def add_question(request, quiz_id):
     with connection.cursor() as cursor:
-        # Verify quiz exists and get quiz details using raw SQL
-        cursor.execute(
-            "SELECT quiz_id, quiz_name, teacher_id FROM quiz_quiz WHERE quiz_id = %s",
-            [quiz_id]
-        )
-        quiz_result = cursor.fetchone()
+        # Verify quiz exists and get quiz details
+        quiz_data = get_quiz(quiz_id)
         
-        if not quiz_result:
+        if not quiz_data:
             messages.error(request, 'Quiz not found.')
             return redirect('teacher_dashboard')
         
-        quiz_data = {
-            'quiz_id': quiz_result[0],
-            'quiz_name': quiz_result[1],
-            'teacher_id': quiz_result[2]
-        }
-        
         # Check if the current user is the teacher who owns this quiz
-        cursor.execute(
-            "SELECT teacher_id FROM quiz_teacher WHERE teacher_email = %s",
-            [request.user.email]
-        )
-        teacher_result = cursor.fetchone()
-        
-        if not teacher_result or teacher_result[0] != quiz_data['teacher_id']:
+        if get_teacher_id(request) != quiz_data.teacher_id:
             messages.error(request, 'You can only add questions to your own quizzes.')
             return redirect('teacher_dashboard')
         
@@ -111,11 +150,14 @@ def add_question(request, quiz_id):
                 # correct_answers also needs to be JSON format for JSONB field
                 correct_answers_json = json.dumps({"answer": correct_answers})
                 
-                cursor.execute(
-                    """INSERT INTO quiz_quizquestion (question, question_type, choices, correct_answers, score, quiz_id) 
-                       VALUES (%s, %s, %s, %s, %s, %s)""",
-                    [question, question_type, choices_json, correct_answers_json, float(score), quiz_id]
-                )
+                with transaction.atomic():
+                    cursor.execute(
+                        """INSERT INTO quiz_quizquestion (question, question_type, choices, correct_answers, score, quiz_id) 
+                           VALUES (%s, %s, %s, %s, %s, %s)""",
+                        [question, question_type, choices_json, correct_answers_json, float(score), quiz_id]
+                    )
+                    question_version = bump_question_version(quiz_id)
+                invalidate_question_block(quiz_id, question_version - 1)
                 
                 messages.success(request, 'Question added successfully!')
                 return redirect('teacher_dashboard')
@@ -124,6 +166,131 @@ def add_question(request, quiz_id):
         
         return render(request, 'quiz/add_question.html', {'quiz_id': quiz_id, 'quiz': quiz_data})
 
+@login_required
+def import_questions(request, quiz_id):
+    """Bulk-add questions to a quiz from an uploaded CSV/JSON file"""
+    # Verify the quiz exists and belongs to the current teacher
+    quiz_data = get_teacher_quiz(quiz_id, get_teacher_id(request))
+    
+    if not quiz_data:
+        messages.error(request, 'You can only add questions to your own quizzes.')
+        return redirect('teacher_dashboard')
+    
+    errors = []
+    
+    if request.method == 'POST':
+        upload = request.FILES.get('questions_file')
+        
+        if not upload:
+            messages.error(request, 'Please choose a file to upload.')
+        else:
+            try:
+                questions, errors = parse_question_file(upload)
+                
+                if questions:
+                    with transaction.atomic():
+                        imported = insert_questions(quiz_id, questions)
+                        question_version = bump_question_version(quiz_id)
+                    invalidate_question_block(quiz_id, question_version - 1)
+                    messages.success(request, f'Imported {imported} question(s).')
+                
+                if errors:
+                    messages.warning(request, f'{len(errors)} row(s) were skipped. See the details below.')
+                elif not questions:
+                    messages.warning(request, 'The file did not contain any questions.')
+            except QuestionImportError as e:
+                messages.error(request, str(e))
+            except Exception as e:
+                messages.error(request, f'Error importing questions: {str(e)}')
+    
+    return render(request, 'quiz/import_questions.html', {
+        'quiz_id': quiz_id,
+        'quiz': quiz_data,
+        'errors': errors,
+    })
+
+@login_required
+def edit_answer_key(request, quiz_id):
+    """Let a teacher correct answers and re-grade every stored submission"""
+    # Verify the quiz exists and belongs to the current teacher
+    quiz_data = get_teacher_quiz(quiz_id, get_teacher_id(request))
+    
+    if not quiz_data:
+        messages.error(request, 'You can only edit answer keys of your own quizzes.')
+        return redirect('teacher_dashboard')
+    
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT question_id, question, question_type, choices, correct_answers FROM quiz_quizquestion WHERE quiz_id = %s ORDER BY question_id",
+            [quiz_id]
+        )
+        questions = []
+        for q in cursor.fetchall():
+            options = json.loads(q[3]).get('options', []) if q[3] else []
+            questions.append({
+                'question_id': q[0],
+                'question': q[1],
+                'question_type': q[2],
+                'options': list(zip(CHOICE_LETTERS, options)) if q[2] == 'multiple_choice' else options,
+                'correct_answer': parse_correct_answer(q[4]),
+            })
+    
+    if request.method == 'POST':
+        changed_ids = []
+        changed_answers = []
+        for question in questions:
+            answer = request.POST.get(f'answer_{question["question_id"]}', '').strip()
+            if question['question_type'] == 'multiple_choice':
+                valid = answer in CHOICE_LETTERS[:len(question['options'])]
+            elif question['question_type'] == 'true_false':
+                valid = answer in ('True', 'False')
+            else:
+                valid = bool(answer)
+            
+            if not valid:
+                messages.error(request, f'Invalid answer for "{question["question"]}".')
+                return redirect('edit_answer_key', quiz_id=quiz_id)
+            if answer != question['correct_answer']:
+                changed_ids.append(question['question_id'])
+                changed_answers.append(json.dumps({"answer": answer}))
+        
+        if not changed_ids:
+            messages.info(request, 'No answers were changed.')
+            return redirect('edit_answer_key', quiz_id=quiz_id)
+        
+        try:
+            # Fix the key and re-score stored submissions together, so results
+            # never disagree with the answer key they are shown against
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """UPDATE quiz_quizquestion q SET correct_answers = v.correct_answers
+                           FROM unnest(%s::integer[], %s::jsonb[]) AS v(question_id, correct_answers)
+                           WHERE q.question_id = v.question_id AND q.quiz_id = %s""",
+                        [changed_ids, changed_answers, quiz_id]
+                    )
+                question_version = bump_question_version(quiz_id)
+                regraded = regrade_quiz(quiz_id)
+            invalidate_question_block(quiz_id, question_version - 1)
+        except Exception as e:
+            messages.error(request, f'Error updating answer key: {str(e)}')
+            return redirect('edit_answer_key', quiz_id=quiz_id)
+        
+        messages.success(
+            request,
+            f'Updated {len(changed_ids)} answer(s). Re-graded {regraded["regraded"]} submission(s); '
+            f'{regraded["changed"]} result(s) updated.'
+        )
+        if regraded['skipped']:
+            messages.warning(request, f'{regraded["skipped"]} older submission(s) have no stored answers and kept their score.')
+        return redirect('view_quiz_results', quiz_id=quiz_id)
+    
+    return render(request, 'quiz/edit_answer_key.html', {
+        'quiz_id': quiz_id,
+        'quiz': quiz_data,
+        'questions': questions,
+    })
+
 @login_required
 def join_quiz(request):
     # Check if code is provided in URL parameters (for direct links)
@@ -140,12 +307,8 @@ def join_quiz(request):
     
     with connection.cursor() as cursor:
         try:
-            # Find quiz by code using raw SQL
-            cursor.execute(
-                "SELECT quiz_id, quiz_name FROM quiz_quiz WHERE quiz_code = %s",
-                [code]
-            )
-            quiz_result = cursor.fetchone()
+            # Find quiz by code; known and unknown codes are both cached
+            quiz_result = lookup_quiz_code(code)
             
             if not quiz_result:
                 messages.error(request, 'Invalid quiz code. Please check the code and try again.')
@@ -153,35 +316,28 @@ def join_quiz(request):
             
             quiz_id, quiz_name = quiz_result
             
-            # Get student record using raw SQL
-            cursor.execute(
-                "SELECT student_id FROM quiz_student WHERE student_email = %s",
-                [request.user.email]
-            )
-            student_result = cursor.fetchone()
+            # The window was cached by the code lookup; early arrivals wait
+            # without touching the database
+            window = quiz_window(quiz_id)
+            state = window_state(window)
+            if state == WAITING:
+                return waiting_response(window, f"{reverse('join_quiz')}?{urlencode({'code': code})}")
+            if state == CLOSED:
+                messages.error(request, f'"{quiz_name}" has closed.')
+                return render(request, 'quiz/join_quiz.html')
+            
+            # Student profile is resolved once per session
+            student_id = get_student_id(request)
             
-            if not student_result:
+            if not student_id:
                 messages.error(request, 'Student profile not found. Please contact admin.')
                 return redirect('student_dashboard')
             
-            student_id = student_result[0]
-            
-            # Check if student is already enrolled using raw SQL
-            cursor.execute(
-                "SELECT COUNT(*) FROM quiz_studentquiz WHERE student_id = %s AND quiz_id = %s",
-                [student_id, quiz_id]
-            )
-            enrollment_count = cursor.fetchone()[0]
-            
-            if enrollment_count > 0:
-                messages.warning(request, f'You are already enrolled in "{quiz_name}".')
-            else:
-                # Enroll student using raw SQL
-                cursor.execute(
-                    "INSERT INTO quiz_studentquiz (student_id, quiz_id) VALUES (%s, %s)",
-                    [student_id, quiz_id]
-                )
+            # Enroll student; the unique constraint turns a repeat join into a no-op
+            if add_student_to_quiz(student_id, quiz_id):
                 messages.success(request, f'Successfully joined "{quiz_name}"!')
+            else:
+                messages.warning(request, f'You are already enrolled in "{quiz_name}".')
                 
             return redirect('student_dashboard')
             
@@ -191,94 +347,142 @@ def join_quiz(request):
 
 @login_required
 def take_quiz(request, quiz_id):
-    with connection.cursor() as cursor:
-        try:
-            # Get quiz details using raw SQL
-            cursor.execute(
-                "SELECT quiz_id, quiz_name, subject, topic FROM quiz_quiz WHERE quiz_id = %s",
-                [quiz_id]
-            )
-            quiz_result = cursor.fetchone()
-            
-            if not quiz_result:
-                messages.error(request, 'Quiz not found.')
-                return redirect('student_dashboard')
-            
-            quiz_data = {
-                'quiz_id': quiz_result[0],
-                'quiz_name': quiz_result[1],
-                'subject': quiz_result[2],
-                'topic': quiz_result[3]
-            }
-            
-            # Get student record using raw SQL
-            cursor.execute(
-                "SELECT student_id FROM quiz_student WHERE student_email = %s",
-                [request.user.email]
-            )
-            student_result = cursor.fetchone()
-            
-            if not student_result:
-                messages.error(request, 'Student profile not found.')
-                return redirect('student_dashboard')
-            
-            student_id = student_result[0]
-            
-            # Verify student is enrolled using raw SQL
-            cursor.execute(
-                "SELECT COUNT(*) FROM quiz_studentquiz WHERE student_id = %s AND quiz_id = %s",
-                [student_id, quiz_id]
-            )
-            enrollment_count = cursor.fetchone()[0]
-            
-            if enrollment_count == 0:
-                messages.error(request, 'You are not enrolled in this quiz.')
-                return redirect('student_dashboard')
-            
-            # Check if student has already completed this quiz using raw SQL
-            cursor.execute(
-                "SELECT score FROM quiz_result WHERE student_id = %s AND quiz_id = %s",
-                [student_id, quiz_id]
-            )
-            existing_result = cursor.fetchone()
-            
-            if existing_result:
-                messages.warning(request, f'You have already completed "{quiz_data["quiz_name"]}". Your score: {existing_result[0]}')
-                return redirect('student_dashboard')
-            
-            # Get all questions for this quiz using raw SQL
-            cursor.execute(
-                "SELECT question_id, question, question_type, choices, correct_answers, score FROM quiz_quizquestion WHERE quiz_id = %s ORDER BY question_id",
-                [quiz_id]
-            )
-            questions_data = cursor.fetchall()
-            
-            if not questions_data:
-                messages.error(request, 'This quiz has no questions yet. Please contact your teacher.')
-                return redirect('student_dashboard')
-            
-            # Format questions for template
-            questions = []
-            import json
-            for q in questions_data:
-                question = {
-                    'question_id': q[0],
-                    'question': q[1],
-                    'question_type': q[2],
-                    'choices': json.loads(q[3]) if q[3] else {},
-                    'correct_answers': q[4],  # Keep as JSON for template (not needed in display)
-                    'score': q[5]
-                }
-                questions.append(question)
-            
-            return render(request, 'quiz/take_quiz.html', {
-                'quiz': quiz_data,
-                'questions': questions,
-            })
-            
-        except Exception as e:
-            messages.error(request, f'Error loading quiz: {str(e)}')
+    try:
+        # Student profile is resolved once per session
+        student_id = get_student_id(request)
+        
+        if not student_id:
+            messages.error(request, 'Student profile not found.')
+            return redirect('student_dashboard')
+        
+        # Before opening this is answered from the cached window alone
+        window = quiz_window(quiz_id)
+        state = window_state(window)
+        if state == WAITING:
+            return waiting_response(window, request.path)
+        if state == CLOSED:
+            messages.error(request, f'"{window.quiz_name}" has closed.')
+            return redirect('student_dashboard')
+        
+        # Quiz details plus this student's enrollment and completion in one query
+        attempt = get_attempt(student_id, quiz_id)
+        
+        if not attempt:
+            messages.error(request, 'Quiz not found.')
+            return redirect('student_dashboard')
+        
+        if not attempt.is_enrolled:
+            messages.error(request, 'You are not enrolled in this quiz.')
+            return redirect('student_dashboard')
+        
+        if attempt.existing_score is not None:
+            messages.warning(request, f'You have already completed "{attempt.quiz_name}". Your score: {attempt.existing_score}')
             return redirect('student_dashboard')
+        
+        if attempt.is_grading:
+            messages.info(request, f'Your submission for "{attempt.quiz_name}" is being graded.')
+            return redirect('student_dashboard')
+        
+        # Long quizzes are delivered a page at a time through quiz_questions;
+        # the first page is embedded to save a round trip
+        first_page = get_question_page(quiz_id, attempt.question_version, 1)
+        
+        if not first_page['count']:
+            messages.error(request, 'This quiz has no questions yet. Please contact your teacher.')
+            return redirect('student_dashboard')
+        
+        if first_page['count'] > PAGED_QUESTION_THRESHOLD:
+            return render(request, 'quiz/take_quiz_paged.html', {
+                'quiz': attempt,
+                'first_page': _page_with_answers(student_id, quiz_id, first_page),
+            })
+        
+        # The rendered question list is identical for every student, so it is
+        # cached per question version instead of re-queried and re-rendered
+        question_count, questions_html = get_question_block(quiz_id, attempt.question_version)
+        
+        return render(request, 'quiz/take_quiz.html', {
+            'quiz': attempt,
+            'questions_html': mark_safe(questions_html),
+            # Restores autosaved answers into the shared question block
+            'saved_answers': held_answers(student_id, quiz_id),
+        })
+        
+    except Exception as e:
+        messages.error(request, f'Error loading quiz: {str(e)}')
+        return redirect('student_dashboard')
+
+def _page_with_answers(student_id, quiz_id, page):
+    return page_with_saved_answers(page, held_answers(student_id, quiz_id))
+
+def page_with_saved_answers(page, saved):
+    # The shared cached page plus this student's saved answers for its questions
+    return {
+        **page,
+        'answers': {q['question_id']: saved[q['question_id']] for q in page['questions'] if q['question_id'] in saved},
+        'answered': len(saved),
+    }
+
+def _attempt_state(student_id, quiz_id):
+    """(question_version, error_response) for a student working on a quiz over JSON"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT q.question_version,
+                      EXISTS (SELECT 1 FROM quiz_studentquiz sq WHERE sq.student_id = %s AND sq.quiz_id = q.quiz_id),
+                      EXISTS (SELECT 1 FROM quiz_result r WHERE r.student_id = %s AND r.quiz_id = q.quiz_id)
+                      OR EXISTS (SELECT 1 FROM quiz_pendingsubmission p WHERE p.student_id = %s AND p.quiz_id = q.quiz_id AND NOT p.failed)
+               FROM quiz_quiz q WHERE q.quiz_id = %s""",
+            [student_id, student_id, student_id, quiz_id]
+        )
+        quiz_result = cursor.fetchone()
+    
+    if not quiz_result:
+        return None, JsonResponse({'error': 'Quiz not found.'}, status=404)
+    question_version, is_enrolled, is_submitted = quiz_result
+    if not is_enrolled:
+        return None, JsonResponse({'error': 'You are not enrolled in this quiz.'}, status=403)
+    if is_submitted:
+        return None, JsonResponse({'error': 'You have already submitted this quiz.'}, status=409)
+    return question_version, None
+
+@login_required
+def quiz_questions(request, quiz_id):
+    """JSON endpoint for paged delivery: one page of questions with the student's saved answers"""
+    student_id = get_student_id(request)
+    if not student_id:
+        return JsonResponse({'error': 'Student profile not found.'}, status=403)
+    
+    if window_state(quiz_window(quiz_id)) != OPEN:
+        return JsonResponse({'error': 'This quiz is not open.'}, status=403)
+    
+    question_version, error = _attempt_state(student_id, quiz_id)
+    if error:
+        return error
+    
+    page = max(_int_param(request, 'page') or 1, 1)
+    return JsonResponse(_page_with_answers(student_id, quiz_id, get_question_page(quiz_id, question_version, page)))
+
+@login_required
+def autosave_answers(request, quiz_id):
+    """Accept a delta of question_<id> answers and merge it into the student's draft"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required.'}, status=405)
+    
+    student_id = get_student_id(request)
+    if not student_id:
+        return JsonResponse({'error': 'Student profile not found.'}, status=403)
+    
+    # Same window as submit_quiz, so answers typed up to the deadline are kept
+    if window_state(quiz_window(quiz_id), QUIZ_CLOSE_GRACE) != OPEN:
+        return JsonResponse({'error': 'This quiz is not open.'}, status=403)
+    
+    _, error = _attempt_state(student_id, quiz_id)
+    if error:
+        return error
+    
+    delta = form_answers(request.POST)
+    answered = hold_answers(student_id, quiz_id, delta)
+    return JsonResponse({'saved': len(delta), 'answered': answered})
 
 @login_required
 def submit_quiz(request, quiz_id):
@@ -287,87 +491,59 @@ def submit_quiz(request, quiz_id):
     
     with connection.cursor() as cursor:
         try:
-            # Get student record using raw SQL
-            cursor.execute(
-                "SELECT student_id FROM quiz_student WHERE student_email = %s",
-                [request.user.email]
-            )
-            student_result = cursor.fetchone()
+            # Student profile is resolved once per session
+            student_id = get_student_id(request)
             
-            if not student_result:
+            if not student_id:
                 messages.error(request, 'Student profile not found.')
                 return redirect('student_dashboard')
             
-            student_id = student_result[0]
-            
-            # Check if already submitted using raw SQL
-            cursor.execute(
-                "SELECT COUNT(*) FROM quiz_result WHERE student_id = %s AND quiz_id = %s",
-                [student_id, quiz_id]
-            )
-            existing_count = cursor.fetchone()[0]
+            # Late submissions are accepted for QUIZ_CLOSE_GRACE seconds
+            state = window_state(quiz_window(quiz_id), QUIZ_CLOSE_GRACE)
+            if state != OPEN:
+                messages.error(request, 'This quiz has not opened yet.' if state == WAITING else 'This quiz has closed.')
+                return redirect('student_dashboard')
             
-            if existing_count > 0:
-                messages.warning(request, 'You have already submitted this quiz.')
+            # The autosaved draft (and answers from earlier pages), overridden
+            # by whatever this final form posts
+            answers = submission_answers(student_id, quiz_id)
+            answers.update(form_answers(request.POST))
+            
+            # Under load, queue the raw answers and acknowledge straight away;
+            # the grade_submissions worker grades them in batches
+            if ASYNC_GRADING:
+                queued = enqueue_submission(student_id, quiz_id, answers)
+                release_answers(student_id, quiz_id)
+                if not queued:
+                    messages.warning(request, 'You have already submitted this quiz.')
+                    return redirect('student_dashboard')
+                messages.success(request, 'Quiz submitted successfully! Your score will appear on your dashboard once it has been graded.')
                 return redirect('student_dashboard')
             
-            # Get all questions and calculate score using raw SQL
+            # Grade against the compiled answer key for the current question version
             cursor.execute(
-                "SELECT question_id, question_type, correct_answers, score FROM quiz_quizquestion WHERE quiz_id = %s",
+                "SELECT question_version FROM quiz_quiz WHERE quiz_id = %s",
                 [quiz_id]
             )
-            questions_data = cursor.fetchall()
+            quiz_result = cursor.fetchone()
             
-            total_score = 0
-            max_score = 0
+            if not quiz_result:
+                messages.error(request, 'Quiz not found.')
+                return redirect('student_dashboard')
             
-            import json
-            for question in questions_data:
-                question_id, question_type, correct_answer_json, score = question
-                max_score += score
-                student_answer = request.POST.get(f'question_{question_id}', '').strip()
-                
-                # Parse correct answer from JSON
-                try:
-                    correct_answer_data = json.loads(correct_answer_json)
-                    correct_answer = correct_answer_data.get('answer', '').strip()
-                except:
-                    correct_answer = str(correct_answer_json).strip()
-                
-                # Check if answer is correct (case-insensitive for text answers)
-                if question_type == 'short_answer':
-                    if student_answer.lower() == correct_answer.lower():
-                        total_score += score
-                else:
-                    if student_answer == correct_answer:
-                        total_score += score
+            # Save the result and update quiz statistics in one statement;
+            # a duplicate submission is rejected by the unique constraint, and
+            # one racing a change to the questions is graded again
+            answer_key, total_score, recorded = grade_and_record(student_id, quiz_id, quiz_result[0], answers)
+            max_score = answer_key.max_score
             
             # Calculate percentage
             percentage = (total_score / max_score * 100) if max_score > 0 else 0
             
-            # Get current quiz statistics using raw SQL
-            cursor.execute(
-                "SELECT score FROM quiz_result WHERE quiz_id = %s",
-                [quiz_id]
-            )
-            existing_scores = [row[0] for row in cursor.fetchall()]
-            
-            # Calculate new statistics
-            all_scores = existing_scores + [total_score]
-            top_score = max(all_scores)
-            score_avg = sum(all_scores) / len(all_scores)
-            
-            # Update quiz statistics using raw SQL
-            cursor.execute(
-                "UPDATE quiz_quiz SET top_score = %s, score_avg = %s WHERE quiz_id = %s",
-                [top_score, score_avg, quiz_id]
-            )
-            
-            # Save student result using raw SQL (let database auto-generate result_id)
-            cursor.execute(
-                "INSERT INTO quiz_result (score, top_score, score_avg, student_id, quiz_id) VALUES (%s, %s, %s, %s, %s)",
-                [total_score, top_score, score_avg, student_id, quiz_id]
-            )
+            release_answers(student_id, quiz_id)
+            if recorded is None:
+                messages.warning(request, 'You have already submitted this quiz.')
+                return redirect('student_dashboard')
             
             messages.success(request, f'Quiz submitted successfully! Your score: {total_score}/{max_score} ({percentage:.1f}%)')
             return redirect('student_dashboard')
@@ -379,221 +555,244 @@ def submit_quiz(request, quiz_id):
 @login_required
 def student_quiz_result(request, quiz_id):
     """View for students to see their individual quiz result"""
+    student_id = get_student_id(request)
+    found = find_result(student_id, quiz_id) if student_id else None
+    if not found:
+        return _missing_result(request, student_id, quiz_id)
+    result_id, question_version = found
+    
+    # A result only changes with question_version (re-grading bumps it), so
+    # a refresh revalidates against the ETag and skips building the page.
+    # Pages that carried a one-off message are neither validated nor tagged,
+    # or the browser would keep showing the message from its cached copy.
+    etag = result_etag(result_id, question_version)
+    has_messages = len(messages.get_messages(request)) > 0
+    if not has_messages:
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            patch_cache_control(not_modified, private=True, no_cache=True)
+            return not_modified
+    
+    try:
+        payload = get_result_payload(quiz_id, question_version, result_id)
+    except Exception as e:
+        messages.error(request, f'Error loading results: {str(e)}')
+        return redirect('student_dashboard')
+    
+    response = render(request, 'quiz/student_result.html', payload)
+    if not has_messages:
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def _missing_result(request, student_id, quiz_id):
+    """Explain why the student has no result to show"""
+    if not student_id:
+        messages.error(request, 'Student profile not found.')
+        return redirect('student_dashboard')
+    
     with connection.cursor() as cursor:
-        try:
-            # Get quiz details using raw SQL
-            cursor.execute(
-                "SELECT quiz_id, quiz_name, subject, topic FROM quiz_quiz WHERE quiz_id = %s",
-                [quiz_id]
-            )
-            quiz_result = cursor.fetchone()
-            
-            if not quiz_result:
-                messages.error(request, 'Quiz not found.')
-                return redirect('student_dashboard')
-            
-            quiz_data = {
-                'quiz_id': quiz_result[0],
-                'quiz_name': quiz_result[1],
-                'subject': quiz_result[2],
-                'topic': quiz_result[3]
-            }
-            
-            # Get student record using raw SQL
-            cursor.execute(
-                "SELECT student_id FROM quiz_student WHERE student_email = %s",
-                [request.user.email]
-            )
-            student_result = cursor.fetchone()
-            
-            if not student_result:
-                messages.error(request, 'Student profile not found.')
-                return redirect('student_dashboard')
-            
-            student_id = student_result[0]
-            
-            # Check if student is enrolled using raw SQL
-            cursor.execute(
-                "SELECT COUNT(*) FROM quiz_studentquiz WHERE student_id = %s AND quiz_id = %s",
-                [student_id, quiz_id]
-            )
-            enrollment_count = cursor.fetchone()[0]
-            
-            if enrollment_count == 0:
-                messages.error(request, 'You are not enrolled in this quiz.')
-                return redirect('student_dashboard')
-            
-            # Get the student's result using raw SQL
-            cursor.execute(
-                "SELECT result_id, score, top_score, score_avg FROM quiz_result WHERE student_id = %s AND quiz_id = %s",
-                [student_id, quiz_id]
-            )
-            result_data = cursor.fetchone()
-            
-            if not result_data:
-                messages.error(request, 'You have not completed this quiz yet.')
-                return redirect('student_dashboard')
-            
-            result = {
-                'result_id': result_data[0],
-                'score': result_data[1],
-                'top_score': result_data[2],
-                'score_avg': result_data[3]
-            }
-            
-            # Get all questions to show detailed results using raw SQL
-            cursor.execute(
-                "SELECT question_id, question, question_type, choices, correct_answers, score FROM quiz_quizquestion WHERE quiz_id = %s ORDER BY question_id",
-                [quiz_id]
-            )
-            questions_data = cursor.fetchall()
-            
-            questions = []
-            total_possible_score = 0
-            import json
-            
-            for q in questions_data:
-                # Parse correct answer from JSON for display
-                try:
-                    correct_answer_data = json.loads(q[4]) if q[4] else {}
-                    correct_answer_display = correct_answer_data.get('answer', 'N/A')
-                except:
-                    correct_answer_display = str(q[4]) if q[4] else 'N/A'
-                
-                question = {
-                    'question_id': q[0],
-                    'question': q[1],
-                    'question_type': q[2],
-                    'choices': json.loads(q[3]) if q[3] else {},
-                    'score': q[5],
-                    'correct_answers': correct_answer_display  # Parsed for display
-                }
-                questions.append(question)
-                total_possible_score += q[5]
-            
-            percentage = (result['score'] / total_possible_score * 100) if total_possible_score > 0 else 0
-            
-            return render(request, 'quiz/student_result.html', {
-                'quiz': quiz_data,
-                'result': result,
-                'questions': questions,
-                'total_possible_score': total_possible_score,
-                'percentage': percentage,
-            })
-            
-        except Exception as e:
-            messages.error(request, f'Error loading results: {str(e)}')
-            return redirect('student_dashboard')
+        cursor.execute(
+            """SELECT EXISTS (SELECT 1 FROM quiz_studentquiz sq WHERE sq.student_id = %s AND sq.quiz_id = q.quiz_id)
+               FROM quiz_quiz q WHERE q.quiz_id = %s""",
+            [student_id, quiz_id]
+        )
+        row = cursor.fetchone()
+    
+    if not row:
+        messages.error(request, 'Quiz not found.')
+    elif not row[0]:
+        messages.error(request, 'You are not enrolled in this quiz.')
+    else:
+        messages.error(request, 'You have not completed this quiz yet.')
+    return redirect('student_dashboard')
+
+@login_required
+async def quiz_results_stream(request, quiz_id):
+    """Server-sent events with a quiz's new results and aggregates, for its teacher's results page"""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would hold a thread per open stream; the page falls back to refreshing
+        return JsonResponse({'error': 'Live results need the ASGI server.'}, status=503)
+    
+    last_result_id = await sync_to_async(_stream_start)(request, quiz_id)
+    if last_result_id is None:
+        return JsonResponse({'error': 'You can only view results for your own quizzes.'}, status=403)
+    
+    response = StreamingHttpResponse(result_events(quiz_id, last_result_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def _stream_start(request, quiz_id):
+    """Newest result_id of the teacher's quiz (0 if none yet), or None if it is not theirs"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT COALESCE((SELECT MAX(result_id) FROM quiz_result WHERE quiz_id = q.quiz_id), 0)
+               FROM quiz_quiz q WHERE q.quiz_id = %s AND q.teacher_id = %s""",
+            [quiz_id, get_teacher_id(request)]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def _float_param(request, name):
+    # nan/inf parse as floats but are not scores to filter by
+    try:
+        value = float(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+def _int_param(request, name):
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
+def _results_filters(request, quiz_id):
+    """Build the WHERE clause for a quiz's results (aliased r, joined to students as s)
+    from the class/min_score/max_score query parameters"""
+    student_class = request.GET.get('class', '').strip()
+    min_score = _float_param(request, 'min_score')
+    max_score = _float_param(request, 'max_score')
+    
+    filters = ["r.quiz_id = %s"]
+    params = [quiz_id]
+    filter_query = {'class': student_class}
+    if student_class:
+        filters.append("s.student_class = %s")
+        params.append(student_class)
+    if min_score is not None:
+        filters.append("r.score >= %s")
+        params.append(min_score)
+        filter_query['min_score'] = min_score
+    if max_score is not None:
+        filters.append("r.score <= %s")
+        params.append(max_score)
+        filter_query['max_score'] = max_score
+    return " AND ".join(filters), params, filter_query
 
 @login_required
 def view_quiz_results(request, quiz_id):
     """View for teachers to see all student results for their quiz"""
     with connection.cursor() as cursor:
         try:
-            # Get quiz details and verify ownership using raw SQL
-            cursor.execute(
-                "SELECT q.quiz_id, q.quiz_name, q.subject, q.topic, q.teacher_id FROM quiz_quiz q WHERE q.quiz_id = %s",
-                [quiz_id]
-            )
-            quiz_result = cursor.fetchone()
+            # Get quiz details and verify ownership
+            quiz_data = get_quiz(quiz_id)
             
-            if not quiz_result:
+            if not quiz_data:
                 messages.error(request, 'Quiz not found.')
                 return redirect('teacher_dashboard')
             
-            quiz_data = {
-                'quiz_id': quiz_result[0],
-                'quiz_name': quiz_result[1],
-                'subject': quiz_result[2],
-                'topic': quiz_result[3],
-                'teacher_id': quiz_result[4]
-            }
-            
-            # Get teacher record using raw SQL
-            cursor.execute(
-                "SELECT teacher_id FROM quiz_teacher WHERE teacher_email = %s",
-                [request.user.email]
-            )
-            teacher_result = cursor.fetchone()
-            
-            if not teacher_result or teacher_result[0] != quiz_data['teacher_id']:
+            # Verify the current teacher owns this quiz
+            if get_teacher_id(request) != quiz_data.teacher_id:
                 messages.error(request, 'You can only view results for your own quizzes.')
                 return redirect('teacher_dashboard')
             
-            # Get quiz statistics using raw SQL
+            # Question totals in one aggregate
             cursor.execute(
-                "SELECT SUM(score) FROM quiz_quizquestion WHERE quiz_id = %s",
+                "SELECT COALESCE(SUM(score), 0), COUNT(*) FROM quiz_quizquestion WHERE quiz_id = %s",
                 [quiz_id]
             )
-            total_possible_score = cursor.fetchone()[0] or 0
+            total_possible_score, total_questions = cursor.fetchone()
             
-            cursor.execute(
-                "SELECT COUNT(*) FROM quiz_quizquestion WHERE quiz_id = %s",
-                [quiz_id]
-            )
-            total_questions = cursor.fetchone()[0]
+            # Optional filters shared by the summary and the page query
+            where, params, filter_query = _results_filters(request, quiz_id)
             
-            # Get all results for this quiz using raw SQL with JOIN
+            # Summary statistics for the filtered results in one aggregate
             cursor.execute(
-                """SELECT r.result_id, r.score, r.top_score, r.score_avg, 
-                         s.student_name, s.student_email, s.roll_no 
-                   FROM quiz_result r 
-                   JOIN quiz_student s ON r.student_id = s.student_id 
-                   WHERE r.quiz_id = %s 
-                   ORDER BY r.score DESC""",
-                [quiz_id]
+                f"""SELECT COUNT(*), MAX(r.score), MIN(r.score), AVG(r.score) 
+                    FROM quiz_result r 
+                    JOIN quiz_student s ON r.student_id = s.student_id 
+                    WHERE {where}""",
+                params
             )
-            results_data = cursor.fetchall()
-            
-            # Format results for template
-            results = []
-            scores = []
-            
-            for r in results_data:
-                percentage = (r[1] / total_possible_score * 100) if total_possible_score > 0 else 0
-                result = {
-                    'result_id': r[0],
-                    'score': r[1],
-                    'top_score': r[2],
-                    'score_avg': r[3],
-                    'percentage': percentage,
-                    'student': {
-                        'student_name': r[4],
-                        'student_email': r[5],
-                        'roll_no': r[6]
-                    }
-                }
-                results.append(result)
-                scores.append(r[1])
-            
-            # Calculate statistics
-            if scores:
-                stats = {
-                    'total_students': len(scores),
-                    'highest_score': max(scores),
-                    'lowest_score': min(scores),
-                    'average_score': sum(scores) / len(scores),
-                    'total_possible': total_possible_score,
-                    'average_percentage': (sum(scores) / len(scores) / total_possible_score * 100) if total_possible_score > 0 else 0,
-                }
-            else:
-                stats = {
-                    'total_students': 0,
-                    'highest_score': 0,
-                    'lowest_score': 0,
-                    'average_score': 0,
-                    'total_possible': total_possible_score,
-                    'average_percentage': 0,
-                }
+            total_students, highest_score, lowest_score, average_score = cursor.fetchone()
+            
+            stats = {
+                'total_students': total_students,
+                'highest_score': highest_score or 0,
+                'lowest_score': lowest_score or 0,
+                'average_score': average_score or 0,
+                'total_possible': total_possible_score,
+                'average_percentage': ((average_score or 0) / total_possible_score * 100) if total_possible_score > 0 else 0,
+            }
+            
+            # Keyset pagination: continue after the last (score, result_id) of the previous page
+            after_score = _float_param(request, 'after_score')
+            after_id = _int_param(request, 'after_id')
+            rank_offset = _int_param(request, 'start') or 0
+            
+            page_filters = where
+            page_params = list(params)
+            if after_score is not None and after_id is not None:
+                page_filters += " AND (r.score < %s OR (r.score = %s AND r.result_id > %s))"
+                page_params += [after_score, after_score, after_id]
+            
+            # Ranked and with percentages from the query itself
+            results = results_page(page_filters, page_params, total_possible_score, rank_offset, RESULTS_PAGE_SIZE + 1)
+            
+            has_next = len(results) > RESULTS_PAGE_SIZE
+            results = results[:RESULTS_PAGE_SIZE]
+            
+            # Query string for the next page
+            next_query = None
+            if has_next:
+                next_query = urlencode({
+                    **filter_query,
+                    'after_score': results[-1].score,
+                    'after_id': results[-1].result_id,
+                    'start': rank_offset + len(results),
+                })
+            
+            # Item analysis runs over every stored response, so only on request
+            show_analysis = request.GET.get('analysis') == '1'
             
             return render(request, 'quiz/teacher_results.html', {
                 'quiz': quiz_data,
                 'results': results,
                 'stats': stats,
                 'total_questions': total_questions,
+                'filters': filter_query,
+                'filter_query': urlencode(filter_query),
+                'is_first_page': after_id is None,
+                'next_query': next_query,
+                # Live updates describe the whole class, so only unfiltered pages apply them
+                'live': {'apply_stats': not any(filter_query.values()), 'lowest_score': lowest_score},
+                'analysis': quiz_item_analysis(quiz_id) if show_analysis else None,
             })
             
         except Exception as e:
             messages.error(request, f'Error loading results: {str(e)}')
             return redirect('teacher_dashboard')
 
+
+@login_required
+def export_quiz_results(request, quiz_id):
+    """Stream a quiz's results as CSV, honouring the same filters as the results page"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT q.quiz_name, COALESCE(SUM(qq.score), 0), 
+                      array_remove(array_agg(qq.question_id ORDER BY qq.question_id), NULL) 
+               FROM quiz_quiz q 
+               LEFT JOIN quiz_quizquestion qq ON qq.quiz_id = q.quiz_id 
+               WHERE q.quiz_id = %s AND q.teacher_id = %s 
+               GROUP BY q.quiz_name""",
+            [quiz_id, get_teacher_id(request)]
+        )
+        quiz_result = cursor.fetchone()
+    
+    if not quiz_result:
+        messages.error(request, 'You can only export results for your own quizzes.')
+        return redirect('teacher_dashboard')
+    
+    quiz_name, total_possible_score, question_ids = quiz_result
+    where, params, _ = _results_filters(request, quiz_id)
+    
+    response = StreamingHttpResponse(
+        stream_results_csv(where, params, total_possible_score, question_ids),
+        content_type='text/csv',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{slugify(quiz_name) or "quiz"}_results.csv"'
+    return response
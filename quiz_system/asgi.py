@@ -2,6 +2,7 @@
 ASGI config for quiz_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve the project through it to enable teachers' live results streams.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -0,0 +1,197 @@
+# quiz_system/async_db.py
+# Non-blocking PostgreSQL access for the async views.
+#
+# Uses psycopg2's asynchronous connection mode (the driver the project
+# already depends on) driven by the event loop's reader/writer callbacks,
+# with a small pool of connections per server process. Statements run in
+# autocommit, so only single self-contained statements belong here; the
+# hot statements of the student views already are. Anything needing a
+# transaction, or Django's ORM, stays on django.db.connection. Statement
+# objects (quiz_system.db.statements) run prepared, as they do on the
+# sync pool.
+import asyncio
+import threading
+import time
+from collections import deque
+import psycopg2
+from psycopg2 import extensions
+from django.conf import settings
+from django.db import connection
+from .db.pool import PooledConnection
+from .db.rows import fetch_record, fetch_records
+from .db.statements import Statement, run
+from .metrics import async_queries
+
+ASYNC_DB_POOL_SIZE = getattr(settings, 'QUIZ_ASYNC_DB_POOL_SIZE', 10)
+
+
+async def _ready(loop, add, remove, fd):
+    done = loop.create_future()
+    add(fd, lambda: done.done() or done.set_result(None))
+    try:
+        await done
+    finally:
+        remove(fd)
+
+
+async def _wait(conn):
+    # Drive an asynchronous psycopg2 connection until its operation completes
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        if state == extensions.POLL_READ:
+            await _ready(loop, loop.add_reader, loop.remove_reader, conn.fileno())
+        elif state == extensions.POLL_WRITE:
+            await _ready(loop, loop.add_writer, loop.remove_writer, conn.fileno())
+        else:
+            raise psycopg2.OperationalError(f'Unexpected poll state {state}')
+
+
+class AsyncConnectionPool:
+    """At most size connections; callers beyond that wait for one to be released.
+
+    Bookkeeping is guarded by a thread lock rather than asyncio primitives so
+    one pool can serve event loops in several threads (async views run under
+    WSGI each get their own loop).
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.idle = deque()
+        self.waiters = deque()
+        self.opened = 0
+
+    async def open(self):
+        conn = psycopg2.connect(**connection.get_connection_params(), connection_factory=PooledConnection, async_=True)
+        try:
+            await _wait(conn)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    async def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+            if self.opened < self.size:
+                self.opened += 1
+                waiter = None
+            else:
+                waiter = asyncio.get_running_loop().create_future()
+                self.waiters.append((asyncio.get_running_loop(), waiter))
+
+        if waiter is None:
+            try:
+                return await self.open()
+            except BaseException:
+                self.discard(None)
+                raise
+
+        try:
+            conn = await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                if waiter.result() is None:
+                    self.discard(None)
+                else:
+                    self.release(waiter.result())
+            raise
+        # None means a slot was freed by a discarded connection: open a new one
+        if conn is None:
+            try:
+                return await self.open()
+            except BaseException:
+                self.discard(None)
+                raise
+        return conn
+
+    def _hand_over(self, conn):
+        # Give conn (or a free slot, as None) to the first live waiter; True if one took it
+        while self.waiters:
+            loop, waiter = self.waiters.popleft()
+            if not waiter.done():
+                loop.call_soon_threadsafe(_resolve, self, waiter, conn)
+                return True
+        return False
+
+    def release(self, conn):
+        with self.lock:
+            if not self._hand_over(conn):
+                self.idle.append(conn)
+
+    def discard(self, conn):
+        """Drop a broken or interrupted connection, freeing its slot"""
+        if conn is not None:
+            conn.close()
+        with self.lock:
+            if not self._hand_over(None):
+                self.opened -= 1
+
+    def close_idle(self):
+        """Close every idle connection (in-use ones are unaffected)"""
+        with self.lock:
+            idle = list(self.idle)
+            self.idle.clear()
+            self.opened -= len(idle)
+        for conn in idle:
+            conn.close()
+
+
+def _resolve(pool, waiter, conn):
+    if waiter.done():
+        # Cancelled while the hand-over was in flight
+        if conn is None:
+            pool.discard(None)
+        else:
+            pool.release(conn)
+    else:
+        waiter.set_result(conn)
+
+
+pool = AsyncConnectionPool(ASYNC_DB_POOL_SIZE)
+
+
+async def _run(sql, params, fetch):
+    conn = await pool.acquire()
+    started = time.perf_counter()
+    try:
+        cursor = conn.cursor()
+        if isinstance(sql, Statement):
+            run(cursor, sql, params)
+        else:
+            cursor.execute(sql, params)
+        await _wait(conn)
+        result = fetch(cursor)
+    except BaseException:
+        # The connection may be mid-statement (e.g. the client went away)
+        pool.discard(conn)
+        raise
+    else:
+        pool.release(conn)
+    finally:
+        queries = async_queries.get()
+        if queries is not None:
+            queries.append((getattr(sql, 'sql', sql), time.perf_counter() - started))
+    return result
+
+
+async def fetchone(sql, params=None, record_type=None):
+    """The first row, as a record_type if one is given (see db.rows)"""
+    if record_type is not None:
+        return await _run(sql, params, lambda cursor: fetch_record(cursor, record_type))
+    return await _run(sql, params, lambda cursor: cursor.fetchone())
+
+
+async def fetchall(sql, params=None, record_type=None):
+    if record_type is not None:
+        return await _run(sql, params, lambda cursor: fetch_records(cursor, record_type))
+    return await _run(sql, params, lambda cursor: cursor.fetchall())
+
+
+async def execute(sql, params=None):
+    """Run a statement; returns its row count"""
+    return await _run(sql, params, lambda cursor: cursor.rowcount)
@@ -0,0 +1,4 @@
+# quiz_system/db
+# Database backend for the project (ENGINE 'quiz_system.db'): Django's
+# PostgreSQL backend with connections kept in a process-wide pool, plus the
+# prepared statements the hot student paths run on them.
@@ -0,0 +1,59 @@
+# quiz_system/db/base.py
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.base.base import NO_DB_ALIAS
+from .creation import DatabaseCreation
+from .pool import ConnectionPool, PooledConnection
+
+DB_POOL_SIZE = getattr(settings, 'QUIZ_DB_POOL_SIZE', 20)
+DB_POOL_TIMEOUT = getattr(settings, 'QUIZ_DB_POOL_TIMEOUT', 10)
+DB_POOL_CHECK_AFTER = getattr(settings, 'QUIZ_DB_POOL_CHECK_AFTER', 30)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """The PostgreSQL backend with its connections kept in a ConnectionPool.
+
+    Django still opens a connection when a request first queries and closes
+    it when the request finishes (leave CONN_MAX_AGE at 0). Here those are a
+    checkout from the pool and a return to it, so connection setup leaves the
+    request path and connections stay valid whichever thread (or ASGI
+    request) picks them up next.
+    """
+
+    creation_class = DatabaseCreation
+    _quiz_connection_pools = {}
+
+    @property
+    def connection_pool(self):
+        if self.alias == NO_DB_ALIAS:
+            return None
+        # Keyed by NAME too, so switching to the test database gets fresh connections
+        key = (self.alias, self.settings_dict['NAME'])
+        if key not in self._quiz_connection_pools:
+            if self.settings_dict.get('CONN_MAX_AGE', 0) != 0:
+                raise ImproperlyConfigured("quiz_system.db pools connections itself; set CONN_MAX_AGE to 0.")
+            self._quiz_connection_pools.setdefault(key, ConnectionPool(DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_CHECK_AFTER))
+        return self._quiz_connection_pools[key]
+
+    def get_new_connection(self, conn_params):
+        pool = self.connection_pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connect = super().get_new_connection
+        return pool.getconn(lambda: connect({**conn_params, 'connection_factory': PooledConnection}))
+
+    def _close(self):
+        pool = self.connection_pool
+        if self.connection is None or pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
+        # Returned connections can no longer be used through this wrapper
+        self.connection = None
+
+    def close_if_health_check_failed(self):
+        if self.connection_pool is not None:
+            # The pool checks connections as it hands them out
+            return
+        return super().close_if_health_check_failed()
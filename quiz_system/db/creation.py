@@ -0,0 +1,13 @@
+# quiz_system/db/creation.py
+from django.db.backends.postgresql import creation
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections (sync and async) to the test database would block DROP DATABASE
+        from quiz_system import async_db
+        for pool in self.connection._quiz_connection_pools.values():
+            pool.close_idle()
+        async_db.pool.close_idle()
+        return super()._destroy_test_db(test_database_name, verbosity)
@@ -0,0 +1,129 @@
+# quiz_system/db/pool.py
+import os
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions
+
+
+class PooledConnection(extensions.connection):
+    """psycopg2 connection that remembers its prepared statements and when it was last used"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # None once the set can no longer be trusted (see statements.run)
+        self.prepared_statements = set()
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """At most size connections to one database, shared by every thread of the process.
+
+    Checkouts take the most recently returned connection, so under light load
+    a few warm connections do all the work. A connection that sat idle for
+    more than check_after seconds is tested with SELECT 1 before it is handed
+    out. Callers wait up to timeout seconds for a free connection.
+    """
+
+    def __init__(self, size, timeout, check_after):
+        self.size = size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.condition = threading.Condition()
+        self.idle = []
+        self.opened = 0
+        self.pid = os.getpid()
+
+    def getconn(self, connect):
+        """A healthy pooled connection, opened with connect() if none is idle"""
+        while True:
+            conn = self._take()
+            if conn is None:
+                try:
+                    return connect()
+                except BaseException:
+                    self._free_slot()
+                    raise
+            if self._usable(conn):
+                return conn
+            self.discard(conn)
+
+    def putconn(self, conn):
+        if conn.closed or conn.prepared_statements is None:
+            self.discard(conn)
+            return
+        if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            # Closed mid-transaction (e.g. an error inside atomic())
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+            if conn.closed or conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                self.discard(conn)
+                return
+        conn.last_used = time.monotonic()
+        with self.condition:
+            if self.pid != os.getpid():
+                return
+            self.idle.append(conn)
+            self.condition.notify()
+
+    def discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        self._free_slot()
+
+    def close_idle(self):
+        """Close every idle connection (in-use ones are unaffected)"""
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.opened -= len(idle)
+            self.condition.notify_all()
+        for conn in idle:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def _take(self):
+        # An idle connection, or None once a slot for a new one is reserved
+        deadline = time.monotonic() + self.timeout
+        with self.condition:
+            if self.pid != os.getpid():
+                # Forked: the parent's connections are not ours to use or close
+                self.pid = os.getpid()
+                self.idle = []
+                self.opened = 0
+            while True:
+                if self.idle:
+                    return self.idle.pop()
+                if self.opened < self.size:
+                    self.opened += 1
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise psycopg2.OperationalError(
+                        f'No database connection became free within {self.timeout}s; raise QUIZ_DB_POOL_SIZE ({self.size})'
+                    )
+                self.condition.wait(remaining)
+
+    def _free_slot(self):
+        with self.condition:
+            self.opened -= 1
+            self.condition.notify()
+
+    def _usable(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not conn.autocommit:
+                conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
@@ -0,0 +1,43 @@
+# quiz_system/db/rows.py
+# Turns result rows into small record objects, in place of views indexing
+# tuples into dicts field by field.
+#
+# Records are slotted dataclasses whose fields are named after the query's
+# columns. The mapper for a (record type, column list) pair is built once,
+# from cursor.description, and reused for every row after that, so the
+# per-row cost is one constructor call. Works on Django cursors, psycopg2
+# cursors and the async pool's cursors alike.
+from functools import lru_cache
+from dataclasses import fields
+from operator import itemgetter
+
+
+@lru_cache(maxsize=None)
+def record_mapper(record_type, columns):
+    """A function turning a row with the given column names into a record_type"""
+    names = tuple(field.name for field in fields(record_type))
+    if columns == names:
+        return lambda row: record_type(*row)
+    if set(names) - set(columns):
+        raise ValueError(f'{record_type.__name__} needs columns {sorted(set(names) - set(columns))}, query returned {list(columns)}')
+    if len(names) == 1:
+        index = columns.index(names[0])
+        return lambda row: record_type(row[index])
+    reorder = itemgetter(*(columns.index(name) for name in names))
+    return lambda row: record_type(*reorder(row))
+
+
+def _mapper(cursor, record_type):
+    return record_mapper(record_type, tuple(column[0] for column in cursor.description))
+
+
+def fetch_record(cursor, record_type):
+    """The next row as a record_type, or None"""
+    row = cursor.fetchone()
+    return None if row is None else _mapper(cursor, record_type)(row)
+
+
+def fetch_records(cursor, record_type):
+    """Every remaining row as a list of record_type"""
+    return list(map(_mapper(cursor, record_type), cursor.fetchall()))
+
@@ -0,0 +1,71 @@
+# quiz_system/db/statements.py
+# Server-side prepared statements for the queries every student request runs.
+#
+# A Statement is prepared lazily, the first time it runs on a pooled
+# connection, and executed by name from then on, so the server parses and
+# plans it once per connection instead of once per request. The PREPARE is
+# sent in the same round trip as the first EXECUTE. Connections that did not
+# come from the pool (another ENGINE, or QUIZ_PREPARED_STATEMENTS off for a
+# transaction-mode pgbouncer) run the plain SQL instead.
+import re
+from django.conf import settings
+
+PREPARED_STATEMENTS = getattr(settings, 'QUIZ_PREPARED_STATEMENTS', True)
+
+_NAMED = re.compile(r'%\((\w+)\)s')
+_POSITIONAL = re.compile(r'%s')
+
+
+class Statement:
+    """A hot SQL statement run as a prepared statement where the connection allows it.
+
+    sql uses the usual %s or %(name)s placeholders. types gives each
+    parameter's Postgres type, as a sequence for %s or a dict for %(name)s,
+    so the server does not have to infer them when preparing.
+    """
+
+    def __init__(self, name, sql, types):
+        self.name = name
+        self.sql = sql
+        if isinstance(types, dict):
+            numbers = {param: n for n, param in enumerate(types, start=1)}
+            if set(_NAMED.findall(sql)) != set(numbers):
+                raise ValueError(f'Statement {name}: types must name exactly the parameters of its SQL')
+            body = _NAMED.sub(lambda m: f'${numbers[m.group(1)]}', sql)
+            arguments = ', '.join(f'%({param})s' for param in types)
+            types = list(types.values())
+        else:
+            if len(_POSITIONAL.findall(sql)) != len(types):
+                raise ValueError(f'Statement {name}: types must give one type per parameter of its SQL')
+            numbers = iter(range(1, len(types) + 1))
+            body = _POSITIONAL.sub(lambda m: f'${next(numbers)}', sql)
+            arguments = ', '.join(['%s'] * len(types))
+        self.execute_sql = f'EXECUTE {name} ({arguments})'
+        self.prepare_sql = f"PREPARE {name} ({', '.join(types)}) AS {body}"
+
+    def __repr__(self):
+        return f'<Statement {self.name}>'
+
+
+def run(cursor, statement, params):
+    """Execute statement on a Django or psycopg2 cursor with exactly one cursor.execute() call.
+
+    Async psycopg2 connections only allow one statement in flight, hence the
+    single call; the caller fetches the results as usual.
+    """
+    conn = getattr(cursor, 'cursor', cursor).connection
+    prepared = getattr(conn, 'prepared_statements', None)
+    if not PREPARED_STATEMENTS or prepared is None:
+        cursor.execute(statement.sql, params)
+    elif statement.name in prepared:
+        cursor.execute(statement.execute_sql, params)
+    else:
+        try:
+            cursor.execute(f'{statement.prepare_sql}; {statement.execute_sql}', params)
+        except BaseException:
+            # The server keeps a PREPARE even when the EXECUTE after it fails,
+            # so which statements exist is now unknown: stop preparing on this
+            # connection, and the pool retires it when it comes back
+            conn.prepared_statements = None
+            raise
+        prepared.add(statement.name)
@@ -0,0 +1,273 @@
+# quiz_system/metrics.py
+import hashlib
+import re
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the queries-per-request histogram buckets
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+# Fingerprints beyond this many are lumped together so a stream of
+# one-off statements cannot grow the registry without bound
+MAX_FINGERPRINTS = getattr(settings, 'QUIZ_METRICS_MAX_FINGERPRINTS', 500)
+OTHER_FINGERPRINT = 'other'
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%(?:\(\w+\))?s')
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_REPEATED_TUPLE = re.compile(r'(\([^()]*\))(?:\s*,\s*\1)+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Normalize a statement so executions differing only in values group together.
+
+    Literals and placeholders become ?, IN lists and repeated VALUES rows
+    collapse, and whitespace is squeezed. Returns (fingerprint_id, text).
+    """
+    text = _STRING.sub('?', sql)
+    text = _PLACEHOLDER.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = _WHITESPACE.sub(' ', text).strip()
+    text = _PLACEHOLDER_LIST.sub('(?, ...)', text)
+    text = _REPEATED_TUPLE.sub(r'\1, ...', text)
+    return hashlib.sha1(text.encode()).hexdigest()[:12], text
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            yield bound, running
+
+
+class ViewStats:
+    def __init__(self):
+        self.responses = {}
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.query_counts = Histogram(QUERY_COUNT_BUCKETS)
+
+
+class FingerprintStats:
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.views = {}
+
+
+class MetricsRegistry:
+    """In-process metrics for this worker. Each server process keeps its own,
+    so scrape every worker (or run one) to see the whole picture."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.fingerprints = {}
+
+    def record(self, view, method, status, seconds, queries):
+        with self.lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats()
+            key = (method, status)
+            stats.responses[key] = stats.responses.get(key, 0) + 1
+            stats.latency.observe(seconds)
+            stats.query_counts.observe(len(queries))
+            stats.queries += len(queries)
+
+            for sql, query_seconds in queries:
+                fingerprint_id, text = fingerprint(sql)
+                entry = self.fingerprints.get(fingerprint_id)
+                if entry is None:
+                    if len(self.fingerprints) >= MAX_FINGERPRINTS:
+                        fingerprint_id, text = OTHER_FINGERPRINT, '(other statements)'
+                        entry = self.fingerprints.get(fingerprint_id)
+                    if entry is None:
+                        entry = self.fingerprints[fingerprint_id] = FingerprintStats(text)
+                entry.calls += 1
+                entry.seconds += query_seconds
+                entry.max_seconds = max(entry.max_seconds, query_seconds)
+                entry.views[view] = entry.views.get(view, 0) + 1
+                stats.sql_seconds += query_seconds
+
+    def top_fingerprints(self, n=20, sort='total'):
+        """The n fingerprints with the highest total, mean or max time, as dicts"""
+        with self.lock:
+            rows = [
+                {
+                    'fingerprint': fingerprint_id,
+                    'sql': entry.text,
+                    'calls': entry.calls,
+                    'total_ms': entry.seconds * 1000,
+                    'mean_ms': entry.seconds / entry.calls * 1000,
+                    'max_ms': entry.max_seconds * 1000,
+                    'views': sorted(entry.views, key=entry.views.get, reverse=True)[:5],
+                }
+                for fingerprint_id, entry in self.fingerprints.items()
+            ]
+        rows.sort(key=lambda row: row[f'{sort}_ms'], reverse=True)
+        return rows[:n]
+
+    def render_prometheus(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self.lock:
+            views = sorted(self.views.items())
+
+            family('quiz_http_requests_total', 'counter', 'Requests handled, by view, method and status.')
+            for view, stats in views:
+                for (method, status), count in sorted(stats.responses.items()):
+                    lines.append(f'quiz_http_requests_total{{view="{_label(view)}",method="{method}",status="{status}"}} {count}')
+
+            family('quiz_http_request_duration_seconds', 'histogram', 'Request latency by view.')
+            for view, stats in views:
+                _histogram_lines(lines, 'quiz_http_request_duration_seconds', view, stats.latency)
+
+            family('quiz_db_queries_per_request', 'histogram', 'SQL statements executed per request, by view.')
+            for view, stats in views:
+                _histogram_lines(lines, 'quiz_db_queries_per_request', view, stats.query_counts)
+
+            family('quiz_db_queries_total', 'counter', 'SQL statements executed, by view.')
+            for view, stats in views:
+                lines.append(f'quiz_db_queries_total{{view="{_label(view)}"}} {stats.queries}')
+
+            family('quiz_db_query_seconds_total', 'counter', 'Time spent executing SQL, by view.')
+            for view, stats in views:
+                lines.append(f'quiz_db_query_seconds_total{{view="{_label(view)}"}} {stats.sql_seconds:.6f}')
+
+            fingerprints = sorted(self.fingerprints.items())
+
+            family('quiz_db_fingerprint_calls_total', 'counter', 'Executions per normalized statement.')
+            for fingerprint_id, entry in fingerprints:
+                lines.append(f'quiz_db_fingerprint_calls_total{{fingerprint="{fingerprint_id}"}} {entry.calls}')
+
+            family('quiz_db_fingerprint_seconds_total', 'counter', 'Time spent per normalized statement.')
+            for fingerprint_id, entry in fingerprints:
+                lines.append(f'quiz_db_fingerprint_seconds_total{{fingerprint="{fingerprint_id}"}} {entry.seconds:.6f}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(lines, name, view, histogram):
+    view = _label(view)
+    for bound, count in histogram.cumulative():
+        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+    lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum:.6f}')
+    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+
+
+registry = MetricsRegistry()
+
+# (sql, seconds) list of the current async request; quiz_system.async_db
+# appends its statements here since they bypass Django's connection
+async_queries = ContextVar('quiz_async_queries', default=None)
+
+
+class QueryTimer:
+    """execute_wrapper that times every statement run while it is installed"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+
+class SQLMetricsMiddleware:
+    """Record latency, query count, SQL time and statement fingerprints per view.
+
+    Statements a streaming response runs after the view returns (the CSV
+    export) are not counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        self.record(request, response, elapsed, timer.queries)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = async_queries.set(timer.queries)
+        # Sync views and sync_to_async helpers run on this request's worker
+        # thread, so the timer goes on that thread's connection
+        await sync_to_async(_add_wrapper)(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            await sync_to_async(_remove_wrapper)(timer)
+            async_queries.reset(token)
+
+        self.record(request, response, elapsed, timer.queries)
+        return response
+
+    def record(self, request, response, elapsed, queries):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        registry.record(view, request.method, response.status_code, elapsed, queries)
+
+
+def _add_wrapper(timer):
+    connection.execute_wrappers.append(timer)
+
+
+def _remove_wrapper(timer):
+    connection.execute_wrappers.remove(timer)
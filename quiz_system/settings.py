@@ -21,6 +21,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so its timings cover the whole request
+    'quiz_system.metrics.SQLMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,9 +52,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'quiz_system.wsgi.application'
 
+# quiz_system.db is Django's PostgreSQL backend with a per-process connection
+# pool (QUIZ_DB_POOL_*); keep CONN_MAX_AGE at 0 with it
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'quiz_system.db',
         'NAME': 'quiz_system',
         'USER': 'postgres',
         'PASSWORD': 'Sonu@2812',
@@ -61,6 +65,69 @@ DATABASES = {
     }
 }
 
+QUIZ_DB_POOL_SIZE = 20
+# Seconds a request waits for a free pooled connection
+QUIZ_DB_POOL_TIMEOUT = 10
+# Pooled connections idle longer than this are checked with SELECT 1 before reuse
+QUIZ_DB_POOL_CHECK_AFTER = 30
+# Run the hot student queries as server-side prepared statements; turn off
+# behind a transaction-pooling pgbouncer
+QUIZ_PREPARED_STATEMENTS = True
+
+# Shared cache for rendered quiz question lists and autosaved drafts. Local
+# memory is per worker process (with DEBUG off, system check quiz.W001 warns
+# about it); point this at a file or Redis backend to share it across workers:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/var/tmp/quiz_cache'
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'quiz-system',
+    }
+}
+
+QUIZ_CACHE_ALIAS = 'default'
+QUIZ_QUESTION_CACHE_TIMEOUT = 60 * 60
+QUIZ_CODE_CACHE_TIMEOUT = 10 * 60
+QUIZ_CODE_NEGATIVE_TIMEOUT = 60
+# How long a server may serve result pages against a quiz version another
+# server has since bumped (only matters with a process-local cache)
+QUIZ_VERSION_CACHE_TIMEOUT = 60
+# Quizzes longer than the threshold are served QUIZ_QUESTION_PAGE_SIZE questions at a time
+QUIZ_PAGED_QUESTION_THRESHOLD = 50
+QUIZ_QUESTION_PAGE_SIZE = 20
+# Autosaved answers live in the cache and are written to the draft table in
+# batches, every QUIZ_DRAFT_FLUSH_INTERVAL seconds or QUIZ_DRAFT_FLUSH_BATCH drafts
+QUIZ_DRAFT_CACHE_TIMEOUT = 24 * 60 * 60
+QUIZ_DRAFT_FLUSH_INTERVAL = 5
+QUIZ_DRAFT_FLUSH_BATCH = 200
+# Waiting pages for quizzes with an opening time reload up to QUIZ_OPEN_JITTER
+# seconds after it; submissions are accepted QUIZ_CLOSE_GRACE seconds past closing
+QUIZ_OPEN_JITTER = 5
+QUIZ_CLOSE_GRACE = 60
+
+# Queue submissions and grade them with `manage.py grade_submissions`
+# instead of inside the request (for exam-end submission spikes)
+QUIZ_ASYNC_GRADING = False
+QUIZ_GRADING_BATCH_SIZE = 200
+# Submissions that fail to grade this many times are marked failed (see
+# grade_submissions --list-failed) and the student may submit again
+QUIZ_GRADING_MAX_ATTEMPTS = 3
+
+# Seconds between keepalives on idle live results streams (served over ASGI)
+QUIZ_LIVE_HEARTBEAT = 20
+# Seconds live results streams keep re-reading behind the newest result they
+# sent, to catch results whose transactions committed out of id order
+QUIZ_LIVE_RESULTS_SETTLE = 30
+# Serve join/take/submit and the student dashboard with their async views
+# (for ASGI), using up to QUIZ_ASYNC_DB_POOL_SIZE connections per process
+QUIZ_ASYNC_VIEWS = False
+QUIZ_ASYNC_DB_POOL_SIZE = 10
+
+# Bearer token required to scrape /metrics; None leaves it open
+QUIZ_METRICS_TOKEN = None
+QUIZ_METRICS_MAX_FINGERPRINTS = 500
+
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -1,10 +1,12 @@
 from django.contrib import admin
 from django.urls import include, path
-from quiz_system.views import home
+from quiz_system.views import home, metrics, slow_queries
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', home, name='home'),
+    path('metrics', metrics, name='metrics'),
+    path('metrics/slow-queries/', slow_queries, name='slow_queries'),
     path('quiz/', include('quiz.urls')),
     path('accounts/', include('accounts.urls')),
     path('accounts/', include('django.contrib.auth.urls')),  # Django's built-in auth URLs
@@ -1,6 +1,36 @@
 # quiz_system/views.py
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
+from .metrics import registry
+
+SLOW_QUERY_SORTS = ('total', 'mean', 'max')
 
 def home(request):
     return render(request, 'home.html')
-home
\ No newline at end of file
+
+def metrics(request):
+    """Prometheus scrape endpoint for this process's request and SQL metrics"""
+    # Optional shared secret so the endpoint need not be public
+    token = getattr(settings, 'QUIZ_METRICS_TOKEN', None)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden('Forbidden')
+    return HttpResponse(registry.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@staff_member_required
+def slow_queries(request):
+    sort = request.GET.get('sort', 'total')
+    if sort not in SLOW_QUERY_SORTS:
+        sort = 'total'
+    try:
+        limit = max(1, min(int(request.GET.get('n', 20)), 200))
+    except ValueError:
+        limit = 20
+
+    return render(request, 'metrics/slow_queries.html', {
+        'queries': registry.top_fingerprints(limit, sort),
+        'sort': sort,
+        'sorts': SLOW_QUERY_SORTS,
+        'limit': limit,
+    })